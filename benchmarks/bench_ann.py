@@ -0,0 +1,148 @@
+"""
+bench_ann.py — build cost, memory, latency and recall of the ANN few-shot backends.
+
+For each pool size, embedding_dataset's vectors are padded with jittered
+copies (standing in for augmented training data) and every src.util.ann
+backend is built over them. Dev/test question vectors are then searched with:
+  exact     brute force over the in-memory index (get_few_shot_batch's path)
+  vec0      sqlite-vec MATCH over a scratch vec0 table (get_few_shot's exact
+            path; only with --vec0, since filling the table dominates the run)
+  <backend> the backend's candidates scored exactly (search="<backend>"), at
+            1×, 2× and 4× its default probe count
+and report build seconds, peak build memory (tracemalloc), file size,
+ms/query and recall@k (share of hits at least as close as the exact k-th).
+
+Usage:
+  uv run python -m benchmarks.bench_ann
+  uv run python -m benchmarks.bench_ann --sizes 10000 100000 1000000 --top-k 3 --vec0
+"""
+
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from dotenv import load_dotenv
+
+from benchmarks.bench_quantized import _queries
+from src.util.ann import BACKENDS, build_ann, save_ann
+from src.util.nlp import _TABLE, _ann_top_k, _open_vec_conn, _top_k
+
+load_dotenv()
+
+ROOT_PATH = os.environ.get("ROOT_PATH")
+TMP_DIR = os.environ.get("TMP_DIR")
+DB = f"{ROOT_PATH}/database/OpenText2SQL.db" if ROOT_PATH else None
+
+# Rows jittered per step when padding the pool.
+_PAD_CHUNK = 100_000
+
+
+def _base_vectors(db_path):
+    conn = _open_vec_conn(db_path, read_only=True)
+    try:
+        rows = conn.execute(f"SELECT vector FROM {_TABLE} ORDER BY rowid").fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        raise ValueError(f"{_TABLE} in {db_path} is empty. Run src/pipeline/embedding.py first.")
+    return np.stack([np.frombuffer(r[0], dtype=np.float32) for r in rows])
+
+
+def _pool(base, n, seed=0):
+    """base padded (or cut) to n rows with jittered copies of its rows."""
+    rng = np.random.default_rng(seed)
+    noise = 0.1 * float(base.std())
+    vectors = np.empty((n, base.shape[1]), dtype=np.float32)
+    vectors[:min(n, len(base))] = base[:n]
+    for start in range(len(base), n, _PAD_CHUNK):
+        stop = min(n, start + _PAD_CHUNK)
+        vectors[start:stop] = base[rng.integers(0, len(base), stop - start)]
+        vectors[start:stop] += noise * rng.standard_normal((stop - start, base.shape[1]), dtype=np.float32)
+    return vectors
+
+
+def _timed(search, queries):
+    start = time.perf_counter()
+    results = [[distance for _, distance in search(q)] for q in queries]
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def _recall(found, exact):
+    return float(np.mean([sum(d <= e[-1] for d in a) / len(e) for a, e in zip(found, exact) if e]))
+
+
+def _vec0_ms(vectors, rowids, queries, k, scratch):
+    path = os.path.join(scratch, f"vec0_{len(vectors)}.db")
+    conn = _open_vec_conn(path)
+    try:
+        conn.execute(f"CREATE VIRTUAL TABLE {_TABLE} USING vec0(vector float[{vectors.shape[1]}])")
+        conn.executemany(f"INSERT INTO {_TABLE}(rowid, vector) VALUES (?, ?)",
+                         ((int(r), v.tobytes()) for r, v in zip(rowids, vectors)))
+        conn.commit()
+        start = time.perf_counter()
+        for q in queries:
+            conn.execute(f"SELECT rowid, distance FROM {_TABLE} WHERE vector MATCH ? AND k = ?",
+                         (q.tobytes(), k)).fetchall()
+        return (time.perf_counter() - start) * 1000 / len(queries)
+    finally:
+        conn.close()
+
+
+def main(db_path, sizes, n_queries, top_k, vec0):
+    base = _base_vectors(db_path)
+    queries = _queries(db_path, n_queries)
+    print(f"{len(queries)} queries, k={top_k}\n")
+    print(f"{'vectors':>9} {'search':<10} {'probe':>6} {'build (s)':>10} {'build MiB':>10} {'file MiB':>9} "
+          f"{'ms/query':>9} {'recall@k':>9}")
+
+    with tempfile.TemporaryDirectory(dir=TMP_DIR) as scratch:
+        for n in sizes:
+            vectors = _pool(base, n)
+            rowids = np.arange(1, n + 1, dtype=np.int64)
+            sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+
+            exact, ms = _timed(lambda q: _top_k(q, sq_norms - 2.0 * (vectors @ q), rowids, vectors, top_k), queries)
+            print(f"{n:>9} {'exact':<10} {'—':>6} {'—':>10} {'—':>10} {'—':>9} {ms:>9.2f} {1.0:>9.3f}")
+            if vec0:
+                ms = _vec0_ms(vectors, rowids, queries, top_k, scratch)
+                print(f"{n:>9} {'vec0':<10} {'—':>6} {'—':>10} {'—':>10} {'—':>9} {ms:>9.2f} {1.0:>9.3f}")
+
+            for name in BACKENDS:
+                tracemalloc.start()
+                start = time.perf_counter()
+                backend = build_ann(name, rowids, vectors)
+                build_s = time.perf_counter() - start
+                build_mib = tracemalloc.get_traced_memory()[1] / 2**20
+                tracemalloc.stop()
+                file_mib = os.path.getsize(save_ann(backend, os.path.join(scratch, f"pool_{n}.db"))) / 2**20
+
+                default_probe = backend.n_probe
+                for widen in (1, 2, 4):
+                    backend.n_probe = default_probe * widen
+                    found, ms = _timed(
+                        lambda q: _ann_top_k(backend, q, top_k, rowids, None, vectors, sq_norms), queries
+                    )
+                    print(f"{n:>9} {name:<10} {backend.n_probe:>6} {build_s:>10.1f} {build_mib:>10.0f} "
+                          f"{file_mib:>9.1f} {ms:>9.2f} {_recall(found, exact):>9.3f}")
+            del vectors, sq_norms
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark ANN backends for few-shot retrieval.")
+    parser.add_argument("--db", default=DB, help="OpenText2SQL.db with gold_dataset and embedding_dataset "
+                                                 "(default: ROOT_PATH's).")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Pool sizes (default: 10000 100000 1000000).")
+    parser.add_argument("--queries", type=int, default=200, help="Query vectors timed (default: 200).")
+    parser.add_argument("--top-k", type=int, default=3, help="Examples retrieved per query (default: 3).")
+    parser.add_argument("--vec0", action="store_true",
+                        help="Also time sqlite-vec brute force on a scratch vec0 table.")
+    args = parser.parse_args()
+
+    if not args.db:
+        raise ValueError("ROOT_PATH not set. Add it to your .env file or pass --db.")
+    main(args.db, args.sizes, args.queries, args.top_k, args.vec0)
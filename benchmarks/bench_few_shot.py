@@ -0,0 +1,84 @@
+"""
+bench_few_shot.py — per-question get_few_shot vs. get_few_shot_batch.
+
+Draws questions from gold_dataset (dev + test, cycled up to each size) and
+reports wall time and queries/s of:
+  single  one get_few_shot call per question (spaCy + vec0 MATCH + one gold
+          SELECT per hit — the old prompt_generation path)
+  batch   one get_few_shot_batch call (nlp.pipe + in-memory matrix multiply +
+          one gold join)
+Both result lists are compared; any mismatch is reported.
+
+Usage:
+  uv run python -m benchmarks.bench_few_shot
+  uv run python -m benchmarks.bench_few_shot --sizes 1000 10000 --top-k 3
+"""
+
+import os
+import sqlite3
+import time
+from itertools import cycle, islice
+
+from dotenv import load_dotenv
+
+from src.util.nlp import get_few_shot, get_few_shot_batch
+from src.util.schema import load_schemas
+
+load_dotenv()
+
+ROOT_PATH = os.environ.get("ROOT_PATH")
+DB = f"{ROOT_PATH}/database/OpenText2SQL.db" if ROOT_PATH else None
+
+
+def _queries(db_path, n):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT db_id, question, simplified_ddl FROM gold_dataset "
+            "WHERE source IN ('dev', 'test') ORDER BY rowid"
+        ).fetchall()
+    finally:
+        conn.close()
+    schemas = load_schemas(db_path)
+    rows = list(islice(cycle(rows), n))
+    return [q for _, q, _ in rows], [schemas.get(db_id) or ddl for db_id, _, ddl in rows]
+
+
+def main(db_path, sizes, top_k):
+    # Warm-up: load spaCy and the in-memory index outside the timed sections.
+    warm_q, warm_s = _queries(db_path, 1)
+    get_few_shot(warm_q[0], warm_s[0], db_path, db_path, top_k=top_k)
+    get_few_shot_batch(warm_q, warm_s, db_path, db_path, top_k=top_k)
+
+    print(f"{'queries':>8} {'single (s)':>12} {'batch (s)':>12} {'single q/s':>12} {'batch q/s':>12} "
+          f"{'speedup':>9} {'mismatches':>11}")
+    for n in sizes:
+        questions, schemas = _queries(db_path, n)
+
+        start = time.perf_counter()
+        single = [get_few_shot(q, s, db_path, db_path, top_k=top_k) for q, s in zip(questions, schemas)]
+        single_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = get_few_shot_batch(questions, schemas, db_path, db_path, top_k=top_k)
+        batch_s = time.perf_counter() - start
+
+        mismatches = sum(a != b for a, b in zip(single, batch))
+        print(f"{n:>8} {single_s:>12.2f} {batch_s:>12.2f} {n / single_s:>12.0f} {n / batch_s:>12.0f} "
+              f"{single_s / batch_s:>8.1f}× {mismatches:>11}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark batch few-shot retrieval.")
+    parser.add_argument("--db", default=DB, help="OpenText2SQL.db with gold_dataset and embedding_dataset "
+                                                 "(default: ROOT_PATH's).")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="Numbers of queries to time (default: 1000 10000).")
+    parser.add_argument("--top-k", type=int, default=3, help="Examples retrieved per query (default: 3).")
+    args = parser.parse_args()
+
+    if not args.db:
+        raise ValueError("ROOT_PATH not set. Add it to your .env file or pass --db.")
+    main(args.db, args.sizes, args.top_k)
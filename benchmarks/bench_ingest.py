@@ -0,0 +1,144 @@
+"""
+bench_ingest.py — gold_dataset load time and query latency, default vs. bulk-load mode.
+
+Copies the gold_dataset rows of an existing OpenText2SQL.db (replicated --scale
+times) into scratch databases and reports:
+  load   default rollback-journal connection with one executemany (the old path)
+         vs. ingest's bulk-load pragmas + chunked executemany (+ index build)
+  query  median latency of the pipeline's common gold_dataset filters without
+         and with the indexes from database/indexes.sql
+
+Usage:
+  uv run python -m benchmarks.bench_ingest
+  uv run python -m benchmarks.bench_ingest --scale 20 --repeat 50
+"""
+
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from src.pipeline import ingest
+
+# (label, sql, params) — mirrors the filters used by the ML pipeline.
+QUERIES = [
+    (
+        "prompt_generation  source + difficulty, LIMIT 100",
+        "SELECT id, db_id, source, difficulty, question, query, simplified_ddl, foreign_keys "
+        "FROM gold_dataset WHERE source = ? AND difficulty IN (?, ?) ORDER BY rowid LIMIT 100",
+        ("dev", "hard", "extra"),
+    ),
+    (
+        "predict._load_records  source + is_valid + difficulty",
+        "SELECT * FROM gold_dataset WHERE source = ? AND is_valid = 1 AND difficulty IN (?) ORDER BY rowid",
+        ("test", "medium"),
+    ),
+    (
+        "finetune._write_split  source + is_valid",
+        "SELECT id, db_id, question, query, full_ddl, difficulty FROM gold_dataset "
+        "WHERE source = ? AND is_valid = 1 ORDER BY rowid",
+        ("dev",),
+    ),
+    (
+        "get_few_shot  (id, source)",
+        "SELECT question, query FROM gold_dataset WHERE id = ? AND source = ?",
+        (42, "train"),
+    ),
+]
+
+
+def _gold_rows(db_path, scale):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute("SELECT * FROM gold_dataset ORDER BY rowid").fetchall()
+    finally:
+        conn.close()
+    columns = list(rows[0].keys())
+    stride = max(r["id"] for r in rows) + 1
+    id_pos = columns.index("id")
+    scaled = [
+        tuple(v + k * stride if i == id_pos else v for i, v in enumerate(r))
+        for k in range(scale)
+        for r in rows
+    ]
+    return columns, scaled
+
+
+def _load(path, columns, rows, bulk):
+    conn = sqlite3.connect(path)
+    try:
+        start = time.perf_counter()
+        if bulk:
+            ingest._begin_bulk_load(conn)
+        with open(ingest.SCHEMA_FILE, "r", encoding="utf-8") as f:
+            conn.executescript(f.read())
+        sql = (f"INSERT INTO gold_dataset ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' * len(columns))})")
+        if bulk:
+            ingest._executemany_chunked(conn, sql, rows)
+        else:
+            conn.executemany(sql, rows)
+        conn.commit()
+        load_s = time.perf_counter() - start
+
+        index_s = None
+        if bulk:
+            start = time.perf_counter()
+            ingest._build_indexes(conn)
+            conn.commit()
+            ingest._end_bulk_load(conn)
+            index_s = time.perf_counter() - start
+        return load_s, index_s
+    finally:
+        conn.close()
+
+
+def _median_ms(conn, sql, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main(db_path, scale, repeat):
+    columns, rows = _gold_rows(db_path, scale)
+    print(f"gold_dataset: {len(rows)} rows (scale ×{scale})\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before_db = os.path.join(tmp, "default.db")
+        after_db = os.path.join(tmp, "bulk.db")
+        before_load, _ = _load(before_db, columns, rows, bulk=False)
+        after_load, index_s = _load(after_db, columns, rows, bulk=True)
+
+        print(f"{'load':<56} {'before':>10} {'after':>10}")
+        print(f"{'insert gold_dataset (s)':<56} {before_load:>10.3f} {after_load:>10.3f}")
+        print(f"{'build indexes + ANALYZE (s)':<56} {'—':>10} {index_s:>10.3f}")
+        print()
+
+        before = sqlite3.connect(f"file:{before_db}?mode=ro", uri=True)
+        after = sqlite3.connect(f"file:{after_db}?mode=ro", uri=True)
+        try:
+            print(f"{'query (median ms)':<56} {'before':>10} {'after':>10}")
+            for label, sql, params in QUERIES:
+                b = _median_ms(before, sql, params, repeat)
+                a = _median_ms(after, sql, params, repeat)
+                print(f"{label:<56} {b:>10.3f} {a:>10.3f}")
+        finally:
+            before.close()
+            after.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark bulk-load mode and gold_dataset indexes.")
+    parser.add_argument("--db", default=ingest.OUT_DB, help="Source OpenText2SQL.db (default: ROOT_PATH's).")
+    parser.add_argument("--scale", type=int, default=10, help="Replicate gold rows this many times (default: 10).")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query (default: 20).")
+    args = parser.parse_args()
+
+    main(args.db, args.scale, args.repeat)
@@ -0,0 +1,82 @@
+"""
+bench_model_pool.py — wall time of run.py's inference stages with and without the resident model pool.
+
+Replays the model sequence of --runs consecutive pipeline runs with --models
+(preSQL on the first model, then finSQL on every model, as in a parameter
+sweep) on a few short prompts, so the time is dominated by model loading:
+  reload  MODEL_POOL disabled, every stage reads its model from disk (the cost
+          before the pool existed)
+  pool    MODEL_POOL with --pool-gb (default: MODEL_POOL_GB / the device's
+          recommended working set); resident models are reused
+and reports seconds, model loads and the speed-up.
+
+Usage:
+  uv run python -m benchmarks.bench_model_pool --models Qwen3.5-9B-MLX-4bit Qwen3-14B-4bit
+  uv run python -m benchmarks.bench_model_pool --models Llama-3.2-3B-Instruct-4bit gemma-3-4b-it-4bit-DWQ \
+      --runs 3 --pool-gb 8
+"""
+
+import time
+
+from dotenv import load_dotenv
+
+from src.util import backends
+from src.util.backends import MODEL_POOL
+from src.util.llm import infer
+
+load_dotenv()
+
+_PROMPTS = [
+    "### Schema:\n# singer(singer_id, name, country, age)\n### Question: How many singers are there?\nSELECT",
+    "### Schema:\n# singer(singer_id, name, country, age)\n### Question: List singers from France.\nSELECT",
+]
+
+
+def _counting_loads():
+    """Wrap backends._load_model so reads from disk are counted; returns the counter."""
+    loads = [0]
+    load = backends._load_model
+
+    def counted(*args, **kwargs):
+        loads[0] += 1
+        return load(*args, **kwargs)
+
+    backends._load_model = counted
+    return loads
+
+
+def _run_stages(models, runs):
+    for _ in range(runs):
+        infer(models[0], _PROMPTS, batch_size=len(_PROMPTS), max_tokens=32)  # preSQL
+        for model in models:                                                    # finSQL
+            infer(model, _PROMPTS, batch_size=len(_PROMPTS), max_tokens=32)
+
+
+def main(models, runs, pool_bytes):
+    loads = _counting_loads()
+    stages = runs * (len(models) + 1)
+    print(f"{runs} runs × {len(models) + 1} stages ({', '.join(models)})\n")
+    print(f"{'mode':<7} {'seconds':>9} {'loads':>6}")
+    results = {}
+    for mode, budget in (("reload", 0), ("pool", pool_bytes)):
+        MODEL_POOL.clear()
+        MODEL_POOL.max_bytes = budget
+        loads[0] = 0
+        start = time.perf_counter()
+        _run_stages(models, runs)
+        results[mode] = time.perf_counter() - start
+        print(f"{mode:<7} {results[mode]:>9.1f} {loads[0]:>4}/{stages}")
+    print(f"\nspeed-up: {results['reload'] / results['pool']:.1f}×")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the resident model pool against reloading per stage.")
+    parser.add_argument("--models", nargs="+", required=True, help="Model keys, as for run.py --models.")
+    parser.add_argument("--runs", type=int, default=2, help="Consecutive pipeline runs replayed (default: 2).")
+    parser.add_argument("--pool-gb", type=float, default=None,
+                        help="Pool budget in GB (default: MODEL_POOL_GB, else the device's working set).")
+    args = parser.parse_args()
+
+    main(args.models, args.runs, None if args.pool_gb is None else int(args.pool_gb * 2**30))
@@ -0,0 +1,126 @@
+"""
+bench_nlp_startup.py — cold-start cost of the spaCy model used for retrieval.
+
+Each variant is loaded in a fresh interpreter (median of --repeat runs) and
+reports import + load time and peak RSS:
+  full     spacy.prefer_gpu() + spacy.load("en_core_web_md") (the old loader)
+  vectors  src.util.nlp._get_nlp() (tokenizer + static vectors only)
+It then checks that both produce identical vectors for a sample of question
+skeletons, and exits non-zero if the vectors differ or the vectors-only cold
+start exceeds --budget seconds.
+
+Usage:
+  uv run python -m benchmarks.bench_nlp_startup
+  uv run python -m benchmarks.bench_nlp_startup --budget 1.0 --repeat 5
+"""
+
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT_PATH = os.environ.get("ROOT_PATH")
+DB = f"{ROOT_PATH}/database/OpenText2SQL.db" if ROOT_PATH else None
+
+# Seconds allowed for importing spaCy and loading the vectors-only pipeline.
+COLD_START_BUDGET_S = 1.5
+
+_LOADERS = {
+    "full": "import spacy; spacy.prefer_gpu(); nlp = spacy.load('en_core_web_md')",
+    "vectors": "from src.util.nlp import _get_nlp; nlp = _get_nlp()",
+}
+
+_CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+{loader}
+elapsed = time.perf_counter() - start
+unit = 1 << 20 if sys.platform == "darwin" else 1 << 10
+print(json.dumps({{"seconds": elapsed, "rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit,
+                  "pipes": nlp.pipe_names}}))
+"""
+
+_SAMPLE = [
+    "how many <mask> are there ?",
+    "what is the <mask> of the <mask> with the highest <mask> ?",
+    "list all <mask> whose <mask> is greater than <mask> .",
+    "show the names of singers and the number of concerts for each singer .",
+]
+
+
+def _cold_start(variant, repeat):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _CHILD.format(loader=_LOADERS[variant])],
+            check=True, capture_output=True, text=True, cwd=os.getcwd(),
+        ).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    return (
+        statistics.median(r["seconds"] for r in runs),
+        statistics.median(r["rss_mib"] for r in runs),
+        runs[0]["pipes"],
+    )
+
+
+def _skeletons(db_path, limit):
+    if not db_path or not os.path.exists(db_path):
+        return _SAMPLE
+    from src.util.nlp import _open_vec_conn
+
+    conn = _open_vec_conn(db_path, read_only=True)
+    try:
+        rows = conn.execute(
+            "SELECT skeleton_question FROM embedding_dataset ORDER BY rowid LIMIT ?", (limit,)
+        ).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    return [r[0] for r in rows] or _SAMPLE
+
+
+def main(db_path, repeat, budget, limit):
+    print(f"{'variant':<10} {'cold start (s)':>15} {'peak RSS (MiB)':>15}  pipes")
+    results = {}
+    for variant in _LOADERS:
+        seconds, rss, pipes = _cold_start(variant, repeat)
+        results[variant] = seconds
+        print(f"{variant:<10} {seconds:>15.2f} {rss:>15.0f}  {', '.join(pipes) or '—'}")
+
+    import spacy
+    from src.util.nlp import _embed, _get_nlp
+
+    skeletons = _skeletons(db_path, limit)
+    full = spacy.load("en_core_web_md")
+    expected = np.stack([full(s).vector.astype("float32") for s in skeletons])
+    actual = np.stack(list(_embed(_get_nlp(), skeletons)))
+    identical = np.array_equal(expected, actual)
+    print(f"\nvectors identical on {len(skeletons)} skeletons: {identical}")
+
+    within = results["vectors"] <= budget
+    print(f"vectors-only cold start {results['vectors']:.2f}s "
+          f"{'within' if within else 'OVER'} budget of {budget:g}s")
+    return 0 if identical and within else 1
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark spaCy cold start for few-shot retrieval.")
+    parser.add_argument("--db", default=DB, help="OpenText2SQL.db whose indexed skeletons are compared "
+                                                 "(default: ROOT_PATH's; built-in sample if missing).")
+    parser.add_argument("--repeat", type=int, default=3, help="Cold starts per variant (default: 3).")
+    parser.add_argument("--budget", type=float, default=COLD_START_BUDGET_S,
+                        help=f"Allowed vectors-only cold start in seconds (default: {COLD_START_BUDGET_S:g}).")
+    parser.add_argument("--limit", type=int, default=2000, help="Skeletons compared (default: 2000).")
+    args = parser.parse_args()
+
+    sys.exit(main(args.db, args.repeat, args.budget, args.limit))
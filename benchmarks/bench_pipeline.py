@@ -0,0 +1,104 @@
+"""
+bench_pipeline.py — per-stage wall time of the preSQL → finSQL pipeline, without real models by default.
+
+Runs the steps of src.ml.run in-process on one split (prompt generation,
+preSQL inference, presql.jsonl, schema linking and finSQL rendering,
+cross-consistency inference and voting, finsql.jsonl) and reports seconds,
+rows/s and each stage's share of the total. With the default --models replay
+replay, inference is the deterministic replay backend (src.util.backends), so
+the numbers are the pipeline's own overhead: what a faster model cannot buy
+back. Any models.json key works, e.g. an "openai" entry pointing at a local
+llama.cpp or vLLM server, to measure the full pipeline against a live server.
+
+Usage:
+  uv run python -m benchmarks.bench_pipeline
+  uv run python -m benchmarks.bench_pipeline --source train --limit 2000 --batch-size 16
+  uv run python -m benchmarks.bench_pipeline --config config/prompt/OpenText2SQL.json --models replay replay replay
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from dotenv import load_dotenv
+
+from src.ml.gen_finsql import write_finsql_jsonl
+from src.ml.gen_presql import write_presql_jsonl
+from src.util.llm import cross_consistency, infer, prompt_generation, render_prompt, resolve_model, schema_linking
+
+load_dotenv()
+
+ROOT_PATH = os.environ.get("ROOT_PATH")
+TMP_DIR = os.environ.get("TMP_DIR")
+DB = f"{ROOT_PATH}/database/OpenText2SQL.db" if ROOT_PATH else None
+
+# Stand-in for a config/prompt/*.json file (no few-shot section, so no embedding index is needed).
+_CONFIG = {
+    "task": {"visible": True, "text": "### Translate the question into a single SQLite query."},
+    "schema": {"visible": True, "text": "### Schema:\n# {{simplified_ddl}}"},
+    "foreign_keys": {"visible": True, "text": "### Foreign keys:\n# {{foreign_keys}}"},
+    "reference_values": {"visible": True, "text": "### Sample values:\n# {{cell_values}}"},
+    "matched_values": {"visible": True, "text": "### Values mentioned in the question:\n# {{matched_values}}"},
+    "question": {"visible": True, "text": "### Question: {{question}}\nSELECT"},
+}
+
+
+def _render_finsql(config, linked, db_path):
+    for rec in linked:
+        rec["prompt"] = " ".join(render_prompt(config, rec, rec.get("section_visibility"), db_path=db_path).split())
+    return linked
+
+
+def main(db_path, config, source, limit, models, batch_size):
+    timings = []
+
+    def stage(name, func):
+        start = time.perf_counter()
+        result = func()
+        timings.append((name, time.perf_counter() - start))
+        return result
+
+    records = stage("prompts", lambda: prompt_generation(config=config, db_path=db_path, source=source, limit=limit))
+    if not records:
+        raise ValueError(f"No {source} rows in {db_path}. Run src/pipeline/ingest.py first.")
+    with tempfile.TemporaryDirectory(dir=TMP_DIR) as out_dir:
+        presql = stage("preSQL", lambda: infer(models[0], [r["prompt"] for r in records], batch_size=batch_size))
+        presql_path = stage("presql.jsonl", lambda: write_presql_jsonl(
+            out_dir, records, presql, resolve_model(models[0]), "bench"))
+        with open(presql_path, encoding="utf-8") as f:
+            presql_records = [json.loads(line) for line in f]
+        linked = stage("linking", lambda: schema_linking(presql_records, db_path=db_path))
+        stage("finSQL render", lambda: _render_finsql(config, linked, db_path))
+        results = stage("finSQL + vote", lambda: cross_consistency(models, linked, batch_size=batch_size))
+        stage("finsql.jsonl", lambda: write_finsql_jsonl(
+            out_dir, presql_records, linked, results, [resolve_model(m) for m in models], "bench"))
+
+    total = sum(seconds for _, seconds in timings)
+    print(f"{len(records)} {source} rows, models: {' '.join(models)}\n")
+    print(f"{'stage':<14} {'seconds':>9} {'rows/s':>9} {'share':>7}")
+    for name, seconds in timings + [("total", total)]:
+        print(f"{name:<14} {seconds:>9.2f} {len(records) / seconds if seconds else 0:>9.0f} {seconds / total:>7.1%}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline's per-stage overhead.")
+    parser.add_argument("--db", default=DB, help="OpenText2SQL.db (default: ROOT_PATH's).")
+    parser.add_argument("--config", default=None, help="Prompt config JSON (default: a built-in sample).")
+    parser.add_argument("--source", default="dev", help="gold_dataset split to run (default: dev).")
+    parser.add_argument("--limit", type=int, default=None, help="Cap the rows run (default: whole split).")
+    parser.add_argument("--models", nargs="+", default=["replay", "replay"],
+                        help="models.json keys: the first runs preSQL, all run finSQL (default: replay replay).")
+    parser.add_argument("--batch-size", type=int, default=8, help="Prompts per inference batch (default: 8).")
+    args = parser.parse_args()
+
+    if not args.db:
+        raise ValueError("ROOT_PATH not set. Add it to your .env file or pass --db.")
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+    else:
+        config = _CONFIG
+    main(args.db, config, args.source, args.limit, args.models, args.batch_size)
@@ -0,0 +1,142 @@
+"""
+bench_prefix_cache.py — prefill tokens and inference time, dataset order vs db_id groups sharing a KV prefix.
+
+Renders one split with a prompt config in two layouts:
+  config        the sections in the config's own order
+  prefix-first  the same sections with the per-question ones (question,
+                matched values, few-shot examples) moved after the
+                per-database ones, the layout of
+                data/templates/nl2SQL/03_prefix_cache.j2
+and tokenizes every prompt with the model's tokenizer (no weights needed) to
+report, per layout, the prompt tokens that infer() prefills in dataset order
+and with group_by=db_id, where each group's shared prefix is prefilled once.
+
+With --time the model is loaded and the prefix-first prompts are run through
+infer() both ways: seconds, prompts/s, end-to-end speed-up and whether the
+grouped SQL matches the dataset-order SQL.
+
+Usage:
+  uv run python -m benchmarks.bench_prefix_cache --model Qwen3-14B-4bit
+  uv run python -m benchmarks.bench_prefix_cache --model Qwen3-14B-4bit --limit 200 --time --batch-size 4
+  uv run python -m benchmarks.bench_prefix_cache --model Qwen3-14B-4bit --config config/prompt/OpenText2SQL.json
+"""
+
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from src.util.llm import _tokenizer, infer, prefill_tokens_saved, prefix_groups, prompt_budget, prompt_generation
+
+load_dotenv()
+
+ROOT_PATH = os.environ.get("ROOT_PATH")
+DB = f"{ROOT_PATH}/database/OpenText2SQL.db" if ROOT_PATH else None
+
+# Stand-in for a config/prompt/*.json file, with the question-dependent sections interleaved.
+_CONFIG = {
+    "task": {"visible": True, "text": "### Translate the question into a single SQLite query."},
+    "question": {"visible": True, "text": "### Question: {{question}}"},
+    "schema": {"visible": True, "text": "### Schema:\n# {{simplified_ddl}}"},
+    "matched_values": {"visible": True, "text": "### Values mentioned in the question:\n# {{matched_values}}"},
+    "foreign_keys": {"visible": True, "text": "### Foreign keys:\n# {{foreign_keys}}"},
+    "reference_values": {"visible": True, "text": "### Sample values:\n# {{cell_values}}"},
+    "few_shot": {"visible": True, "text": "### Similar examples:\n{{few_shot}}"},
+    "answer": {"visible": True, "text": "SELECT"},
+}
+
+# Template variables that differ between questions on the same database.
+_PER_QUESTION = ("{{question}}", "{{matched_values}}", "{{few_shot}}")
+
+
+def _prefix_first(config):
+    """
+    config with the sections that use per-question variables moved, in order, after
+    the rest; trailing sections without variables (an answer cue such as "SELECT") stay last.
+    """
+    names = list(config)
+    tail = len(names)
+    while tail and "{{" not in config[names[tail - 1]].get("text", ""):
+        tail -= 1
+    body, cue = names[:tail], names[tail:]
+    per_question = [n for n in body if any(v in config[n].get("text", "") for v in _PER_QUESTION)]
+    order = [n for n in body if n not in per_question] + per_question + cue
+    return {name: config[name] for name in order}
+
+
+def _token_lists(model, prompts):
+    """Chat-formatted token ids per prompt, as infer() prefills them."""
+    budget = prompt_budget([model])
+    if not budget.tokenizers:
+        raise ValueError(f'{model} has no tokenizer to count with. Add a "tokenizer" to its models.json entry.')
+    tokenizer = _tokenizer(budget.tokenizers[0], budget.tokenizer_configs[0])
+    token_lists = []
+    for prompt in prompts:
+        chat = tokenizer.apply_chat_template(
+            [{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True, enable_thinking=False,
+        )
+        token_lists.append(tokenizer.encode(chat, add_special_tokens=False))
+    return token_lists
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main(db_path, config, model, source, limit, time_infer, batch_size, max_tokens):
+    layouts = {"config": config, "prefix-first": _prefix_first(config)}
+    rendered = {}
+    print(f"{'layout':<13} {'prompts':>8} {'groups':>7} {'prompt tokens':>14} {'grouped prefill':>16} {'saved':>7}")
+    for name, layout in layouts.items():
+        records = prompt_generation(config=layout, db_path=db_path, source=source, limit=limit)
+        if not records:
+            raise ValueError(f"No {source} rows in {db_path}. Run src/pipeline/ingest.py first.")
+        prompts, db_ids = [r["prompt"] for r in records], [r["db_id"] for r in records]
+        rendered[name] = prompts, db_ids
+        token_lists = _token_lists(model, prompts)
+        groups = prefix_groups(token_lists, db_ids)
+        total, saved = sum(map(len, token_lists)), prefill_tokens_saved(groups)
+        print(f"{name:<13} {len(prompts):>8} {len(groups):>7} {total:>14} {total - saved:>16} {saved / total:>7.1%}")
+
+    if not time_infer:
+        return
+    prompts, db_ids = rendered["prefix-first"]
+    kwargs = dict(model=model, prompts=prompts, batch_size=batch_size, max_tokens=max_tokens)
+    # Warm-up: model load and kernel compilation stay outside the timed runs.
+    infer(**{**kwargs, "prompts": prompts[:1]})
+
+    print(f"\n{'schedule':<13} {'seconds':>9} {'prompts/s':>10}")
+    plain, plain_s = _timed(lambda: infer(**kwargs))
+    print(f"{'dataset':<13} {plain_s:>9.1f} {len(prompts) / plain_s:>10.2f}")
+    grouped, grouped_s = _timed(lambda: infer(**kwargs, group_by=db_ids))
+    print(f"{'db_id groups':<13} {grouped_s:>9.1f} {len(prompts) / grouped_s:>10.2f}")
+    same = sum(a == b for a, b in zip(plain, grouped))
+    print(f"\nspeed-up: {plain_s / grouped_s:.2f}×, identical SQL: {same}/{len(prompts)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark db_id-grouped inference with a shared prefix cache.")
+    parser.add_argument("--db", default=DB, help="OpenText2SQL.db (default: ROOT_PATH's).")
+    parser.add_argument("--config", default=None, help="Prompt config JSON (default: a built-in sample).")
+    parser.add_argument("--model", required=True, help="Model key (from models.json) or full HuggingFace path.")
+    parser.add_argument("--source", default="dev", help="gold_dataset split to render (default: dev).")
+    parser.add_argument("--limit", type=int, default=None, help="Cap the rows rendered (default: whole split).")
+    parser.add_argument("--time", action="store_true",
+                        help="Also load the model and time infer() in dataset order and grouped by db_id.")
+    parser.add_argument("--batch-size", type=int, default=4, help="Prompts per inference batch (default: 4).")
+    parser.add_argument("--max-tokens", type=int, default=128, help="Max tokens generated per prompt (default: 128).")
+    args = parser.parse_args()
+
+    if not args.db:
+        raise ValueError("ROOT_PATH not set. Add it to your .env file or pass --db.")
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+    else:
+        config = _CONFIG
+    main(args.db, config, args.model, args.source, args.limit, args.time, args.batch_size, args.max_tokens)
@@ -0,0 +1,79 @@
+"""
+bench_prompt_workers.py — prompt_generation wall time, serial vs. db_id shards in a process pool.
+
+Renders one split with a prompt config (by default a built-in sample that uses
+every template variable: schema, foreign keys, cell values, matched values and
+few-shot examples) at each worker count and reports seconds, rows/s and the
+speed-up over workers=1. Every parallel run is compared with the serial output
+(JSON-serialised, so any byte difference counts as a mismatch).
+
+Usage:
+  uv run python -m benchmarks.bench_prompt_workers
+  uv run python -m benchmarks.bench_prompt_workers --source train --workers 1 2 4 8
+  uv run python -m benchmarks.bench_prompt_workers --config config/prompt/OpenText2SQL.json
+"""
+
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from src.util.llm import prompt_generation
+
+load_dotenv()
+
+ROOT_PATH = os.environ.get("ROOT_PATH")
+DB = f"{ROOT_PATH}/database/OpenText2SQL.db" if ROOT_PATH else None
+
+# Stand-in for a config/prompt/*.json file.
+_CONFIG = {
+    "task": {"visible": True, "text": "### Translate the question into a single SQLite query."},
+    "schema": {"visible": True, "text": "### Schema:\n# {{simplified_ddl}}"},
+    "foreign_keys": {"visible": True, "text": "### Foreign keys:\n# {{foreign_keys}}"},
+    "reference_values": {"visible": True, "text": "### Sample values:\n# {{cell_values}}"},
+    "matched_values": {"visible": True, "text": "### Values mentioned in the question:\n# {{matched_values}}"},
+    "few_shot": {"visible": True, "text": "### Similar examples:\n{{few_shot}}"},
+    "question": {"visible": True, "text": "### Question: {{question}}\nSELECT"},
+}
+
+
+def main(db_path, config, source, limit, worker_counts):
+    kwargs = dict(config=config, db_path=db_path, source=source, limit=limit)
+    # Warm-up: spaCy, the few-shot index and the catalogs load outside the timed runs.
+    prompt_generation(**{**kwargs, "limit": 1})
+
+    print(f"{'workers':>8} {'seconds':>9} {'rows/s':>9} {'speed-up':>9} {'identical':>10}")
+    serial = serial_s = None
+    for workers in [1] + [w for w in worker_counts if w != 1]:
+        start = time.perf_counter()
+        records = prompt_generation(**kwargs, workers=workers)
+        elapsed = time.perf_counter() - start
+        if serial is None:
+            serial, serial_s = json.dumps(records), elapsed
+        identical = json.dumps(records) == serial
+        print(f"{workers:>8} {elapsed:>9.2f} {len(records) / elapsed:>9.0f} {serial_s / elapsed:>8.1f}× "
+              f"{str(identical):>10}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark sharded parallel prompt_generation.")
+    parser.add_argument("--db", default=DB, help="OpenText2SQL.db (default: ROOT_PATH's).")
+    parser.add_argument("--config", default=None, help="Prompt config JSON (default: a built-in sample).")
+    parser.add_argument("--source", default="dev", help="gold_dataset split to render (default: dev).")
+    parser.add_argument("--limit", type=int, default=None, help="Cap the rows rendered (default: whole split).")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1],
+                        help="Worker counts to time; workers=1 always runs first as the reference "
+                             "(default: 1 2 4 <cpu count>).")
+    args = parser.parse_args()
+
+    if not args.db:
+        raise ValueError("ROOT_PATH not set. Add it to your .env file or pass --db.")
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+    else:
+        config = _CONFIG
+    main(args.db, config, args.source, args.limit, sorted(set(args.workers)))
@@ -0,0 +1,142 @@
+"""
+bench_quantized.py — recall@k and latency of the quantized few-shot index.
+
+Copies embedding_dataset into a scratch index (optionally padded with
+--pool - n synthetic rows: jittered copies of real vectors, standing in for
+augmented training data) and times get_few_shot's vec0 search on dev/test
+question vectors:
+  float   exact KNN over float[dim] vectors (the current index)
+  int8    KNN over centred int8[dim] vectors, exact rerank of k × rerank hits
+  binary  KNN over sign bits (Hamming), exact rerank of k × rerank hits
+recall@k is the share of each quantized top-k that is at least as close as the
+exact k-th neighbour (so rows tied with it count as hits);
+"vector MiB" is the raw size of the vectors the first-pass KNN scans.
+
+Usage:
+  uv run python -m benchmarks.bench_quantized
+  uv run python -m benchmarks.bench_quantized --pool 100000 --top-k 3 --rerank 4 10 20
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+from itertools import cycle, islice
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.pipeline.embedding import _build_quantized, _load_schema
+from src.util.nlp import (
+    QUANTIZATIONS, _TABLE, _exact_hits, _open_vec_conn, _quantized_hits, _question_vectors,
+)
+from src.util.schema import load_schemas
+
+load_dotenv()
+
+ROOT_PATH = os.environ.get("ROOT_PATH")
+TMP_DIR = os.environ.get("TMP_DIR")
+DB = f"{ROOT_PATH}/database/OpenText2SQL.db" if ROOT_PATH else None
+
+
+def _queries(db_path, n):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT db_id, question, simplified_ddl FROM gold_dataset "
+            "WHERE source IN ('dev', 'test') ORDER BY rowid"
+        ).fetchall()
+    finally:
+        conn.close()
+    schemas = load_schemas(db_path)
+    rows = list(islice(cycle(rows), n))
+    return _question_vectors([q for _, q, _ in rows], [schemas.get(d) or ddl for d, _, ddl in rows], db_path)
+
+
+def _copy_index(db_path, scratch_path, pool, seed=0):
+    """Write embedding_dataset (padded to `pool` rows with jittered copies) to scratch_path."""
+    src = _open_vec_conn(db_path, read_only=True)
+    try:
+        rows = src.execute(
+            f"SELECT rowid, vector, db_id, source, difficulty, id FROM {_TABLE} ORDER BY rowid"
+        ).fetchall()
+    finally:
+        src.close()
+    if not rows:
+        raise ValueError(f"{_TABLE} in {db_path} is empty. Run src/pipeline/embedding.py first.")
+
+    rng = np.random.default_rng(seed)
+    vectors = np.stack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+    extra = max(0, pool - len(rows))
+    picks = rng.integers(0, len(rows), size=extra)
+    jittered = vectors[picks] + 0.1 * float(vectors.std()) * rng.standard_normal(
+        (extra, vectors.shape[1]), dtype=np.float32
+    )
+    first = rows[-1][0] + 1
+    rows += [
+        (rowid, vector.tobytes(), rows[pick][2], "synthetic", rows[pick][4], -rowid)
+        for rowid, pick, vector in zip(range(first, first + extra), picks, jittered)
+    ]
+
+    conn = _open_vec_conn(scratch_path)
+    conn.executescript(_load_schema())
+    conn.executemany(
+        f"INSERT INTO {_TABLE} (rowid, vector, db_id, source, difficulty, id) VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    return conn, len(rows), vectors.shape[1]
+
+
+def _timed(search, queries):
+    start = time.perf_counter()
+    results = [[hit[3] for hit in search(q)] for q in queries]
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main(db_path, pool, n_queries, top_ks, reranks):
+    queries = _queries(db_path, n_queries)
+    with tempfile.TemporaryDirectory(dir=TMP_DIR) as scratch:
+        conn, n_rows, dim = _copy_index(db_path, os.path.join(scratch, "index.db"), pool)
+        try:
+            sizes = {"float": 4 * dim, "int8": dim, "binary": -(-dim // 8)}
+            print(f"{n_rows} indexed vectors (dim={dim}), {len(queries)} queries\n")
+            print(f"{'index':<8} {'rerank':>7} {'k':>4} {'ms/query':>9} {'recall@k':>9} {'vector MiB':>11}")
+
+            exact = {}
+            for k in top_ks:
+                exact[k], ms = _timed(lambda q: _exact_hits(conn, q, k, "", []), queries)
+                print(f"{'float':<8} {'—':>7} {k:>4} {ms:>9.2f} {1.0:>9.3f} {n_rows * sizes['float'] / 2**20:>11.1f}")
+
+            for kind in QUANTIZATIONS:
+                _build_quantized(conn, kind)
+                conn.commit()
+                for rerank in reranks:
+                    for k in top_ks:
+                        found, ms = _timed(lambda q: _quantized_hits(conn, q, k, "", [], rerank), queries)
+                        recall = np.mean([
+                            sum(d <= e[-1] for d in a) / len(e) for a, e in zip(found, exact[k]) if e
+                        ])
+                        print(f"{kind:<8} {rerank:>7} {k:>4} {ms:>9.2f} {recall:>9.3f} "
+                              f"{n_rows * sizes[kind] / 2**20:>11.1f}")
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark quantized few-shot search against the float index.")
+    parser.add_argument("--db", default=DB, help="OpenText2SQL.db with gold_dataset and embedding_dataset "
+                                                 "(default: ROOT_PATH's).")
+    parser.add_argument("--pool", type=int, default=0,
+                        help="Pad the scratch index to this many rows with synthetic vectors (default: no padding).")
+    parser.add_argument("--queries", type=int, default=500, help="Query vectors timed (default: 500).")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 10], help="k values (default: 1 3 10).")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[1, 4, 10],
+                        help="Candidates per requested example before the exact rerank (default: 1 4 10).")
+    args = parser.parse_args()
+
+    if not args.db:
+        raise ValueError("ROOT_PATH not set. Add it to your .env file or pass --db.")
+    main(args.db, args.pool, args.queries, args.top_k, args.rerank)
@@ -0,0 +1,100 @@
+"""
+bench_render.py — per-record cost of render_prompt with and without the compiled-template cache.
+
+Renders synthetic finSQL records (schema, foreign keys, cell values, few-shot
+examples) under a handful of section_visibility masks, as schema_linking
+produces them, and reports µs/record:
+  cold   the cache is cleared before every record, so each render re-parses
+         the template, recomputes line prefixes and recompiles it (the cost
+         before the cache existed)
+  warm   one cached compile per (config, mask); rendering is a lookup + render
+
+Usage:
+  uv run python -m benchmarks.bench_render
+  uv run python -m benchmarks.bench_render --config config/prompt/OpenText2SQL.json --records 5000
+"""
+
+import json
+import random
+import time
+
+from src.util.llm import _compile_prompt, render_prompt
+
+# Stand-in for a config/prompt/*.json file.
+_CONFIG = {
+    "task": {"visible": True, "text": "### Translate the question into a single SQLite query."},
+    "schema": {"visible": True, "text": "### Schema:\n# {{simplified_ddl}}"},
+    "foreign_keys": {"visible": True, "text": "### Foreign keys:\n# {{foreign_keys}}"},
+    "reference_values": {"visible": True, "text": "### Sample values:\n# {{cell_values}}"},
+    "few_shot": {"visible": True, "text": "### Similar examples:\n{{few_shot}}"},
+    "question": {"visible": True, "text": "### Question: {{question}}\nSELECT"},
+}
+
+_MASKS = (
+    {"schema": True, "foreign_keys": True, "reference_values": True},
+    {"schema": True, "foreign_keys": False, "reference_values": True},
+    {"schema": True, "foreign_keys": True, "reference_values": False},
+    {"schema": True, "foreign_keys": False, "reference_values": False},
+)
+
+
+def _records(n, seed=0):
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        tables = [f"table_{t}" for t in range(rng.randint(2, 6))]
+        records.append({
+            "question": f"How many rows of {tables[0]} have id above {i}?",
+            "simplified_ddl": json.dumps([f"{t}(id, name, value, {t}_ref)" for t in tables]),
+            "foreign_keys": json.dumps([f"{a}({a}_ref) REFERENCES {b}(id)" for a, b in zip(tables, tables[1:])]),
+            "cell_values": "\n".join(f"{t}(id[1, 2, 3], name[a, b, c])" for t in tables),
+            "few_shot": [{"question": f"Example {k}?", "sql": f"SELECT count(*) FROM {tables[0]}"} for k in range(3)],
+            "section_visibility": rng.choice(_MASKS),
+        })
+    return records
+
+
+def _render_all(config, records, cold):
+    prompts = []
+    for rec in records:
+        if cold:
+            _compile_prompt.cache_clear()
+        prompts.append(render_prompt(config, rec, rec["section_visibility"]))
+    return prompts
+
+
+def _timed(config, records, cold):
+    start = time.perf_counter()
+    _render_all(config, records, cold)
+    return (time.perf_counter() - start) * 1e6 / len(records)
+
+
+def main(config, n_records, repeats):
+    records = _records(n_records)
+    if _render_all(config, records, cold=True) != _render_all(config, records, cold=False):
+        raise AssertionError("cached and uncached renders differ")
+
+    print(f"{n_records} records, {len(_MASKS)} visibility masks, best of {repeats}\n")
+    print(f"{'render':<6} {'µs/record':>10}")
+    results = {}
+    for name, is_cold in (("cold", True), ("warm", False)):
+        results[name] = min(_timed(config, records, is_cold) for _ in range(repeats))
+        print(f"{name:<6} {results[name]:>10.1f}")
+    print(f"\nspeed-up: {results['cold'] / results['warm']:.1f}×")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark render_prompt's compiled-template cache.")
+    parser.add_argument("--config", default=None, help="Prompt config JSON (default: a built-in sample).")
+    parser.add_argument("--records", type=int, default=2000, help="Records rendered per pass (default: 2000).")
+    parser.add_argument("--repeats", type=int, default=3, help="Passes timed; the best is reported (default: 3).")
+    args = parser.parse_args()
+
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+    else:
+        config = _CONFIG
+    main(config, args.records, args.repeats)
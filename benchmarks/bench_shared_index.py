@@ -0,0 +1,117 @@
+"""
+bench_shared_index.py — few-shot index memory and startup as the worker count grows.
+
+Starts N fresh worker processes per mode; each loads the index, scores its
+share of dev/test question vectors against every row, and reports, while all
+workers are alive:
+  startup   seconds to get the index ready
+  PSS       proportional set size added by the index (shared pages are split
+            between the processes mapping them, so the sum is the real total)
+  USS       memory private to the worker
+Modes:
+  copy      each worker reads embedding_dataset from SQLite into its own arrays
+  mmap      each worker maps the shared export (build_index(shared=True))
+
+PSS/USS come from /proc/self/smaps_rollup (Linux); elsewhere peak RSS is shown.
+
+Usage:
+  uv run python -m benchmarks.bench_shared_index
+  uv run python -m benchmarks.bench_shared_index --workers 1 2 4 8 16
+"""
+
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.util.nlp import _index, _load_index_matrix, _top_k
+
+load_dotenv()
+
+ROOT_PATH = os.environ.get("ROOT_PATH")
+DB = f"{ROOT_PATH}/database/OpenText2SQL.db" if ROOT_PATH else None
+
+
+def _memory_mib():
+    """(PSS, USS) of this process in MiB; (peak RSS, peak RSS) where smaps_rollup is unavailable."""
+    try:
+        with open("/proc/self/smaps_rollup", encoding="utf-8") as f:
+            fields = {line.split(":")[0]: int(line.split()[1]) for line in f if line.split()[-1] == "kB"}
+        return fields["Pss"] / 1024, (fields["Private_Clean"] + fields["Private_Dirty"]) / 1024
+    except OSError:
+        unit = 1 << 20 if sys.platform == "darwin" else 1 << 10
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit
+        return rss, rss
+
+
+def _worker(mode, db_path, queries, top_k, barrier, results):
+    pss0, uss0 = _memory_mib()
+    start = time.perf_counter()
+    if mode == "mmap":
+        index = _index(db_path, db_path)
+        if index.shared is None:
+            raise RuntimeError("Shared export missing or stale. Run src/pipeline/embedding.py --shared first.")
+    else:
+        stat = os.stat(db_path)
+        index = _load_index_matrix(db_path, stat.st_mtime_ns, stat.st_size)
+    startup = time.perf_counter() - start
+
+    for q in queries:
+        _top_k(q, index.sq_norms - 2.0 * (index.vectors @ q), index.rowids, index.vectors, top_k)
+
+    barrier.wait()  # every worker has touched the whole index
+    pss, uss = _memory_mib()
+    results.put((startup, pss - pss0, uss - uss0))
+    barrier.wait()  # stay alive until every worker has measured
+
+
+def _run(mode, db_path, queries, n_workers, top_k):
+    ctx = mp.get_context("spawn")
+    barrier, results = ctx.Barrier(n_workers), ctx.Queue()
+    workers = [
+        ctx.Process(target=_worker, args=(mode, db_path, part, top_k, barrier, results))
+        for part in np.array_split(queries, n_workers)
+    ]
+    for w in workers:
+        w.start()
+    stats = [results.get() for _ in workers]
+    for w in workers:
+        w.join()
+    return stats
+
+
+def main(db_path, worker_counts, n_queries, top_k):
+    index = _index(db_path, db_path)
+    if index.shared is None:
+        raise RuntimeError("Shared export missing or stale. Run src/pipeline/embedding.py --shared first.")
+    rng = np.random.default_rng(0)
+    queries = index.vectors[rng.integers(0, len(index.rowids), n_queries)] + np.float32(0.01)
+    print(f"{len(index.rowids)} indexed vectors, {n_queries} queries split across workers\n")
+
+    print(f"{'mode':<6} {'workers':>8} {'startup (s)':>12} {'Σ PSS MiB':>10} {'USS MiB/worker':>15}")
+    for mode in ("copy", "mmap"):
+        for n in worker_counts:
+            stats = _run(mode, db_path, queries, n, top_k)
+            print(f"{mode:<6} {n:>8} {max(s[0] for s in stats):>12.3f} {sum(s[1] for s in stats):>10.1f} "
+                  f"{np.mean([s[2] for s in stats]):>15.1f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark shared (memory-mapped) vs per-worker few-shot index.")
+    parser.add_argument("--db", default=DB, help="OpenText2SQL.db with embedding_dataset and its shared export "
+                                                 "(default: ROOT_PATH's).")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Worker counts (default: 1 2 4 8).")
+    parser.add_argument("--queries", type=int, default=256, help="Queries scored in total (default: 256).")
+    parser.add_argument("--top-k", type=int, default=3, help="Examples retrieved per query (default: 3).")
+    args = parser.parse_args()
+
+    if not args.db:
+        raise ValueError("ROOT_PATH not set. Add it to your .env file or pass --db.")
+    main(args.db, args.workers, args.queries, args.top_k)
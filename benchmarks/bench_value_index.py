@@ -0,0 +1,121 @@
+"""
+bench_value_index.py — question-literal lookup: cell_value_index vs scanning the Spider databases.
+
+Builds a scratch cell_value_index from every Spider database (as ingest does),
+then matches gold_dataset questions against it with match_values(). The
+baseline answers the same questions by scanning each question's Spider
+database for text cells that occur in the question. Reports build seconds,
+index size, ms/question (mean and p95) and the share of questions with a hit.
+
+Usage:
+  uv run python -m benchmarks.bench_value_index
+  uv run python -m benchmarks.bench_value_index --questions 1000 --source dev
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.util.cell_values import MAX_VALUE_LENGTH, _quote, _user_tables, match_values, store_text_values, text_values
+
+load_dotenv()
+
+ROOT_PATH = os.environ.get("ROOT_PATH")
+TMP_DIR = os.environ.get("TMP_DIR")
+DB = f"{ROOT_PATH}/database/OpenText2SQL.db" if ROOT_PATH else None
+SPIDER_DB_DIR = f"{ROOT_PATH}/database/spider" if ROOT_PATH else None
+SCHEMA_FILE = f"{ROOT_PATH}/database/OpenText2SQL.sql" if ROOT_PATH else None
+
+
+def _build(spider_dir, path):
+    with open(SCHEMA_FILE, encoding="utf-8") as f:
+        statements = f.read().split(";")
+    conn = sqlite3.connect(path)
+    try:
+        for table in ("VIRTUAL TABLE cell_value_index", "TABLE cell_value_ranges"):
+            conn.execute(next(stmt for stmt in statements if f"CREATE {table}" in stmt))
+        n = 0
+        for db_id in sorted(os.listdir(spider_dir)):
+            db_path = os.path.join(spider_dir, db_id, f"{db_id}.sqlite")
+            if os.path.exists(db_path):
+                n += store_text_values(conn, db_id, text_values(db_path))
+        conn.execute("INSERT INTO cell_value_index (cell_value_index) VALUES ('optimize')")
+        conn.commit()
+        return n
+    finally:
+        conn.close()
+
+
+def _scan(spider_dir, db_id, question):
+    """Text cells of db_id that occur in question, by scanning every text column."""
+    conn = sqlite3.connect(f"file:{os.path.join(spider_dir, db_id, db_id + '.sqlite')}?mode=ro", uri=True)
+    try:
+        hits = []
+        for table in _user_tables(conn):
+            for _, name, *_ in conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall():
+                col = _quote(name)
+                hits += conn.execute(
+                    f"SELECT DISTINCT {col} FROM {_quote(table)} WHERE typeof({col}) = 'text' "
+                    f"AND length({col}) BETWEEN 3 AND ? AND instr(lower(?), lower({col})) > 0",
+                    (MAX_VALUE_LENGTH, question),
+                ).fetchall()
+        return hits
+    finally:
+        conn.close()
+
+
+def _timed(func, questions):
+    times, hits = [], 0
+    for db_id, question in questions:
+        start = time.perf_counter()
+        hits += bool(func(db_id, question))
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.mean(times)), float(np.percentile(times, 95)), hits / len(questions)
+
+
+def main(db_path, spider_dir, n_questions, source):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        questions = conn.execute(
+            "SELECT db_id, question FROM gold_dataset WHERE source = ? ORDER BY rowid LIMIT ?", (source, n_questions)
+        ).fetchall()
+    finally:
+        conn.close()
+    if not questions:
+        raise ValueError(f"No {source} questions in {db_path}. Run src/pipeline/ingest.py first.")
+
+    with tempfile.TemporaryDirectory(dir=TMP_DIR) as scratch:
+        index_path = os.path.join(scratch, "values.db")
+        start = time.perf_counter()
+        n_values = _build(spider_dir, index_path)
+        build_s = time.perf_counter() - start
+        print(f"cell_value_index: {n_values} values, {os.path.getsize(index_path) / 2**20:.1f} MiB, "
+              f"built in {build_s:.1f}s\n{len(questions)} {source} questions\n")
+
+        print(f"{'lookup':<8} {'ms/question':>12} {'p95 ms':>8} {'with hit':>9}")
+        for name, func in (
+            ("fts5", lambda db_id, q: match_values(index_path, db_id, q)),
+            ("scan", lambda db_id, q: _scan(spider_dir, db_id, q)),
+        ):
+            mean, p95, hit_rate = _timed(func, questions)
+            print(f"{name:<8} {mean:>12.2f} {p95:>8.2f} {hit_rate:>9.1%}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the FTS5 cell value index against database scans.")
+    parser.add_argument("--db", default=DB, help="OpenText2SQL.db with gold_dataset (default: ROOT_PATH's).")
+    parser.add_argument("--spider-dir", default=SPIDER_DB_DIR,
+                        help="Directory of Spider databases (default: ROOT_PATH/database/spider).")
+    parser.add_argument("--questions", type=int, default=500, help="Questions timed (default: 500).")
+    parser.add_argument("--source", default="dev", help="gold_dataset source to draw questions from (default: dev).")
+    args = parser.parse_args()
+
+    if not args.db:
+        raise ValueError("ROOT_PATH not set. Add it to your .env file or pass --db.")
+    main(args.db, args.spider_dir, args.questions, args.source)
@@ -3,6 +3,13 @@ DROP TABLE IF EXISTS spider_tables;
 DROP TABLE IF EXISTS silver_dataset;
 DROP TABLE IF EXISTS gold_dataset;
 DROP TABLE IF EXISTS finetune_dataset;
+DROP TABLE IF EXISTS ingest_manifest;
+DROP TABLE IF EXISTS schema_tables;
+DROP TABLE IF EXISTS schema_columns;
+DROP TABLE IF EXISTS schema_foreign_keys;
+DROP TABLE IF EXISTS cell_value_catalog;
+DROP TABLE IF EXISTS cell_value_index;
+DROP TABLE IF EXISTS cell_value_ranges;
 
 CREATE TABLE bronze_dataset (
     id INTEGER NOT NULL,
@@ -14,6 +21,7 @@ CREATE TABLE bronze_dataset (
     query_toks TEXT,
     query_toks_no_value TEXT,
     sql_json TEXT,
+    content_hash TEXT,
     PRIMARY KEY (id, source)
 );
 
@@ -29,6 +37,63 @@ CREATE TABLE spider_tables (
     foreign_keys TEXT
 );
 
+CREATE TABLE schema_tables (
+    db_id TEXT NOT NULL,
+    table_idx INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    display_name TEXT,
+    PRIMARY KEY (db_id, table_idx)
+);
+
+CREATE TABLE schema_columns (
+    db_id TEXT NOT NULL,
+    column_idx INTEGER NOT NULL,
+    table_idx INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    display_name TEXT,
+    type TEXT,
+    is_primary_key BOOLEAN NOT NULL DEFAULT 0,
+    PRIMARY KEY (db_id, column_idx)
+);
+
+CREATE TABLE schema_foreign_keys (
+    db_id TEXT NOT NULL,
+    fk_idx INTEGER NOT NULL,
+    column_idx INTEGER NOT NULL,
+    ref_column_idx INTEGER NOT NULL,
+    PRIMARY KEY (db_id, fk_idx)
+);
+
+CREATE TABLE cell_value_catalog (
+    db_id TEXT NOT NULL,
+    table_pos INTEGER NOT NULL,
+    table_name TEXT NOT NULL,
+    column_pos INTEGER NOT NULL,
+    column_name TEXT NOT NULL,
+    type TEXT,
+    distinct_count INTEGER NOT NULL,
+    null_count INTEGER NOT NULL,
+    sample_values TEXT NOT NULL,
+    PRIMARY KEY (db_id, table_pos, column_pos)
+);
+
+-- Distinct text cells of every Spider database, for question literal lookup.
+-- Each db_id's cells occupy one contiguous rowid range (cell_value_ranges), so
+-- a lookup is confined to its database with a rowid constraint.
+CREATE VIRTUAL TABLE cell_value_index USING fts5(
+    value,
+    db_id UNINDEXED,
+    table_name UNINDEXED,
+    column_name UNINDEXED,
+    tokenize = 'trigram'
+);
+
+CREATE TABLE cell_value_ranges (
+    db_id TEXT PRIMARY KEY,
+    first_rowid INTEGER NOT NULL,
+    last_rowid INTEGER NOT NULL
+);
+
 CREATE TABLE silver_dataset (
     id INTEGER NOT NULL,
     db_id TEXT NOT NULL,
@@ -42,6 +107,11 @@ CREATE TABLE silver_dataset (
     full_ddl TEXT,
     foreign_keys TEXT,
     difficulty TEXT,
+    exec_status TEXT,
+    exec_time_ms REAL,
+    exec_row_count INTEGER,
+    exec_fingerprint TEXT,
+    content_hash TEXT,
     PRIMARY KEY (id, source)
 );
 
@@ -56,6 +126,10 @@ CREATE TABLE gold_dataset (
     full_ddl TEXT,
     foreign_keys TEXT,
     difficulty TEXT,
+    exec_status TEXT,
+    exec_time_ms REAL,
+    exec_row_count INTEGER,
+    exec_fingerprint TEXT,
     PRIMARY KEY (id, source)
 );
 
@@ -71,3 +145,12 @@ CREATE TABLE finetune_dataset (
     PRIMARY KEY (id, source),
     FOREIGN KEY (id, source) REFERENCES gold_dataset (id, source)
 );
+
+CREATE TABLE ingest_manifest (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (kind, name)
+);
@@ -1,9 +1,11 @@
 DROP TABLE IF EXISTS embedding_dataset;
 CREATE VIRTUAL TABLE embedding_dataset USING vec0(
     vector float[300],
+    db_id              TEXT,
+    source             TEXT,
+    difficulty         TEXT,
     +id                INTEGER,
-    +db_id             TEXT,
-    +source            TEXT,
     +question          TEXT,
-    +skeleton_question TEXT
+    +skeleton_question TEXT,
+    +content_hash      TEXT
 );
@@ -0,0 +1,13 @@
+DROP TABLE IF EXISTS embedding_quantized;
+DROP TABLE IF EXISTS embedding_quantization;
+CREATE TABLE embedding_quantization (
+    kind   TEXT NOT NULL,
+    scale  REAL NOT NULL,
+    center BLOB NOT NULL
+);
+CREATE VIRTUAL TABLE embedding_quantized USING vec0(
+    vector     {vector_type},
+    db_id      TEXT,
+    source     TEXT,
+    difficulty TEXT
+);
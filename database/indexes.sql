@@ -0,0 +1,14 @@
+-- Secondary indexes for the gold_dataset access patterns. Built after the bulk
+-- load (see src/pipeline/ingest.py). Lookups by (id, source) use the primary key.
+
+-- prompt_generation: source = ? [AND difficulty IN (...)]
+CREATE INDEX IF NOT EXISTS idx_gold_source_difficulty
+    ON gold_dataset (source, difficulty);
+
+-- predict._load_records, finetune._write_split: source = ? AND is_valid = 1 [AND difficulty IN (...)]
+CREATE INDEX IF NOT EXISTS idx_gold_source_valid_difficulty
+    ON gold_dataset (source, is_valid, difficulty);
+
+-- incremental ingest: silver rows of changed db_ids
+CREATE INDEX IF NOT EXISTS idx_silver_db_id
+    ON silver_dataset (db_id);
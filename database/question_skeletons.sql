@@ -0,0 +1,16 @@
+CREATE TABLE IF NOT EXISTS question_skeletons (
+    id INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    skeleton TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (id, source)
+);
+
+CREATE INDEX IF NOT EXISTS idx_question_skeletons_hash ON question_skeletons (content_hash);
+
+-- Single row: the vector model the keys and vectors above were computed with.
+CREATE TABLE IF NOT EXISTS question_skeletons_model (
+    model_id TEXT NOT NULL,
+    dim INTEGER NOT NULL
+);
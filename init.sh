@@ -25,29 +25,36 @@ echo ""
 SPIDER_DIR="$TMP_DIR/spider_data"
 ZIP_FILE="$TMP_DIR/spider_data.zip"
 
-if [ -f "$ZIP_FILE" ]; then
-  echo "📦 Found existing spider_data.zip. Extracting..."
+DB_TRAIN_DIR="$ROOT_PATH/database/spider"
+# Touched once an extraction has been copied into DB_TRAIN_DIR: a zip newer than it has not.
+EXTRACTED_MARKER="$SPIDER_DIR/.extracted"
+
+extract_spider() {
   unzip -o "$ZIP_FILE" -d $TMP_DIR/
   rm -rf "$TMP_DIR/__MACOSX"
   echo "✅ spider_data is ready."
+}
+
+if [ -f "$ZIP_FILE" ] && [ "$EXTRACTED_MARKER" -nt "$ZIP_FILE" ] && [ -n "$(ls -A "$DB_TRAIN_DIR" 2>/dev/null)" ]; then
+  # Re-extracting would rewrite every file and force the databases to be copied and re-hashed.
+  echo "📦 spider_data.zip already extracted into $DB_TRAIN_DIR. Skipping extraction."
+elif [ -f "$ZIP_FILE" ]; then
+  echo "📦 Found existing spider_data.zip. Extracting..."
+  extract_spider
 else
   echo "⬇️ Downloading spider_data.zip..."
   # Use --no-check-certificate when behind corporate/managed SSL (e.g. Kandji) that wget doesn't trust
   wget --no-check-certificate -O "$ZIP_FILE" "https://drive.usercontent.google.com/download?id=1403EGqzIDoHMdQF4c9Bkyl7dZLZ5Wt6J&export=download&authuser=0&confirm=t&uuid=c519429f-e190-4024-9db5-5500dd9f73de&at=ALoNOgmVI-vAWDoXBUn2D2Ezy8Fy:1747082984773"
   echo "📦 Extracting spider_data.zip..."
-  unzip -o "$ZIP_FILE" -d $TMP_DIR/
-  rm -rf "$TMP_DIR/__MACOSX"
-  echo "✅ spider_data is ready."
+  extract_spider
 fi
 echo ""
 
 DB_TRAIN="$SPIDER_DIR/database"
 DB_TEST="$SPIDER_DIR/test_database"
 
-DB_TRAIN_DIR="$ROOT_PATH/database/spider"
-
 if [ ! -d "$DB_TEST" ]; then
-    echo "⚠️  Folder '$DB_TEST' does not exist. Moving."
+    echo "⚠️  Folder '$DB_TEST' does not exist. Nothing to move."
 else
     # Check if it's empty
     if [ -z "$(ls -A "$DB_TEST")" ]; then
@@ -81,12 +88,14 @@ else
         done
     fi
 fi
+touch "$EXTRACTED_MARKER"
 echo "📁 All test databases moved into: $DB_TRAIN"
 echo ""
 
-# Build OpenText2SQL.db (bronze + silver + gold tables)
+# Build OpenText2SQL.db (bronze + silver + gold tables).
+# --incremental only rebuilds rows whose Spider files or databases changed since the last run.
 echo "🐍 Building OpenText2SQL.db..."
-uv run python -m src.pipeline.ingest
+uv run python -m src.pipeline.ingest --incremental
 echo "✅ Done."
 echo ""
 
@@ -31,15 +31,16 @@ Usage:
 Output:
   experiments/2026-05-26_02-15-18/finsql.jsonl
   Each line: {question, db_id, source, difficulty, gold_sql,
-              presql, presql_model, presql_config, presql_prompt,
-              simplified_ddl, foreign_keys, cell_values, few_shot, section_visibility,
-              finsql_prompt, finsql, all_sql, consistency_score, models, config}
+              presql, presql_model, presql_config, presql_prompt, presql_prompt_tokens,
+              simplified_ddl, foreign_keys, cell_values, matched_values, few_shot, section_visibility,
+              finsql_prompt, finsql_prompt_tokens, finsql, all_sql, consistency_score, models, config}
 """
 
 import os
 import json
 import argparse
 from pathlib import Path
+from typing import Iterable
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -48,38 +49,42 @@ ROOT_PATH = os.environ.get("ROOT_PATH")
 if not ROOT_PATH:
     raise ValueError("ROOT_PATH not set. Add it to your .env file.")
 
+DB          = f"{ROOT_PATH}/database/OpenText2SQL.db"
 PROMPTS_DIR = f"{ROOT_PATH}/config/prompt"
 
 
-def write_finsql_jsonl(out_dir: str, records: list, linked: list, results: list, resolved_models: list, config_name: str) -> str:
+def write_finsql_jsonl(out_dir: str, records: Iterable, linked: Iterable, results: Iterable, resolved_models: list, config_name: str) -> str:
     out_path = os.path.join(out_dir, "finsql.jsonl")
     with open(out_path, "w", encoding="utf-8") as f:
         for orig, rec_linked, result in zip(records, linked, results):
             line = {
                 # identity
-                "question":           orig.get("question"),
-                "db_id":              orig.get("db_id"),
-                "source":             orig.get("source"),
-                "difficulty":         orig.get("difficulty"),
-                "gold_sql":           orig.get("gold_sql"),
+                "question":             orig.get("question"),
+                "db_id":                orig.get("db_id"),
+                "source":               orig.get("source"),
+                "difficulty":           orig.get("difficulty"),
+                "gold_sql":             orig.get("gold_sql"),
                 # preSQL step (preserved from input)
-                "presql":             orig.get("presql"),
-                "presql_model":       orig.get("model"),
-                "presql_config":      orig.get("config"),
-                "presql_prompt":      orig.get("prompt"),
+                "presql":               orig.get("presql"),
+                "presql_model":         orig.get("model"),
+                "presql_config":        orig.get("config"),
+                "presql_prompt":        orig.get("prompt"),
+                "presql_prompt_tokens": orig.get("prompt_tokens"),
                 # schema linking output
-                "simplified_ddl":     rec_linked.get("simplified_ddl"),
-                "foreign_keys":       rec_linked.get("foreign_keys"),
-                "cell_values":        rec_linked.get("cell_values"),
-                "few_shot":           orig.get("few_shot"),
-                "section_visibility": rec_linked.get("section_visibility"),
+                "simplified_ddl":       rec_linked.get("simplified_ddl"),
+                "foreign_keys":         rec_linked.get("foreign_keys"),
+                "cell_values":          rec_linked.get("cell_values"),
+                "matched_values":       rec_linked.get("matched_values"),
+                "few_shot":             orig.get("few_shot"),
+                "section_visibility":   rec_linked.get("section_visibility"),
                 # finSQL step
-                "finsql_prompt":      rec_linked.get("prompt"),
-                "finsql":             result.get("sql"),
-                "all_sql":            result.get("all_sql"),
-                "consistency_score":  result.get("consistency_score"),
-                "models":             resolved_models,
-                "config":             config_name,
+                "finsql_prompt":        rec_linked.get("prompt"),
+                "finsql_prompt_tokens": rec_linked.get("prompt_tokens"),
+                "finsql":               result.get("sql"),
+                "all_sql":              result.get("all_sql"),
+                "consistency_score":    result.get("consistency_score"),
+                "models":               resolved_models,
+                "config":               config_name,
             }
             f.write(json.dumps(line, ensure_ascii=False) + "\n")
     return out_path
@@ -101,6 +106,12 @@ def main():
                         help="Prompts per inference batch (default: 1).")
     parser.add_argument("--max-tokens", type=int, default=512,
                         help="Max tokens to generate per prompt (default: 512).")
+    parser.add_argument("--group-by-db", action="store_true",
+                        help="Batch prompts by db_id and prefill each database's shared prompt prefix "
+                             "(schema first in the config) once, reusing its KV cache across the group.")
+    parser.add_argument("--token-budget", action="store_true",
+                        help="Trim finSQL prompts to the smallest prompt_budget of --models in models.json "
+                             "and record per-record prompt token counts.")
     args = parser.parse_args()
 
     # ── Step 1: load presql.jsonl ─────────────────────────────────────────────
@@ -125,16 +136,25 @@ def main():
         config = json.load(f)
 
     # ── Step 3: schema linking ────────────────────────────────────────────────
-    from src.util.llm import schema_linking, render_prompt, cross_consistency, resolve_model
+    from src.util.llm import (
+        schema_linking, render_prompt, fit_prompt, cross_consistency, resolve_model,
+        prompt_budget, prompt_token_summary,
+    )
 
     print("Applying schema linking...")
-    linked = schema_linking(records)
+    linked = schema_linking(records, db_path=DB)
 
     # ── Step 4: render finSQL prompts ─────────────────────────────────────────
     print("Rendering finSQL prompts with pruned schema...")
+    budget = prompt_budget(args.models) if args.token_budget else None
     for rec in linked:
-        rendered = render_prompt(config, rec, rec.get("section_visibility"))
+        if budget:
+            rendered, rec["prompt_tokens"] = fit_prompt(config, rec, budget, rec.get("section_visibility"), db_path=DB)
+        else:
+            rendered = render_prompt(config, rec, rec.get("section_visibility"), db_path=DB)
         rec["prompt"] = " ".join(rendered.split())  # collapse to one line
+    if budget:
+        print(prompt_token_summary((rec["prompt_tokens"] for rec in linked), budget))
 
     # ── Step 5: cross-consistency inference ───────────────────────────────────
     if len(args.models) > 1:
@@ -146,6 +166,7 @@ def main():
         records=linked,
         batch_size=args.batch_size,
         max_tokens=args.max_tokens,
+        group_by_db=args.group_by_db,
     )
 
     # ── Step 6: write finsql.jsonl ────────────────────────────────────────────
@@ -22,6 +22,8 @@ import argparse
 from pathlib import Path
 from dotenv import load_dotenv
 
+from src.util.schema import load_schemas
+
 load_dotenv()
 
 ROOT_PATH = os.environ.get("ROOT_PATH")
@@ -53,6 +55,12 @@ METRICS = [
 def _build_kmaps():
     import spider.evaluation as sp
 
+    # Prebuilt schemas from the normalized catalog; older databases without it
+    # fall back to round-tripping spider_tables through a tables.json file.
+    schemas = load_schemas(OPENTEXT2SQL_DB)
+    if schemas:
+        return {db_id: sp.build_foreign_key_map(s.spider_entry()) for db_id, s in schemas.items()}
+
     conn = sqlite3.connect(OPENTEXT2SQL_DB)
     conn.row_factory = sqlite3.Row
     rows = conn.execute("SELECT * FROM spider_tables").fetchall()
@@ -9,22 +9,29 @@ Usage:
       --source test \
       --difficulty medium \
       --limit 100 \
-      --batch-size 2
+      --workers 4 \
+      --batch-size 2 \
+      --group-by-db
 
 Output:
   experiments/<YYYY-MM-DD_HH-MM-SS>/presql.jsonl
   Each line: {"prompt": "...", "presql": "...", "question": "...", "db_id": "...",
               "source": "...", "difficulty": "...", "gold_sql": "...",
-              "simplified_ddl": "...", "foreign_keys": "...", "cell_values": "...", "few_shot": [...],
+              "simplified_ddl": "...", "foreign_keys": "...", "cell_values": "...", "matched_values": "...",
+              "few_shot": [...], "prompt_tokens": {"<model path>": n} | null,
               "model": "...", "config": "..."}
 """
 
 import os
 import json
 import argparse
+import time
 from datetime import datetime
+from typing import Iterable
 from dotenv import load_dotenv
 
+from src.util.ann import BACKENDS as ANN_BACKENDS
+
 load_dotenv()
 
 ROOT_PATH = os.environ.get("ROOT_PATH")
@@ -36,7 +43,7 @@ PROMPTS_DIR = f"{ROOT_PATH}/config/prompt"
 EXPERIMENTS_DIR = f"{ROOT_PATH}/experiments"
 
 
-def write_presql_jsonl(out_dir: str, records: list, sql_results: list, resolved_model: str, config_name: str) -> str:
+def write_presql_jsonl(out_dir: str, records: Iterable, sql_results: Iterable, resolved_model: str, config_name: str) -> str:
     out_path = os.path.join(out_dir, "presql.jsonl")
     with open(out_path, "w", encoding="utf-8") as f:
         for rec, presql in zip(records, sql_results):
@@ -51,7 +58,9 @@ def write_presql_jsonl(out_dir: str, records: list, sql_results: list, resolved_
                 "simplified_ddl": rec["simplified_ddl"],
                 "foreign_keys":   rec["foreign_keys"],
                 "cell_values":    rec["cell_values"],
+                "matched_values": rec["matched_values"],
                 "few_shot":       rec["few_shot"],
+                "prompt_tokens":  rec.get("prompt_tokens"),
                 "model":          resolved_model,
                 "config":         config_name,
             }
@@ -73,6 +82,14 @@ def main():
                         help="Maximum number of records to process.")
     parser.add_argument("--top-k-few-shot", type=int, default=3,
                         help="Few-shot examples to retrieve per prompt (default: 3).")
+    parser.add_argument("--few-shot-search", choices=["exact", "quantized", *ANN_BACKENDS], default="exact",
+                        help="How the few-shot index is searched: exact, quantized (embedding_quantized) "
+                             "or an ANN backend built by src.pipeline.embedding --ann (default: exact).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes rendering prompts, sharded by db_id (default: 1, serial).")
+    parser.add_argument("--token-budget", action="store_true",
+                        help="Trim prompts to the model's prompt_budget in models.json and record "
+                             "per-record prompt token counts.")
 
     # Inference params (mirrors test_inference.py)
     parser.add_argument("--model", required=True,
@@ -83,6 +100,9 @@ def main():
                         help="Prompts per inference batch (default: 1).")
     parser.add_argument("--max-tokens", type=int, default=512,
                         help="Max tokens to generate per prompt (default: 512).")
+    parser.add_argument("--group-by-db", action="store_true",
+                        help="Batch prompts by db_id and prefill each database's shared prompt prefix "
+                             "(schema first in the config) once, reusing its KV cache across the group.")
     parser.add_argument("--out-dir", default=None,
                         help="Directory to write presql.jsonl into. "
                              "Defaults to experiments/<YYYY-MM-DD_HH-MM-SS>/.")
@@ -99,9 +119,12 @@ def main():
     difficulty = args.difficulty[0] if args.difficulty and len(args.difficulty) == 1 else args.difficulty
 
     # ── Step 1: generate prompts ──────────────────────────────────────────────
-    from src.util.llm import prompt_generation, infer
+    from src.util.llm import prompt_generation, infer, prompt_budget, prompt_token_summary
+
+    budget = prompt_budget([args.model]) if args.token_budget else None
 
     print(f"Generating prompts from {args.config} ({args.source}, difficulty={difficulty or 'all'}, limit={args.limit})...")
+    start = time.perf_counter()
     records = prompt_generation(
         config=config,
         db_path=DB,
@@ -109,13 +132,19 @@ def main():
         difficulty=difficulty,
         limit=args.limit,
         top_k_few_shot=args.top_k_few_shot,
+        few_shot_search=args.few_shot_search,
+        workers=args.workers,
+        budget=budget,
     )
 
     if not records:
         print("No records found for the given filters. Exiting.")
         return
 
-    print(f"Generated {len(records)} prompts.")
+    elapsed = time.perf_counter() - start
+    print(f"Generated {len(records)} prompts in {elapsed:.1f}s ({len(records) / elapsed if elapsed > 0 else 0:.0f} rows/s).")
+    if budget:
+        print(prompt_token_summary((rec["prompt_tokens"] for rec in records), budget))
 
     # ── Step 2: run inference ─────────────────────────────────────────────────
     prompts = [rec["prompt"] for rec in records]
@@ -127,6 +156,7 @@ def main():
         batch_size=args.batch_size,
         max_tokens=args.max_tokens,
         adapter_path=args.adapter_path,
+        group_by=[rec["db_id"] for rec in records] if args.group_by_db else None,
     )
 
     # ── Step 3: write JSONL ───────────────────────────────────────────────────
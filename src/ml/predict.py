@@ -68,6 +68,7 @@ def _load_records(
             placeholders = ",".join("?" * len(difficulty))
             query += f" AND difficulty IN ({placeholders})"
             params.extend(difficulty)
+        query += " ORDER BY rowid"
         if limit:
             query += f" LIMIT {limit}"
         rows = conn.execute(query, params).fetchall()
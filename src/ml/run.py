@@ -28,6 +28,20 @@ Usage:
         --source test --difficulty hard --limit 100 \
         --batch-size 2
 
+  Group prompts by db_id to prefill each database's schema prefix once (prefix-first config):
+
+    uv run python -m src.ml.run \
+        --config OpenText2SQL.json \
+        --models Qwen3.5-9B-MLX-4bit Qwen3-14B-4bit \
+        --source test --batch-size 4 --group-by-db
+
+  Stream records through every step (flat memory for full-split runs):
+
+    uv run python -m src.ml.run \
+        --config OpenText2SQL.json \
+        --models Qwen3.5-9B-MLX-4bit Qwen3-14B-4bit \
+        --source train --stream --batch-size 4
+
   Skip preSQL (baseline: full-schema prompt fed directly into finSQL, no schema linking):
 
     uv run python -m src.ml.run \
@@ -49,10 +63,13 @@ import os
 import sys
 import json
 import argparse
+import time
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 
+from src.util.ann import BACKENDS as ANN_BACKENDS
+
 load_dotenv()
 
 ROOT_PATH = os.environ.get("ROOT_PATH")
@@ -62,6 +79,160 @@ if not ROOT_PATH:
 DB          = f"{ROOT_PATH}/database/OpenText2SQL.db"
 PROMPTS_DIR = f"{ROOT_PATH}/config/prompt"
 EXP_DIR     = f"{ROOT_PATH}/experiments"
+TMP_DIR     = os.environ.get("TMP_DIR")
+
+
+def _skip_presql_record(rec: dict, config_name: str) -> dict:
+    """A prompt_generation record in the field layout finSQL expects from presql.jsonl."""
+    return {
+        "question":       rec["question"],
+        "db_id":          rec["db_id"],
+        "source":         rec["source"],
+        "difficulty":     rec["difficulty"],
+        "gold_sql":       rec["query"],
+        "presql":         None,
+        "model":          None,
+        "config":         config_name,
+        "prompt":         rec["prompt"],
+        "few_shot":       rec["few_shot"],
+        "simplified_ddl": rec["simplified_ddl"],
+        "foreign_keys":   rec["foreign_keys"],
+        "cell_values":    rec["cell_values"],
+        "matched_values": rec["matched_values"],
+        "prompt_tokens":  rec["prompt_tokens"],
+    }
+
+
+def _stream_presql_finsql(
+    args, config: dict, difficulty, presql_model, finsql_models: list, out_dir: str, sep: str,
+    presql_budget=None, finsql_budget=None,
+):
+    """
+    Steps 1–2 with --stream: records flow from gold_dataset through prompt rendering,
+    preSQL inference, schema linking and finSQL inference without any step holding
+    the whole split. presql.jsonl and finsql.jsonl are written line by line and the
+    finSQL models' candidates are spilled under TMP_DIR (see iter_cross_consistency).
+
+    Returns (presql_path or None, finsql_path), or (None, None) when no records match.
+    """
+    import tempfile
+    from itertools import chain, tee
+    from src.util.llm import (
+        PROMPT_BATCH, iter_prompt_generation, infer_iter, resolve_model, schema_linking, iter_cross_consistency,
+    )
+    from src.ml.gen_presql import write_presql_jsonl
+    from src.ml.gen_finsql import write_finsql_jsonl
+
+    stream_batch = args.stream_batch or PROMPT_BATCH
+
+    # ══ Step 1: preSQL ═══════════════════════════════════════════════════════
+    print(f"{sep}")
+    presql_label = "SKIPPED" if args.skip_presql else presql_model
+    print(f"  Step 1/3 — preSQL  [{presql_label}]  (streaming, {stream_batch} rows/batch)")
+    print(f"{sep}")
+
+    print(f"Streaming prompts ({args.source}, difficulty={difficulty or 'all'}, limit={args.limit})...")
+    start = time.perf_counter()
+    batches = iter_prompt_generation(
+        config=config,
+        db_path=DB,
+        source=args.source,
+        difficulty=difficulty,
+        limit=args.limit,
+        top_k_few_shot=args.top_k_few_shot,
+        few_shot_search=args.few_shot_search,
+        workers=args.workers,
+        batch_size=stream_batch,
+        budget=presql_budget,
+    )
+    first = next(batches, None)
+    if not first:
+        print("No records found for the given filters. Exiting.")
+        return None, None
+    print(f"First {len(first)} prompts ready in {time.perf_counter() - start:.1f}s.")
+    records = chain(first, chain.from_iterable(batches))
+
+    if args.skip_presql:
+        print("preSQL inference skipped — initial prompts will be used directly for finSQL.")
+        presql_path = None
+        presql_records = (_skip_presql_record(rec, args.config) for rec in records)
+    else:
+        print(f"Running preSQL inference...")
+        records, for_prompts = tee(records)
+        presql_results = infer_iter(
+            model=presql_model,
+            prompts=(rec["prompt"] for rec in for_prompts),
+            batch_size=args.batch_size,
+            max_tokens=args.max_tokens,
+        )
+        resolved_presql_model = resolve_model(presql_model.partition(":")[0])
+        presql_path = write_presql_jsonl(out_dir, records, presql_results, resolved_presql_model, args.config)
+        print(f"✓ presql.jsonl → {presql_path}")
+        presql_records = _read_jsonl(presql_path)
+    print()
+
+    # ══ Step 2: finSQL ═══════════════════════════════════════════════════════
+    print(f"{sep}")
+    print(f"  Step 2/3 — finSQL  [{', '.join(finsql_models)}]  (streaming)")
+    print(f"{sep}")
+
+    if args.skip_presql:
+        print("Schema linking: SKIPPED")
+        linked = presql_records
+    else:
+        print("Applying schema linking and rendering finSQL prompts record by record...")
+        linked = (
+            _render_finsql_prompt(schema_linking([rec], db_path=DB)[0], config, finsql_budget)
+            for rec in presql_records
+        )
+
+    if len(finsql_models) > 1:
+        print(f"Running cross-consistency with {len(finsql_models)} models...")
+    else:
+        print(f"Running inference (cross-consistency disabled — single model)...")
+
+    resolved_finsql_models = [resolve_model(m.partition(":")[0]) for m in finsql_models]
+    with tempfile.TemporaryDirectory(dir=TMP_DIR) as spill_dir:
+        finsql_results = iter_cross_consistency(
+            models=finsql_models,
+            records=linked,
+            spill_dir=spill_dir,
+            batch_size=args.batch_size,
+            max_tokens=args.max_tokens,
+        )
+        # A result carries every key of its linked record, so it stands in for the
+        # linked record; the original comes from presql.jsonl (or is the result itself
+        # when preSQL was skipped, since linking then copies the record unchanged).
+        if args.skip_presql:
+            origs, linked_results, finsql_results = tee(finsql_results, 3)
+        else:
+            origs = _read_jsonl(presql_path)
+            linked_results, finsql_results = tee(finsql_results)
+        finsql_path = write_finsql_jsonl(
+            out_dir, origs, linked_results, finsql_results, resolved_finsql_models, args.config,
+        )
+    print(f"✓ finsql.jsonl → {finsql_path}")
+    print()
+    return presql_path, finsql_path
+
+
+def _read_jsonl(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _render_finsql_prompt(rec: dict, config: dict, budget=None) -> dict:
+    """Set a linked record's finSQL prompt (trimmed to budget, when given) and prompt_tokens."""
+    from src.util.llm import render_prompt, fit_prompt
+
+    if budget:
+        rendered, rec["prompt_tokens"] = fit_prompt(config, rec, budget, rec.get("section_visibility"), db_path=DB)
+    else:
+        rendered = render_prompt(config, rec, rec.get("section_visibility"), db_path=DB)
+    rec["prompt"] = " ".join(rendered.split())
+    return rec
 
 
 def main():
@@ -80,6 +251,11 @@ def main():
                         help="Maximum number of records to process.")
     parser.add_argument("--top-k-few-shot", type=int, default=3,
                         help="Few-shot examples per prompt (default: 3).")
+    parser.add_argument("--few-shot-search", choices=["exact", "quantized", *ANN_BACKENDS], default="exact",
+                        help="How the few-shot index is searched: exact, quantized (embedding_quantized) "
+                             "or an ANN backend built by src.pipeline.embedding --ann (default: exact).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes rendering prompts, sharded by db_id (default: 1, serial).")
 
     # Inference params
     parser.add_argument("--models", nargs="+",
@@ -96,6 +272,22 @@ def main():
     parser.add_argument("--skip-presql", action="store_true",
                         help="Skip preSQL inference and feed the initial full-schema prompts "
                              "directly into finSQL cross-consistency. --presql-model is ignored.")
+    parser.add_argument("--token-budget", action="store_true",
+                        help="Trim prompts to the models' prompt_budget in models.json (preSQL: --presql-model; "
+                             "finSQL: the smallest over the finSQL models) and record per-record prompt token counts.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream records through prompt generation, preSQL and finSQL instead of "
+                             "building each step's full list; memory stays flat for full-split runs.")
+    parser.add_argument("--stream-batch", type=int, default=None,
+                        help="gold_dataset rows rendered per batch with --stream (default: llm.PROMPT_BATCH, 256).")
+    parser.add_argument("--group-by-db", action="store_true",
+                        help="Batch prompts by db_id and prefill each database's shared prompt prefix "
+                             "(schema first in the config) once, reusing its KV cache across the group. "
+                             "Not applied with --stream, which runs prompts in arrival order.")
+    parser.add_argument("--model-pool-gb", type=float, default=None,
+                        help="Memory budget (GB) for models kept loaded between steps, so the preSQL model is "
+                             "not reloaded for finSQL; 0 disables (default: MODEL_POOL_GB in .env, else the "
+                             "device's recommended working set).")
 
     # Evaluation params
     parser.add_argument("--etype", default="all",
@@ -147,13 +339,33 @@ def main():
 
     difficulty = args.difficulty[0] if args.difficulty and len(args.difficulty) == 1 else args.difficulty
 
+    from src.util.backends import MODEL_POOL
     from src.util.llm import (
         prompt_generation, infer, resolve_model,
-        schema_linking, render_prompt, cross_consistency,
+        schema_linking, cross_consistency, prompt_budget, prompt_token_summary,
     )
     from src.ml.gen_presql import write_presql_jsonl
     from src.ml.gen_finsql import write_finsql_jsonl
 
+    if args.model_pool_gb is not None:
+        MODEL_POOL.resize(int(args.model_pool_gb * 2**30))
+
+    presql_budget = finsql_budget = None
+    if args.token_budget:
+        # With --skip-presql the initial prompts go straight to the finSQL models.
+        presql_budget = prompt_budget(finsql_models if args.skip_presql else [presql_model])
+        finsql_budget = prompt_budget(finsql_models)
+
+    if args.stream:
+        if args.group_by_db:
+            print("⚠️  --group-by-db is ignored with --stream: streamed prompts run in arrival order.")
+        presql_path, finsql_path = _stream_presql_finsql(
+            args, config, difficulty, presql_model, finsql_models, out_dir, sep, presql_budget, finsql_budget,
+        )
+        if finsql_path is not None:
+            _write_metrics(out_dir, presql_path, finsql_path, args.etype, sep)
+        return
+
     # ══ Step 1: preSQL ═══════════════════════════════════════════════════════
     print(f"{sep}")
     presql_label = "SKIPPED" if args.skip_presql else presql_model
@@ -161,6 +373,7 @@ def main():
     print(f"{sep}")
 
     print(f"Generating prompts ({args.source}, difficulty={difficulty or 'all'}, limit={args.limit})...")
+    start = time.perf_counter()
     records = prompt_generation(
         config=config,
         db_path=DB,
@@ -168,31 +381,23 @@ def main():
         difficulty=difficulty,
         limit=args.limit,
         top_k_few_shot=args.top_k_few_shot,
+        few_shot_search=args.few_shot_search,
+        workers=args.workers,
+        budget=presql_budget,
     )
     if not records:
         print("No records found for the given filters. Exiting.")
         return
-    print(f"Generated {len(records)} prompts.")
+    elapsed = time.perf_counter() - start
+    print(f"Generated {len(records)} prompts in {elapsed:.1f}s ({len(records) / elapsed if elapsed > 0 else 0:.0f} rows/s).")
+    if presql_budget:
+        print(prompt_token_summary((rec["prompt_tokens"] for rec in records), presql_budget))
 
     if args.skip_presql:
         print("preSQL inference skipped — initial prompts will be used directly for finSQL.")
         presql_path = None
         # Normalise to the same field layout that finsql steps expect from presql_records
-        presql_records = [{
-            "question":       rec["question"],
-            "db_id":          rec["db_id"],
-            "source":         rec["source"],
-            "difficulty":     rec["difficulty"],
-            "gold_sql":       rec["query"],
-            "presql":         None,
-            "model":          None,
-            "config":         args.config,
-            "prompt":         rec["prompt"],
-            "few_shot":       rec["few_shot"],
-            "simplified_ddl": rec["simplified_ddl"],
-            "foreign_keys":   rec["foreign_keys"],
-            "cell_values":    rec["cell_values"],
-        } for rec in records]
+        presql_records = [_skip_presql_record(rec, args.config) for rec in records]
     else:
         prompts = [r["prompt"] for r in records]
         print(f"Running preSQL inference...")
@@ -201,6 +406,7 @@ def main():
             prompts=prompts,
             batch_size=args.batch_size,
             max_tokens=args.max_tokens,
+            group_by=[r["db_id"] for r in records] if args.group_by_db else None,
         )
 
         resolved_presql_model = resolve_model(presql_model.partition(":")[0])
@@ -221,12 +427,13 @@ def main():
             presql_records = [json.loads(line) for line in f if line.strip()]
 
         print("Applying schema linking...")
-        linked = schema_linking(presql_records)
+        linked = schema_linking(presql_records, db_path=DB)
 
         print("Rendering finSQL prompts with pruned schema...")
         for rec in linked:
-            rendered = render_prompt(config, rec, rec.get("section_visibility"))
-            rec["prompt"] = " ".join(rendered.split())
+            _render_finsql_prompt(rec, config, finsql_budget)
+        if finsql_budget:
+            print(prompt_token_summary((rec["prompt_tokens"] for rec in linked), finsql_budget))
 
     if len(finsql_models) > 1:
         print(f"Running cross-consistency with {len(finsql_models)} models...")
@@ -237,6 +444,7 @@ def main():
         records=linked,
         batch_size=args.batch_size,
         max_tokens=args.max_tokens,
+        group_by_db=args.group_by_db,
     )
 
     resolved_finsql_models = [resolve_model(m.partition(":")[0]) for m in finsql_models]
@@ -244,9 +452,13 @@ def main():
     print(f"✓ finsql.jsonl → {finsql_path}")
     print()
 
+    _write_metrics(out_dir, presql_path, finsql_path, args.etype, sep)
+
+
+def _write_metrics(out_dir: str, presql_path, finsql_path: str, etype: str, sep: str) -> None:
     # ══ Step 3: metrics ══════════════════════════════════════════════════════
     print(f"{sep}")
-    print(f"  Step 3/3 — metrics  [etype={args.etype}]")
+    print(f"  Step 3/3 — metrics  [etype={etype}]")
     print(f"{sep}")
 
     from src.ml.gen_metrics import (
@@ -257,12 +469,12 @@ def main():
     print("Building foreign-key maps...", file=sys.stderr)
     kmaps = _build_kmaps()
 
-    finsql_raw, finsql_meta = _evaluate_file(Path(finsql_path), "finsql", kmaps, args.etype)
+    finsql_raw, finsql_meta = _evaluate_file(Path(finsql_path), "finsql", kmaps, etype)
     finsql_m = _parse_spider_metrics(finsql_raw)
 
     out_dir_path = Path(out_dir)
     if presql_path is not None:
-        presql_raw, presql_meta = _evaluate_file(Path(presql_path), "presql", kmaps, args.etype)
+        presql_raw, presql_meta = _evaluate_file(Path(presql_path), "presql", kmaps, etype)
         presql_m = _parse_spider_metrics(presql_raw)
         header = _markdown_header(presql_meta, finsql_meta)
         report = f"{header}\n\n{_comparison_table(presql_m, finsql_m)}\n"
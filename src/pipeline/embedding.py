@@ -2,19 +2,65 @@
 embedding.py — Builds the few-shot vector index using sqlite-vec.
 
 Public API:
-  build_index(gold_db_path, index_db_path)
+  build_index(gold_db_path, index_db_path, batch_size=256, n_process=1, full=False,
+              quantize=None, ann=None, shared=False)
 
 Retrieval utilities (get_question_skeleton, get_few_shot) live in src.util.nlp.
 
+Skeletons are vectorized in batches through nlp.pipe with every pipeline
+component disabled — Doc.vector only averages the model's static word vectors,
+so tagging, parsing and NER would be wasted work — and inserted into the vec0
+table with one executemany per batch.
+
+db_id, source and difficulty are vec0 metadata columns, so get_few_shot can
+filter on them inside the KNN search (an unknown difficulty is stored as '').
+
+Each indexed row stores a content_hash of (question, simplified_ddl,
+SKELETON_VERSION, vector model, db_id, difficulty). Rebuilds only embed rows
+that are new or whose hash changed, delete rows that left the training split,
+and keep the rest. A changed vector dimension, a column layout that differs
+from embedding.sql or full=True recreate the table.
+
+Dev/test questions are skeletonized and vectorized the same way into
+question_skeletons (database/question_skeletons.sql), keyed by the same content
+hash, so few-shot retrieval at prompt time does no NLP work for known rows.
+question_skeletons_model records the model id and vector dimension the keys
+were computed with, so retrieval does not load spaCy to rebuild them.
+
+quantize="int8" or "binary" also writes embedding_quantized
+(database/embedding_quantized.sql): the same rows as centred int8 or sign-bit
+vectors, for get_few_shot(search="quantized") (run.py --few-shot-search
+quantized). Once built it is refreshed whenever the index changes;
+quantize="none" drops it.
+
+ann="ivf" (any src.util.ann backend) builds an approximate nearest-neighbour
+index over the same vectors and saves it next to the database
+(OpenText2SQL.ivf.npz) for get_few_shot(search="ivf"). Existing backend files
+are rebuilt whenever the index changes; ann="none" deletes them.
+
+shared=True exports the index, the gold question/SQL of every row and the
+precomputed question vectors as memory-mapped .npy files (OpenText2SQL.shared/,
+see src.util.shared_index), which worker processes map instead of each reading
+their own copy. An existing export is refreshed whenever it is stale.
+
 CLI:
   uv run python -m src.pipeline.embedding
+  uv run python -m src.pipeline.embedding --batch-size 1024 --n-process 4
+  uv run python -m src.pipeline.embedding --full
+  uv run python -m src.pipeline.embedding --quantize int8
+  uv run python -m src.pipeline.embedding --ann ivf
+  uv run python -m src.pipeline.embedding --shared
 """
 
 import os
 import re
+import json
+import hashlib
 import sqlite3
+import time
 
 import nltk
+import numpy as np
 import sqlite_vec
 
 try:
@@ -27,10 +73,21 @@ try:
 except LookupError:
     nltk.download('wordnet')
 
-from src.util.nlp import _get_nlp, _open_vec_conn, get_question_skeleton
+from src.util.nlp import (
+    QUANTIZATIONS, _QUANT_META_TABLE, _QUANT_TABLE, _SKELETON_MODEL_TABLE, _SKELETON_TABLE, _codes, _embed, _get_nlp,
+    _open_vec_conn, _quantize, _vector_model_id, get_question_skeleton, skeleton_key,
+)
+from src.util.ann import BACKENDS as ANN_BACKENDS, ann_path, build_ann, save_ann
+from src.util.schema import load_schemas
+from src.util.shared_index import db_stamp, load_shared_index, save_shared_index, shared_index_path
 
 _TABLE = "embedding_dataset"
 _SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "database", "embedding.sql")
+_SKELETON_SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "database", "question_skeletons.sql")
+_QUANT_SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "database", "embedding_quantized.sql")
+
+# Skeletons per nlp.pipe batch, which is also the number of rows per executemany.
+BATCH_SIZE = 256
 
 
 def _load_schema():
@@ -49,61 +106,373 @@ def _get_existing_dim(conn):
     return int(match.group(1)) if match else None
 
 
-def build_index(gold_db_path, index_db_path):
+def _column_layout(create_sql):
+    """Normalized non-vector column declarations of a vec0 CREATE statement."""
+    body = create_sql[create_sql.index("(") + 1:create_sql.rindex(")")]
+    columns = (" ".join(col.split()).lower() for col in body.split(","))
+    return [col for col in columns if col and not col.startswith("vector ")]
+
+
+def _layout_matches(conn):
+    """True if the existing table declares the same metadata / auxiliary columns as embedding.sql."""
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (_TABLE,)
+    ).fetchone()
+    expected = _load_schema()
+    expected = expected[expected.upper().index("CREATE VIRTUAL TABLE"):]
+    return row is not None and _column_layout(row[0]) == _column_layout(expected)
+
+
+def _row_hash(question, simplified_ddl, model_id, db_id, difficulty):
+    """embedding_dataset.content_hash: the skeleton key plus the filterable metadata."""
+    key = json.dumps([skeleton_key(question, simplified_ddl, model_id), db_id, difficulty])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _gold_rows(conn, gold_db_path, index_db_path, sources):
+    """(id, db_id, source, question, simplified_ddl, difficulty) of gold rows in `sources`, in gold order."""
+    sql = (
+        "SELECT id, db_id, source, question, simplified_ddl, difficulty FROM gold_dataset "
+        f"WHERE source IN ({','.join('?' * len(sources))}) ORDER BY rowid"
+    )
+    if gold_db_path == index_db_path:
+        return conn.execute(sql, sources).fetchall()
+    gold_conn = sqlite3.connect(gold_db_path)
+    try:
+        return gold_conn.execute(sql, sources).fetchall()
+    finally:
+        gold_conn.close()
+
+
+def _plan(rows, hashes, indexed):
+    """
+    Compare gold rows against what is stored.
+
+    indexed maps (id, source) → (rowid, content_hash). Returns (stale rowids,
+    [(rowid, row, content_hash)] to embed, number of changed rows). Changed rows
+    keep their rowid; new rows get fresh rowids in gold order.
+    """
+    current = {(row[0], row[2]): h for row, h in zip(rows, hashes)}
+    stale = [rowid for key, (rowid, h) in indexed.items() if current.get(key) != h]
+
+    next_rowid = max((rowid for rowid, _ in indexed.values()), default=0) + 1
+    pending, changed = [], 0
+    for row, content_hash in zip(rows, hashes):
+        previous = indexed.get((row[0], row[2]))
+        if previous and previous[1] == content_hash:
+            continue
+        if previous:
+            rowid, changed = previous[0], changed + 1
+        else:
+            rowid, next_rowid = next_rowid, next_rowid + 1
+        pending.append((rowid, row, content_hash))
+    return stale, pending, changed
+
+
+def _embed_pending(nlp, pending, schemas, batch_size, n_process):
+    """Yield (rowid, row, content_hash, skeleton, vector bytes) for every pending row."""
+    skeletons = [
+        get_question_skeleton(question, schemas.get(db_id) or simplified_ddl)
+        for _, (_, db_id, _, question, simplified_ddl, _), _ in pending
+    ]
+    vectors = _embed(nlp, skeletons, batch_size, n_process)
+    for (rowid, row, content_hash), skeleton, vector in zip(pending, skeletons, vectors):
+        yield rowid, row, content_hash, skeleton, vector.tobytes()
+
+
+def _insert_batches(conn, sql, rows, batch_size):
+    batch = []
+    for done, row in enumerate(rows, start=1):
+        batch.append(row)
+        if len(batch) == batch_size:
+            conn.executemany(sql, batch)
+            batch = []
+        if done % 5000 == 0:
+            print(f"  {done} indexed...")
+    if batch:
+        conn.executemany(sql, batch)
+
+
+def _build_question_skeletons(conn, gold_db_path, index_db_path, nlp, model_id, schemas,
+                              batch_size, n_process):
+    """Precompute skeletons and vectors of dev/test questions so retrieval skips NLP for them."""
+    with open(os.path.normpath(_SKELETON_SCHEMA_FILE), "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+
+    rows = _gold_rows(conn, gold_db_path, index_db_path, ("dev", "test"))
+    hashes = [skeleton_key(question, ddl, model_id) for _, _, _, question, ddl, _ in rows]
+    indexed = {
+        (id_, source): (rowid, content_hash)
+        for rowid, id_, source, content_hash in conn.execute(
+            f"SELECT rowid, id, source, content_hash FROM {_SKELETON_TABLE}"
+        )
+    }
+    stale, pending, changed = _plan(rows, hashes, indexed)
+    conn.executemany(f"DELETE FROM {_SKELETON_TABLE} WHERE rowid = ?", ((rowid,) for rowid in stale))
+    # Lets retrieval compute lookup keys without loading spaCy.
+    conn.execute(f"DELETE FROM {_SKELETON_MODEL_TABLE}")
+    conn.execute(
+        f"INSERT INTO {_SKELETON_MODEL_TABLE} (model_id, dim) VALUES (?, ?)",
+        (model_id, nlp.vocab.vectors_length),
+    )
+    _insert_batches(
+        conn,
+        f"INSERT INTO {_SKELETON_TABLE} (rowid, id, source, content_hash, skeleton, vector) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (rowid, row[0], row[2], content_hash, skeleton, vector)
+            for rowid, row, content_hash, skeleton, vector in _embed_pending(
+                nlp, pending, schemas, batch_size, n_process
+            )
+        ),
+        batch_size,
+    )
+    print(f"  {_SKELETON_TABLE}: {len(rows) - len(pending)} unchanged, {changed} changed, "
+          f"{len(pending) - changed} new, {len(stale) - changed} deleted")
+    return len(pending)
+
+
+def _existing_quantization(conn):
+    """Kind of the current embedding_quantized table, or None if there is none."""
+    try:
+        row = conn.execute(f"SELECT kind FROM {_QUANT_META_TABLE}").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def _build_quantized(conn, kind, batch_size=BATCH_SIZE):
     """
-    Build (or rebuild) the few-shot vector index from gold DB training entries.
+    Rewrite embedding_quantized from the float vectors in embedding_dataset.
+
+    Vectors are centred on their mean; int8 maps the largest centred component
+    to ±127. Returns the number of rows written.
+    """
+    rows = conn.execute(
+        f"SELECT rowid, db_id, source, difficulty, vector FROM {_TABLE} ORDER BY rowid"
+    ).fetchall()
+    dim = _get_existing_dim(conn)
+    if rows:
+        vectors = np.stack([np.frombuffer(r[4], dtype=np.float32) for r in rows])
+    else:
+        vectors = np.zeros((0, dim), dtype=np.float32)
+    center = vectors.mean(axis=0).astype(np.float32) if rows else np.zeros(dim, dtype=np.float32)
+    spread = float(np.abs(vectors - center).max()) if rows else 0.0
+    scale = 127.0 / spread if spread > 0 else 1.0
+
+    column_type, query_sql = QUANTIZATIONS[kind]
+    with open(os.path.normpath(_QUANT_SCHEMA_FILE), "r", encoding="utf-8") as f:
+        conn.executescript(f.read().format(vector_type=column_type(dim)))
+    conn.execute(
+        f"INSERT INTO {_QUANT_META_TABLE} (kind, scale, center) VALUES (?, ?, ?)",
+        (kind, scale, center.tobytes()),
+    )
+    quantized = _quantize(vectors, kind, center, scale)
+    _insert_batches(
+        conn,
+        f"INSERT INTO {_QUANT_TABLE} (rowid, vector, db_id, source, difficulty) VALUES (?, {query_sql}, ?, ?, ?)",
+        (
+            (rowid, q.tobytes(), db_id, source, difficulty)
+            for (rowid, db_id, source, difficulty, _), q in zip(rows, quantized)
+        ),
+        batch_size,
+    )
+    return len(rows)
+
+
+def _build_ann(conn, index_db_path, name):
+    """Build ANN backend `name` over embedding_dataset and save it next to index_db_path."""
+    start = time.perf_counter()
+    rows = conn.execute(f"SELECT rowid, vector FROM {_TABLE} ORDER BY rowid").fetchall()
+    dim = _get_existing_dim(conn)
+    vectors = (np.stack([np.frombuffer(r[1], dtype=np.float32) for r in rows]) if rows
+               else np.zeros((0, dim), dtype=np.float32))
+    path = save_ann(build_ann(name, [r[0] for r in rows], vectors), index_db_path)
+    print(f"  {name}: {len(rows)} vectors → {path} ({time.perf_counter() - start:.1f}s)")
+
+
+def _export_shared(conn, gold_db_path, index_db_path, model_id):
+    """Write the memory-mapped export of the index next to index_db_path."""
+    start = time.perf_counter()
+    rows = conn.execute(
+        f"SELECT rowid, id, source, db_id, difficulty, vector FROM {_TABLE} ORDER BY rowid"
+    ).fetchall()
+    gold_conn = conn if gold_db_path == index_db_path else sqlite3.connect(gold_db_path)
+    try:
+        gold = {
+            (id_, source): (question, query)
+            for id_, source, question, query in gold_conn.execute(
+                "SELECT id, source, question, query FROM gold_dataset WHERE source = 'train'"
+            )
+        }
+    finally:
+        if gold_conn is not conn:
+            gold_conn.close()
+    skeletons = conn.execute(
+        f"SELECT content_hash, vector FROM {_SKELETON_TABLE} ORDER BY content_hash"
+    ).fetchall()
+
+    dim = _get_existing_dim(conn)
+    vectors = (np.stack([np.frombuffer(r[5], dtype=np.float32) for r in rows]) if rows
+               else np.zeros((0, dim), dtype=np.float32))
+    texts = [
+        text.encode("utf-8")
+        for r in rows
+        for text in gold.get((r[1], r[2]), ("", ""))
+    ]
+    db_ids, db_id_names = _codes([r[3] for r in rows])
+    difficulties, difficulty_names = _codes([r[4] for r in rows])
+    path = save_shared_index(
+        shared_index_path(index_db_path),
+        {
+            "rowids": np.array([r[0] for r in rows], dtype=np.int64),
+            "vectors": vectors,
+            "sq_norms": np.einsum("ij,ij->i", vectors, vectors),
+            "db_ids": db_ids,
+            "difficulties": difficulties,
+            "example_offsets": np.concatenate([[0], np.cumsum([len(t) for t in texts], dtype=np.int64)]),
+            "examples": b"".join(texts),
+            "skeleton_keys": np.array([r[0] for r in skeletons], dtype="S64"),
+            "skeleton_vectors": (np.stack([np.frombuffer(r[1], dtype=np.float32) for r in skeletons])
+                                 if skeletons else np.zeros((0, dim), dtype=np.float32)),
+        },
+        {
+            "model_id": model_id,
+            "db_id_names": db_id_names,
+            "difficulty_names": difficulty_names,
+            "index": db_stamp(index_db_path),
+            "gold": db_stamp(gold_db_path),
+        },
+    )
+    print(f"  shared export: {len(rows)} vectors, {len(skeletons)} question vectors → {path} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+def build_index(gold_db_path, index_db_path, batch_size=BATCH_SIZE, n_process=1, full=False,
+                quantize=None, ann=None, shared=False):
+    """
+    Build or update the few-shot vector index from gold DB training entries.
 
     Vector dimension is derived automatically from the spaCy model.
     - Creates the table if it doesn't exist.
-    - Clears and repopulates if the model dimension matches the existing table.
-    - Drops and recreates the table if the model dimension changed.
+    - Otherwise embeds only new or changed rows and deletes vanished ones;
+      unchanged rows keep their rowid, vector and skeleton.
+    - Drops and recreates the table if the model dimension changed, its columns
+      differ from embedding.sql, or full=True.
+
+    Dev/test questions get the same treatment in question_skeletons.
+
+    batch_size skeletons are vectorized and inserted at a time; n_process > 1
+    spreads vectorization over that many spaCy worker processes.
+
+    quantize ("int8", "binary" or "none") builds or drops embedding_quantized;
+    None keeps an existing one in sync with the float index. ann (a
+    src.util.ann backend name or "none") does the same for the ANN files.
+    shared=True writes the memory-mapped export; an existing one is
+    re-exported whenever it no longer matches the databases.
     """
+    if quantize not in (None, "none", *QUANTIZATIONS):
+        raise ValueError(f"Unknown quantization {quantize!r}; expected one of {', '.join(QUANTIZATIONS)} or 'none'.")
+    if ann not in (None, "none", *ANN_BACKENDS):
+        raise ValueError(f"Unknown ANN backend {ann!r}; expected one of {', '.join(ANN_BACKENDS)} or 'none'.")
     nlp = _get_nlp()
     vector_dim = nlp.vocab.vectors_length
+    model_id = _vector_model_id(nlp)
 
     conn = _open_vec_conn(index_db_path)
     try:
         existing_dim = _get_existing_dim(conn)
 
+        recreate = True
         if existing_dim is None:
             print(f"Creating {_TABLE} (vector_dim={vector_dim})")
-            conn.executescript(_load_schema())
         elif existing_dim != vector_dim:
             print(f"Vector dimension changed ({existing_dim} → {vector_dim}), recreating table.")
-            conn.executescript(_load_schema())
-        else:
-            print(f"Rebuilding {_TABLE} (vector_dim={vector_dim})")
-            conn.execute(f"DELETE FROM {_TABLE}")
-
-        if gold_db_path == index_db_path:
-            rows = conn.execute(
-                "SELECT id, db_id, source, question, simplified_ddl "
-                "FROM gold_dataset WHERE source = 'train'"
-            ).fetchall()
+        elif not _layout_matches(conn):
+            print(f"{_TABLE} columns differ from embedding.sql, recreating table.")
+        elif full:
+            print(f"Full rebuild requested, recreating {_TABLE} (vector_dim={vector_dim})")
         else:
-            gold_conn = sqlite3.connect(gold_db_path)
-            try:
-                rows = gold_conn.execute(
-                    "SELECT id, db_id, source, question, simplified_ddl "
-                    "FROM gold_dataset WHERE source = 'train'"
-                ).fetchall()
-            finally:
-                gold_conn.close()
-
-        print(f"Indexing {len(rows)} training entries...")
-        for rowid, (id_, db_id, source, question, simplified_ddl) in enumerate(rows, start=1):
-            skeleton = get_question_skeleton(question, simplified_ddl)
-            vector_bytes = nlp(skeleton).vector.astype('float32').tobytes()
-            conn.execute(
-                f"INSERT INTO {_TABLE}(rowid, vector, id, db_id, source, question, skeleton_question) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (rowid, vector_bytes, id_, db_id, source, question, skeleton),
+            print(f"Updating {_TABLE} (vector_dim={vector_dim})")
+            recreate = False
+        if recreate:
+            conn.executescript(_load_schema())
+            conn.execute(f"DROP TABLE IF EXISTS {_SKELETON_TABLE}")
+            conn.execute(f"DROP TABLE IF EXISTS {_SKELETON_MODEL_TABLE}")
+
+        rows = _gold_rows(conn, gold_db_path, index_db_path, ("train",))
+        hashes = [
+            _row_hash(question, ddl, model_id, db_id, difficulty or "")
+            for _, db_id, _, question, ddl, difficulty in rows
+        ]
+        indexed = {
+            (id_, source): (rowid, content_hash)
+            for rowid, id_, source, content_hash in conn.execute(
+                f"SELECT rowid, id, source, content_hash FROM {_TABLE}"
             )
-            if rowid % 500 == 0:
-                print(f"  {rowid}/{len(rows)} indexed...")
+        }
+        stale, pending, changed = _plan(rows, hashes, indexed)
+        conn.executemany(f"DELETE FROM {_TABLE} WHERE rowid = ?", ((rowid,) for rowid in stale))
+        print(
+            f"  {len(rows) - len(pending)} unchanged, {changed} changed, "
+            f"{len(pending) - changed} new, {len(stale) - changed} deleted"
+        )
+
+        start = time.perf_counter()
+        schemas = load_schemas(gold_db_path)
+        if pending:
+            print(f"Indexing {len(pending)} training entries (batch_size={batch_size}, n_process={n_process})...")
+            _insert_batches(
+                conn,
+                f"INSERT INTO {_TABLE}"
+                "(rowid, vector, db_id, source, difficulty, id, question, skeleton_question, content_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (rowid, vector, db_id, source, difficulty or "", id_, question, skeleton, content_hash)
+                    for rowid, (id_, db_id, source, question, _, difficulty), content_hash, skeleton, vector
+                    in _embed_pending(nlp, pending, schemas, batch_size, n_process)
+                ),
+                batch_size,
+            )
+        n_embedded = len(pending)
+
+        print("Precomputing dev/test question skeletons...")
+        n_embedded += _build_question_skeletons(
+            conn, gold_db_path, index_db_path, nlp, model_id, schemas, batch_size, n_process
+        )
+
+        existing_kind = _existing_quantization(conn)
+        if quantize == "none":
+            if existing_kind:
+                print(f"Dropping {_QUANT_TABLE} ({existing_kind}).")
+            conn.execute(f"DROP TABLE IF EXISTS {_QUANT_TABLE}")
+            conn.execute(f"DROP TABLE IF EXISTS {_QUANT_META_TABLE}")
+        elif quantize or (existing_kind and (recreate or pending or stale)):
+            kind = quantize or existing_kind
+            n_quantized = _build_quantized(conn, kind, batch_size)
+            print(f"  {_QUANT_TABLE}: {n_quantized} {kind} vectors")
 
         conn.commit()
-        print(f"✓ Index built: {len(rows)} vectors saved to {index_db_path}")
+
+        existing_ann = [name for name in ANN_BACKENDS if os.path.exists(ann_path(index_db_path, name))]
+        if ann == "none":
+            for name in existing_ann:
+                print(f"Deleting {ann_path(index_db_path, name)}.")
+                os.remove(ann_path(index_db_path, name))
+        else:
+            changed_index = recreate or pending or stale
+            for name in ANN_BACKENDS:
+                if name == ann or (name in existing_ann and changed_index):
+                    _build_ann(conn, index_db_path, name)
+
+        export = load_shared_index(shared_index_path(index_db_path))
+        if shared or (export is not None and not export.is_fresh(index_db_path, gold_db_path)):
+            _export_shared(conn, gold_db_path, index_db_path, model_id)
+
+        elapsed = time.perf_counter() - start
+        rate = n_embedded / elapsed if elapsed > 0 else float("inf")
+        print(f"✓ Index up to date: {len(rows)} vectors in {index_db_path} "
+              f"({n_embedded} embedded in {elapsed:.1f}s, {rate:.0f} vectors/s)")
     finally:
         conn.close()
 
@@ -122,11 +491,28 @@ if __name__ == "__main__":
         raise ValueError("ROOT_PATH not set. Add it to your .env file.")
 
     parser = argparse.ArgumentParser(description="Build the few-shot vector index from the gold DB.")
-    parser.parse_args()
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"Skeletons vectorized and inserted per batch (default: {BATCH_SIZE}).")
+    parser.add_argument("--n-process", type=int, default=1,
+                        help="spaCy worker processes used for vectorization (default: 1).")
+    parser.add_argument("--full", action="store_true",
+                        help="Recreate the index and re-embed every row instead of only changed ones.")
+    parser.add_argument("--quantize", choices=[*QUANTIZATIONS, "none"],
+                        help="Also build an int8 or binary quantized copy of the index for "
+                             "--few-shot-search quantized (get_few_shot(search='quantized')); "
+                             "'none' drops it (default: keep as is).")
+    parser.add_argument("--ann", choices=[*ANN_BACKENDS, "none"],
+                        help="Also build an approximate nearest-neighbour index for "
+                             "get_few_shot(search=...); 'none' deletes it (default: keep as is).")
+    parser.add_argument("--shared", action="store_true",
+                        help="Also export the index as memory-mapped files shared by worker processes "
+                             "(kept up to date by later builds).")
+    args = parser.parse_args()
 
     db = f"{ROOT_PATH}/database/OpenText2SQL.db"
 
     if not os.path.exists(db):
         raise FileNotFoundError(f"Database not found at {db}. Run src/pipeline/ingest.py first.")
 
-    build_index(db, db)
+    build_index(db, db, batch_size=args.batch_size, n_process=args.n_process, full=args.full,
+                quantize=args.quantize, ann=args.ann, shared=args.shared)
@@ -4,21 +4,60 @@ ingest.py — Single-pass ingestion pipeline.
 Creates database/OpenText2SQL.db containing:
   - bronze_dataset   raw Spider Q/SQL pairs
   - spider_tables    raw schema metadata
+  - schema_tables / schema_columns / schema_foreign_keys
+                     normalized schema catalog keyed by db_id (see src.util.schema)
+  - cell_value_catalog
+                     representative values and stats per Spider column (see src.util.cell_values)
+  - cell_value_index FTS5 trigram index over the distinct text cells of every Spider database
   - silver_dataset   cleaned, schema-enriched, difficulty-labelled rows
   - gold_dataset     final curated dataset consumed by the ML pipeline
 
+Every gold query is executed read-only against its Spider database under a
+time limit; is_valid reflects the outcome and exec_status / exec_time_ms /
+exec_row_count / exec_fingerprint record the run.
+
+Heavy inserts run in bulk-load mode (WAL journal, synchronous=OFF, large page
+cache, chunked executemany); the query indexes in database/indexes.sql are
+built once the data is loaded and the file is switched back to a rollback
+journal so read-only consumers can open it.
+
+Sources are streamed record by record (JSON arrays or JSONL) and the silver,
+validation and gold phases walk their input in STREAM_CHUNK-row pages,
+committing after each one, so peak memory does not grow with corpus size.
+Each phase reports the process's peak RSS (and that of its worker processes).
+
+ingest_manifest records a content hash of every Spider source file and Spider
+.sqlite database. With --incremental, only rows whose bronze record, schema
+metadata or database changed since the last run are re-labelled and
+re-validated; an unchanged corpus is a no-op.
+
 CLI:
   uv run python -m src.pipeline.ingest
+  uv run python -m src.pipeline.ingest --workers 8 --exec-timeout 5
+  uv run python -m src.pipeline.ingest --incremental
+  uv run python -m src.pipeline.ingest --no-bulk-load
 """
 
 import os
+import sys
 import json
 import re
+import hashlib
+import resource
 import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache, partial
+from itertools import islice
 
 from dotenv import load_dotenv
 from spider import evaluation, process_sql
 
+from src.util.cell_values import profile_database, store_text_values, text_values
+from src.util.schema import DbSchema
+
 # Teach sqlite3 to round-trip Python booleans through BOOLEAN columns.
 sqlite3.register_adapter(bool, int)
 sqlite3.register_converter("BOOLEAN", lambda v: bool(int(v)))
@@ -37,15 +76,97 @@ SPIDER_DIR = f"{TMP_DIR}/spider_data"
 SPIDER_DB_PATH = f"{ROOT_PATH}/database/spider"
 OUT_DB = f"{ROOT_PATH}/database/OpenText2SQL.db"
 SCHEMA_FILE = f"{ROOT_PATH}/database/OpenText2SQL.sql"
+INDEX_FILE = f"{ROOT_PATH}/database/indexes.sql"
+
+# Wall-clock limit (seconds) for executing a single gold query during validation.
+EXEC_TIMEOUT = 10.0
+
+# Rows per executemany call during bulk inserts.
+INSERT_CHUNK = 5000
+
+# Rows read, processed and committed per step of the silver / validation / gold phases.
+STREAM_CHUNK = 10000
+
+# Characters read per step when streaming a JSON array source file.
+JSON_READ_BLOCK = 1 << 20
+
+# Page cache used while bulk loading (negative = KiB, i.e. 256 MiB).
+BULK_CACHE_KIB = 262144
+
+# Spider source files and the `source` value their rows are stored under.
+# Either a JSON array or JSONL (one record per line, by .jsonl extension).
+QUESTION_FILES = (("train_spider.json", "train"), ("dev.json", "dev"), ("test.json", "test"))
+TABLE_FILES = (("tables.json", "train_dev"), ("test_tables.json", "test"))
 
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
-def _load_json(path):
+def _iter_records(path):
+    """Yield the records of a JSONL file or a top-level JSON array without loading the whole file."""
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buf, pos, eof = f.read(JSON_READ_BLOCK).lstrip(), 1, False
+        if not buf.startswith("["):
+            raise ValueError(f"{path}: expected a JSON array")
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ","):
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                end = None
+            # A value running to the end of the buffer may be cut short; read on.
+            if end is None or (end == len(buf) and not eof):
+                if eof:
+                    raise ValueError(f"{path}: truncated JSON array")
+                block = f.read(JSON_READ_BLOCK)
+                eof = not block
+                buf, pos = buf[pos:] + block, 0
+                continue
+            yield record
+            pos = end
+
+
+def _peak_rss_mib():
+    """High-water RSS of this process and of its finished child processes, in MiB."""
+    # ru_maxrss is reported in bytes on macOS and in KiB elsewhere.
+    unit = 1 << 20 if sys.platform == "darwin" else 1 << 10
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / unit, children / unit
+
+
+@contextmanager
+def _phase(title):
+    """Print a phase header, then its duration and the peak RSS reached so far."""
+    print(title)
+    start = time.perf_counter()
+    yield
+    own, children = _peak_rss_mib()
+    print(f"  ⏱  {time.perf_counter() - start:.1f}s, peak RSS {own:.0f} MiB (workers {children:.0f} MiB)")
+
+
+def _iter_pages(conn, sql, params=(), chunk_size=STREAM_CHUNK):
+    """
+    Yield the rows of sql in pages of chunk_size, resuming after the last key seen.
+
+    sql selects a rowid as its first column, filters on `rowid > ?` (first
+    placeholder), orders by it and ends in `LIMIT ?`.
+    """
+    last = 0
+    while rows := conn.execute(sql, (last, *params, chunk_size)).fetchall():
+        yield rows
+        last = rows[-1][0]
 
 
 def _clean_question(text):
@@ -56,56 +177,201 @@ def _normalize_sql(sql):
     return re.sub(r"\s+", " ", sql.strip().lower())
 
 
+def _record_hash(record):
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _executemany_chunked(conn, sql, rows, chunk_size=INSERT_CHUNK):
+    """executemany over any iterable in fixed-size chunks; returns the number of rows written."""
+    rows = iter(rows)
+    total = 0
+    while chunk := list(islice(rows, chunk_size)):
+        conn.executemany(sql, chunk)
+        total += len(chunk)
+    return total
+
+
+def _begin_bulk_load(conn):
+    """Trade durability for load speed; the database is rebuilt from Spider on failure anyway."""
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute(f"PRAGMA cache_size = -{BULK_CACHE_KIB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def _end_bulk_load(conn):
+    """Fold the WAL back into the main file so `mode=ro` readers need no -wal/-shm files."""
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.execute("PRAGMA synchronous = FULL")
+
+
+def _build_indexes(conn):
+    with open(INDEX_FILE, "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.execute("ANALYZE")
+
+
+@lru_cache(maxsize=None)
+def _get_evaluator():
+    return evaluation.Evaluator()
+
+
+@lru_cache(maxsize=None)
+def _get_spider_schema(db_id):
+    """Parse a Spider database schema once per process; later lookups hit the cache."""
+    return process_sql.Schema(process_sql.get_schema(_spider_db_path(db_id)))
+
+
 def _get_difficulty(sql_str, db_id):
     try:
-        evaluator = evaluation.Evaluator()
-        schema_path = os.path.join(SPIDER_DB_PATH, db_id, f"{db_id}.sqlite")
-        schema = process_sql.Schema(process_sql.get_schema(schema_path))
+        schema = _get_spider_schema(db_id)
         parsed = process_sql.get_sql(schema, sql_str)
-        return evaluator.eval_hardness(parsed)
+        return _get_evaluator().eval_hardness(parsed)
     except Exception as e:
         print(f"  ⚠️  difficulty eval failed for {db_id}: {e}")
         return None
 
 
-def _get_schema_context(conn, db_id):
-    row = conn.execute(
-        "SELECT table_names_original, column_names_original, column_types, foreign_keys "
-        "FROM spider_tables WHERE db_id = ?",
-        (db_id,),
-    ).fetchone()
-    if not row:
-        return "", "", ""
-
-    table_names = json.loads(row[0])
-    column_names = json.loads(row[1])
-    column_types = json.loads(row[2])
-    foreign_keys_raw = json.loads(row[3])
-
-    table_columns = {t: [] for t in table_names}
-    for idx, (table_idx, col_name) in enumerate(column_names):
-        if table_idx >= 0:
-            table_columns[table_names[table_idx]].append((col_name, column_types[idx]))
-
-    simplified_ddl = [
-        f"{table}({', '.join(col for col, _ in cols)})"
-        for table, cols in table_columns.items()
-    ]
-    full_ddl = [
-        f"CREATE TABLE {table}({', '.join(f'{col} {typ}' for col, typ in cols)});"
-        for table, cols in table_columns.items()
+def _score_shard(db_id, items):
+    """Worker entry point: label every (id, source, query) of a single db_id."""
+    return [(row_id, source, _get_difficulty(query, db_id)) for row_id, source, query in items]
+
+
+def _spider_db_path(db_id):
+    return os.path.join(SPIDER_DB_PATH, db_id, f"{db_id}.sqlite")
+
+
+def _spider_db_ids():
+    """db_ids with a .sqlite database under SPIDER_DB_PATH, sorted."""
+    if not os.path.isdir(SPIDER_DB_PATH):
+        return []
+    return [db_id for db_id in sorted(os.listdir(SPIDER_DB_PATH)) if os.path.exists(_spider_db_path(db_id))]
+
+
+def _profile_shard(db_id):
+    """
+    Worker entry point: (cell_value_catalog rows, cell_value_index rows) of a single
+    db_id, both empty if its database is gone or unreadable.
+    """
+    db_path = _spider_db_path(db_id)
+    if not os.path.exists(db_path):
+        return [], []
+    try:
+        columns = profile_database(db_path)
+        values = list(text_values(db_path))
+    except sqlite3.Error as e:
+        print(f"  ⚠️  cell value profiling failed for {db_id}: {e}")
+        return [], []
+    catalog = [
+        (db_id, c.table_pos, c.table, c.column_pos, c.column, c.type, c.distinct_count, c.null_count,
+         json.dumps(list(c.values), ensure_ascii=False))
+        for c in columns
     ]
+    return catalog, values
 
-    fk_list = []
-    for i, j in foreign_keys_raw:
-        src_table_idx, src_col = column_names[i]
-        tgt_table_idx, tgt_col = column_names[j]
-        fk_list.append(
-            f"{table_names[src_table_idx]}({src_col}) "
-            f"REFERENCES {table_names[tgt_table_idx]}({tgt_col})"
-        )
 
-    return json.dumps(simplified_ddl), json.dumps(full_ddl), json.dumps(fk_list)
+def _result_fingerprint(rows):
+    """Order-insensitive hash of a result set (Spider compares results as multisets)."""
+    digest = hashlib.sha1()
+    for line in sorted(repr(row) for row in rows):
+        digest.update(line.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def _validate_shard(db_id, items, timeout=EXEC_TIMEOUT):
+    """
+    Worker entry point: execute every (id, source, query) of a single db_id.
+
+    The database is opened read-only and each statement is interrupted once it
+    runs past `timeout` seconds. Returns (id, source, status, time_ms, row_count,
+    fingerprint) per item, where status is 'ok', 'error' or 'timeout'.
+    """
+    db_path = _spider_db_path(db_id)
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return [(row_id, source, "error", None, None, None) for row_id, source, _ in items]
+
+    deadline = [0.0]
+    conn.set_progress_handler(lambda: time.perf_counter() > deadline[0], 1000)
+    results = []
+    try:
+        for row_id, source, query in items:
+            start = time.perf_counter()
+            deadline[0] = start + timeout
+            try:
+                rows = conn.execute(query).fetchall()
+            except sqlite3.OperationalError as e:
+                status = "timeout" if "interrupted" in str(e) else "error"
+                results.append((row_id, source, status, None, None, None))
+                continue
+            except Exception:
+                results.append((row_id, source, "error", None, None, None))
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            results.append((row_id, source, "ok", elapsed_ms, len(rows), _result_fingerprint(rows)))
+    finally:
+        conn.close()
+    return results
+
+
+def _worker_pool(workers):
+    """A process pool for _map_shards, or a null context (serial) when workers <= 1."""
+    return ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext()
+
+
+def _map_shards(func, shards, pool=None):
+    """
+    Apply func(db_id, items) to every shard of {db_id: [...]} and flatten the results.
+
+    Shards are dispatched whole so each worker sets up a db_id (schema, connection)
+    only once. Runs in-process without a pool. The same pool is reused across
+    chunks, so per-process caches stay warm.
+    """
+    # Largest shards first keeps the pool busy until the end.
+    db_ids = sorted(shards, key=lambda db_id: len(shards[db_id]), reverse=True)
+    shard_items = [shards[db_id] for db_id in db_ids]
+
+    if pool is None or len(db_ids) <= 1:
+        results = list(map(func, db_ids, shard_items))
+    else:
+        results = list(pool.map(func, db_ids, shard_items))
+
+    return [out for shard_results in results for out in shard_results]
+
+
+def _load_spider_schemas(conn):
+    """
+    Build {db_id: DbSchema} from spider_tables in one scan.
+
+    A db_id listed in both tables.json and test_tables.json keeps its first row,
+    matching what a per-row `WHERE db_id = ?` lookup would return.
+    """
+    schemas = {}
+    rows = conn.execute(
+        "SELECT db_id, table_names_original, column_names_original, column_types, foreign_keys, "
+        "primary_keys, table_names, column_names "
+        "FROM spider_tables ORDER BY rowid"
+    )
+    for db_id, *schema_json in rows:
+        if db_id not in schemas:
+            schemas[db_id] = DbSchema.from_spider(db_id, *(json.loads(v) for v in schema_json))
+    return schemas
+
+
+def _schema_context(schema):
+    return (
+        schema.simplified_ddl_json,
+        json.dumps(list(schema.full_ddl)),
+        json.dumps(list(schema.foreign_key_lines)),
+    )
+
+
+def _load_schema_contexts(conn):
+    """{db_id: (simplified_ddl, full_ddl, foreign_keys)} as stored in silver/gold."""
+    return {db_id: _schema_context(schema) for db_id, schema in _load_spider_schemas(conn).items()}
 
 
 # ---------------------------------------------------------------------------
@@ -114,12 +380,14 @@ def _get_schema_context(conn, db_id):
 
 def _ingest_spider(conn):
     def insert_json(file_name, source):
-        data = _load_json(os.path.join(SPIDER_DIR, file_name))
-        conn.executemany(
+        data = _iter_records(os.path.join(SPIDER_DIR, file_name))
+        count = _executemany_chunked(
+            conn,
             "INSERT INTO bronze_dataset "
-            "(id, db_id, source, question, question_toks, query, query_toks, query_toks_no_value, sql_json) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            [
+            "(id, db_id, source, question, question_toks, query, query_toks, query_toks_no_value, "
+            "sql_json, content_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
                 (
                     idx,
                     r["db_id"],
@@ -130,20 +398,23 @@ def _ingest_spider(conn):
                     json.dumps(r.get("query_toks", [])),
                     json.dumps(r.get("query_toks_no_value", [])),
                     json.dumps(r.get("sql", {})),
+                    _record_hash(r),
                 )
                 for idx, r in enumerate(data)
-            ],
+            ),
         )
-        print(f"  bronze_dataset ← {file_name} ({len(data)} rows)")
+        conn.commit()
+        print(f"  bronze_dataset ← {file_name} ({count} rows)")
 
     def insert_tables(file_name, source):
-        data = _load_json(os.path.join(SPIDER_DIR, file_name))
-        conn.executemany(
+        data = _iter_records(os.path.join(SPIDER_DIR, file_name))
+        count = _executemany_chunked(
+            conn,
             "INSERT INTO spider_tables "
             "(db_id, source, table_names, table_names_original, column_names, "
             "column_names_original, column_types, primary_keys, foreign_keys) "
             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            [
+            (
                 (
                     s["db_id"],
                     source,
@@ -156,106 +427,422 @@ def _ingest_spider(conn):
                     json.dumps(s.get("foreign_keys", [])),
                 )
                 for s in data
-            ],
+            ),
         )
-        print(f"  spider_tables  ← {file_name} ({len(data)} rows)")
+        conn.commit()
+        print(f"  spider_tables  ← {file_name} ({count} rows)")
 
-    insert_json("train_spider.json", "train")
-    insert_json("dev.json", "dev")
-    insert_json("test.json", "test")
-    insert_tables("tables.json", "train_dev")
-    insert_tables("test_tables.json", "test")
+    for file_name, source in QUESTION_FILES:
+        insert_json(file_name, source)
+    for file_name, source in TABLE_FILES:
+        insert_tables(file_name, source)
 
 
-def _build_silver(conn):
-    rows = conn.execute(
-        "SELECT id, db_id, source, question, query, query_toks_no_value, sql_json "
-        "FROM bronze_dataset"
-    ).fetchall()
-
-    errors = 0
-    batch = []
-    for row_id, db_id, source, question, query, query_toks_no_value, sql_json in rows:
-        try:
-            simplified_ddl, full_ddl, foreign_keys = _get_schema_context(conn, db_id)
-            difficulty = _get_difficulty(query, db_id)
-            batch.append((
-                row_id,
-                db_id,
-                source,
-                _clean_question(question),
-                _normalize_sql(query),
-                query_toks_no_value,
-                sql_json,
-                True,
-                simplified_ddl,
-                full_ddl,
-                foreign_keys,
-                difficulty,
-            ))
-        except Exception as e:
-            print(f"  ❌ {db_id} id={row_id}: {e}")
-            errors += 1
+def _build_schema_catalog(conn):
+    """Rewrite schema_tables / schema_columns / schema_foreign_keys from spider_tables."""
+    schemas = _load_spider_schemas(conn).values()
+    for table in ("schema_tables", "schema_columns", "schema_foreign_keys"):
+        conn.execute(f"DELETE FROM {table}")
 
-    conn.executemany(
-        "INSERT INTO silver_dataset "
-        "(id, db_id, source, question, query, query_toks_no_value, sql_json, "
-        "is_valid, simplified_ddl, full_ddl, foreign_keys, difficulty) "
-        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        batch,
+    n_tables = _executemany_chunked(
+        conn,
+        "INSERT INTO schema_tables (db_id, table_idx, name, display_name) VALUES (?, ?, ?, ?)",
+        ((s.db_id, t.idx, t.name, t.display_name) for s in schemas for t in s.tables),
+    )
+    n_columns = _executemany_chunked(
+        conn,
+        "INSERT INTO schema_columns "
+        "(db_id, column_idx, table_idx, name, display_name, type, is_primary_key) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            (s.db_id, c.idx, c.table_idx, c.name, c.display_name, c.type, c.is_primary_key)
+            for s in schemas for c in s.columns
+        ),
+    )
+    n_fks = _executemany_chunked(
+        conn,
+        "INSERT INTO schema_foreign_keys (db_id, fk_idx, column_idx, ref_column_idx) VALUES (?, ?, ?, ?)",
+        (
+            (s.db_id, idx, fk.column_idx, fk.ref_column_idx)
+            for s in schemas for idx, fk in enumerate(s.foreign_keys)
+        ),
+    )
+    print(f"  schema catalog ← {len(schemas)} db_ids, {n_tables} tables, "
+          f"{n_columns} columns, {n_fks} foreign keys")
+
+
+def _build_cell_value_catalog(conn, db_ids, workers=1):
+    """Rewrite the cell_value_catalog and cell_value_index rows of db_ids by profiling their Spider databases."""
+    db_ids = sorted(db_ids)
+    _executemany_chunked(conn, "DELETE FROM cell_value_catalog WHERE db_id = ?", ((db_id,) for db_id in db_ids))
+    n_columns = n_values = 0
+    with _worker_pool(workers) as pool:
+        for db_id, (catalog, values) in zip(db_ids, (pool.map if pool else map)(_profile_shard, db_ids)):
+            n_columns += _executemany_chunked(
+                conn,
+                "INSERT INTO cell_value_catalog "
+                "(db_id, table_pos, table_name, column_pos, column_name, type, distinct_count, null_count, "
+                "sample_values) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                catalog,
+            )
+            n_values += store_text_values(conn, db_id, values)
+    # Merge the FTS segments written above into one b-tree for faster lookups.
+    conn.execute("INSERT INTO cell_value_index (cell_value_index) VALUES ('optimize')")
+    conn.commit()
+    print(f"  cell_value_catalog ← {len(db_ids)} db_ids, {n_columns} columns")
+    print(f"  cell_value_index   ← {n_values} distinct text values")
+
+
+def _build_silver(conn, workers=1):
+    """Label and insert every bronze row that has no silver row yet (all of them on a full build)."""
+    pages = _iter_pages(
+        conn,
+        "SELECT b.rowid, b.id, b.db_id, b.source, b.question, b.query, b.query_toks_no_value, "
+        "b.sql_json, b.content_hash "
+        "FROM bronze_dataset b WHERE b.rowid > ? AND NOT EXISTS ("
+        "SELECT 1 FROM silver_dataset s WHERE s.id = b.id AND s.source = b.source) "
+        "ORDER BY b.rowid LIMIT ?",
+    )
+
+    start = time.perf_counter()
+    contexts = _load_schema_contexts(conn)
+    total = errors = 0
+    db_ids = set()
+
+    with _worker_pool(workers) as pool:
+        for rows in pages:
+            shards = defaultdict(list)
+            for _, row_id, db_id, source, _, query, _, _, _ in rows:
+                shards[db_id].append((row_id, source, query))
+            db_ids.update(shards)
+            difficulties = {
+                (row_id, source): difficulty
+                for row_id, source, difficulty in _map_shards(_score_shard, shards, pool)
+            }
+
+            batch = []
+            for _, row_id, db_id, source, question, query, query_toks_no_value, sql_json, content_hash in rows:
+                try:
+                    simplified_ddl, full_ddl, foreign_keys = contexts.get(db_id, ("", "", ""))
+                    batch.append((
+                        row_id,
+                        db_id,
+                        source,
+                        _clean_question(question),
+                        _normalize_sql(query),
+                        query_toks_no_value,
+                        sql_json,
+                        True,
+                        simplified_ddl,
+                        full_ddl,
+                        foreign_keys,
+                        difficulties[(row_id, source)],
+                        content_hash,
+                    ))
+                except Exception as e:
+                    print(f"  ❌ {db_id} id={row_id}: {e}")
+                    errors += 1
+
+            total += _executemany_chunked(
+                conn,
+                "INSERT INTO silver_dataset "
+                "(id, db_id, source, question, query, query_toks_no_value, sql_json, "
+                "is_valid, simplified_ddl, full_ddl, foreign_keys, difficulty, content_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+            conn.commit()
+
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else float("inf")
+    print(
+        f"  silver_dataset ← {total} rows ({errors} errors) "
+        f"in {elapsed:.1f}s ({rate:.0f} rows/s, {len(db_ids)} db_ids, workers={workers})"
+    )
+
+
+def _validate_silver(conn, workers=1, timeout=EXEC_TIMEOUT):
+    """Execute the gold SQL of every silver row that has not been validated yet."""
+    # Execute the original bronze SQL: silver's normalized query is lower-cased,
+    # which would change the meaning of string literals.
+    pages = _iter_pages(
+        conn,
+        "SELECT s.rowid, s.id, s.source, s.db_id, b.query "
+        "FROM silver_dataset s JOIN bronze_dataset b ON b.id = s.id AND b.source = s.source "
+        "WHERE s.rowid > ? AND s.exec_status IS NULL ORDER BY s.rowid LIMIT ?",
+    )
+
+    start = time.perf_counter()
+    counts = defaultdict(int)
+    validate = partial(_validate_shard, timeout=timeout)
+
+    with _worker_pool(workers) as pool:
+        for rows in pages:
+            shards = defaultdict(list)
+            for _, row_id, source, db_id, query in rows:
+                shards[db_id].append((row_id, source, query))
+            results = _map_shards(validate, shards, pool)
+
+            _executemany_chunked(
+                conn,
+                "UPDATE silver_dataset SET is_valid = ?, exec_status = ?, exec_time_ms = ?, "
+                "exec_row_count = ?, exec_fingerprint = ? WHERE id = ? AND source = ?",
+                (
+                    (status == "ok", status, time_ms, row_count, fingerprint, row_id, source)
+                    for row_id, source, status, time_ms, row_count, fingerprint in results
+                ),
+            )
+            conn.commit()
+            for _, _, status, *_ in results:
+                counts[status] += 1
+
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    rate = total / elapsed if elapsed > 0 else float("inf")
+    print(
+        f"  silver_dataset ✓ {counts['ok']} ok, {counts['error']} error, "
+        f"{counts['timeout']} timeout (limit {timeout:g}s) "
+        f"in {elapsed:.1f}s ({rate:.0f} rows/s, workers={workers})"
     )
-    print(f"  silver_dataset ← {len(batch)} rows ({errors} errors)")
 
 
 def _build_gold(conn):
-    rows = conn.execute(
-        "SELECT id, db_id, source, question, query, is_valid, "
-        "simplified_ddl, full_ddl, foreign_keys, difficulty "
-        "FROM silver_dataset"
-    ).fetchall()
+    # Always rewritten in bronze order, so gold's row order does not depend on
+    # which silver rows an incremental run rebuilt.
+    pages = _iter_pages(
+        conn,
+        "SELECT b.rowid, s.id, s.db_id, s.source, s.question, s.query, s.is_valid, "
+        "s.simplified_ddl, s.full_ddl, s.foreign_keys, s.difficulty, "
+        "s.exec_status, s.exec_time_ms, s.exec_row_count, s.exec_fingerprint "
+        "FROM silver_dataset s JOIN bronze_dataset b ON b.id = s.id AND b.source = s.source "
+        "WHERE b.rowid > ? ORDER BY b.rowid LIMIT ?",
+    )
+
+    conn.execute("DELETE FROM gold_dataset")
+    total = 0
+    for rows in pages:
+        total += _executemany_chunked(
+            conn,
+            "INSERT INTO gold_dataset "
+            "(id, db_id, source, question, query, is_valid, "
+            "simplified_ddl, full_ddl, foreign_keys, difficulty, "
+            "exec_status, exec_time_ms, exec_row_count, exec_fingerprint) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (row[1:] for row in rows),
+        )
+        conn.commit()
+    print(f"  gold_dataset   ← {total} rows")
 
+
+# ---------------------------------------------------------------------------
+# Incremental re-ingestion
+# ---------------------------------------------------------------------------
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _current_fingerprints(previous):
+    """
+    Return {(kind, name): (size, mtime_ns, sha256)} for the schema file, every Spider
+    source file and every Spider database. Files whose size and mtime match the
+    `previous` manifest reuse its hash instead of being read again.
+    """
+    paths = {("schema", os.path.basename(SCHEMA_FILE)): SCHEMA_FILE}
+    for file_name, _ in QUESTION_FILES + TABLE_FILES:
+        paths[("source", file_name)] = os.path.join(SPIDER_DIR, file_name)
+    for db_id in _spider_db_ids():
+        paths[("database", db_id)] = _spider_db_path(db_id)
+
+    fingerprints = {}
+    for key, path in paths.items():
+        stat = os.stat(path)
+        old = previous.get(key)
+        if old and old[0] == stat.st_size and old[1] == stat.st_mtime_ns:
+            fingerprints[key] = old
+        else:
+            fingerprints[key] = (stat.st_size, stat.st_mtime_ns, _sha256(path))
+    return fingerprints
+
+
+def _load_manifest(conn):
+    """Return the stored fingerprints, or None if this database has no manifest."""
+    try:
+        rows = conn.execute("SELECT kind, name, size, mtime_ns, sha256 FROM ingest_manifest").fetchall()
+    except sqlite3.OperationalError:
+        return None
+    return {(kind, name): (size, mtime_ns, sha256) for kind, name, size, mtime_ns, sha256 in rows}
+
+
+def _save_manifest(conn, fingerprints):
+    conn.execute("DELETE FROM ingest_manifest")
     conn.executemany(
-        "INSERT INTO gold_dataset "
-        "(id, db_id, source, question, query, is_valid, "
-        "simplified_ddl, full_ddl, foreign_keys, difficulty) "
-        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        rows,
+        "INSERT INTO ingest_manifest (kind, name, size, mtime_ns, sha256) VALUES (?, ?, ?, ?, ?)",
+        [(kind, name, *fingerprint) for (kind, name), fingerprint in sorted(fingerprints.items())],
+    )
+
+
+def _drop_stale_silver(conn, db_ids):
+    """Delete silver rows of the given db_ids and rows whose bronze record changed or vanished."""
+    placeholders = ",".join("?" * len(db_ids))
+    cursor = conn.execute(
+        f"DELETE FROM silver_dataset WHERE db_id IN ({placeholders}) OR NOT EXISTS ("
+        "SELECT 1 FROM bronze_dataset b WHERE b.id = silver_dataset.id "
+        "AND b.source = silver_dataset.source AND b.content_hash = silver_dataset.content_hash)",
+        sorted(db_ids),
     )
-    print(f"  gold_dataset   ← {len(rows)} rows")
+    return cursor.rowcount
+
+
+def _ingest_full(conn, workers, exec_timeout):
+    with open(SCHEMA_FILE, "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+
+    with _phase("Phase 1 — ingesting Spider data..."):
+        _ingest_spider(conn)
+        _build_schema_catalog(conn)
+        _build_cell_value_catalog(conn, _spider_db_ids(), workers)
+
+    with _phase("Phase 2 — building silver_dataset..."):
+        _build_silver(conn, workers)
+
+    with _phase("Phase 3 — validating gold SQL against Spider databases..."):
+        _validate_silver(conn, workers, exec_timeout)
+
+    with _phase("Phase 4 — building gold_dataset..."):
+        _build_gold(conn)
+
+    with _phase("Phase 5 — building query indexes..."):
+        _build_indexes(conn)
+
+
+def _ingest_incremental(conn, previous, fingerprints, workers, exec_timeout):
+    """
+    Rebuild only what changed since the manifest was written.
+
+    Bronze and spider_tables are cheap to reload and are rewritten whenever any
+    source file changed. Silver rows are rebuilt when their bronze record changed,
+    or when their db_id's schema metadata or .sqlite database changed. Gold is
+    then rewritten from silver.
+    """
+    missing = (None, None, None)
+    changed = {
+        key for key in previous.keys() | fingerprints.keys()
+        if previous.get(key, missing)[2] != fingerprints.get(key, missing)[2]
+    }
+    if not changed:
+        print("✓ Up to date — no Spider source file or database changed.")
+        return
+
+    changed_files = sorted(name for kind, name in changed if kind == "source")
+    changed_dbs = {name for kind, name in changed if kind == "database"}
+    affected_dbs = set(changed_dbs)
+
+    # Phases commit as they go. Dropping the manifest first means a run that dies
+    # halfway is followed by a full build rather than trusting half-updated tables.
+    conn.execute("DELETE FROM ingest_manifest")
+    conn.commit()
+
+    if changed_files:
+        with _phase(f"Phase 1 — re-ingesting Spider data ({', '.join(changed_files)} changed)..."):
+            old_contexts = _load_schema_contexts(conn)
+            conn.execute("DELETE FROM bronze_dataset")
+            conn.execute("DELETE FROM spider_tables")
+            _ingest_spider(conn)
+            _build_schema_catalog(conn)
+            new_contexts = _load_schema_contexts(conn)
+            affected_dbs |= {
+                db_id for db_id in old_contexts.keys() | new_contexts.keys()
+                if old_contexts.get(db_id) != new_contexts.get(db_id)
+            }
+    else:
+        print("Phase 1 — Spider source files unchanged, skipping.")
+
+    if changed_dbs:
+        _build_cell_value_catalog(conn, changed_dbs, workers)
+
+    dropped = _drop_stale_silver(conn, affected_dbs)
+    conn.commit()
+    print(f"  silver_dataset ✗ {dropped} stale rows dropped ({len(affected_dbs)} db_ids affected)")
+
+    with _phase("Phase 2 — rebuilding changed silver_dataset rows..."):
+        _build_silver(conn, workers)
+
+    with _phase("Phase 3 — validating changed gold SQL against Spider databases..."):
+        _validate_silver(conn, workers, exec_timeout)
+
+    with _phase("Phase 4 — building gold_dataset..."):
+        _build_gold(conn)
+
+    # Indexes survive incremental runs; this only refreshes planner statistics
+    # (and creates indexes added to indexes.sql since the last full build).
+    _build_indexes(conn)
 
 
 # ---------------------------------------------------------------------------
 # Entry point
 # ---------------------------------------------------------------------------
 
-def main():
+def main(workers=None, exec_timeout=EXEC_TIMEOUT, incremental=False, bulk=True):
+    workers = workers or os.cpu_count() or 1
     os.makedirs(os.path.dirname(OUT_DB), exist_ok=True)
 
     if not os.path.exists(SCHEMA_FILE):
         raise FileNotFoundError(f"Schema file not found: {SCHEMA_FILE}")
 
+    start = time.perf_counter()
     conn = sqlite3.connect(OUT_DB, detect_types=sqlite3.PARSE_DECLTYPES)
     try:
-        with open(SCHEMA_FILE, "r", encoding="utf-8") as f:
-            conn.executescript(f.read())
-
-        print("Phase 1 — ingesting Spider data...")
-        _ingest_spider(conn)
+        if bulk:
+            _begin_bulk_load(conn)
 
-        print("Phase 2 — building silver_dataset...")
-        _build_silver(conn)
+        previous = _load_manifest(conn) if incremental else None
+        fingerprints = _current_fingerprints(previous or {})
 
-        print("Phase 3 — building gold_dataset...")
-        _build_gold(conn)
+        schema_key = ("schema", os.path.basename(SCHEMA_FILE))
+        if previous and previous.get(schema_key, (None,) * 3)[2] == fingerprints[schema_key][2]:
+            _ingest_incremental(conn, previous, fingerprints, workers, exec_timeout)
+        else:
+            if incremental:
+                print("No usable ingest manifest (first run or schema changed) — running a full build.")
+            _ingest_full(conn, workers, exec_timeout)
 
+        _save_manifest(conn, fingerprints)
         conn.commit()
-        print(f"\n✓ Done → {OUT_DB}")
+        print(f"\n✓ Done in {time.perf_counter() - start:.1f}s → {OUT_DB}")
     except Exception:
         conn.rollback()
         raise
     finally:
+        if bulk:
+            _end_bulk_load(conn)
         conn.close()
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build OpenText2SQL.db from the Spider dataset.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes used to label difficulty and validate gold SQL, "
+                             "sharded by db_id (default: CPU count; 1 = serial).")
+    parser.add_argument("--exec-timeout", type=float, default=EXEC_TIMEOUT,
+                        help=f"Seconds allowed per gold query during validation (default: {EXEC_TIMEOUT:g}).")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only rebuild rows affected by Spider files or databases that changed "
+                             "since the last run (falls back to a full build without a manifest).")
+    parser.add_argument("--no-bulk-load", action="store_true",
+                        help="Write through SQLite's default rollback journal instead of the "
+                             "WAL / synchronous=OFF bulk-load settings.")
+    args = parser.parse_args()
+
+    main(
+        workers=args.workers,
+        exec_timeout=args.exec_timeout,
+        incremental=args.incremental,
+        bulk=not args.no_bulk_load,
+    )
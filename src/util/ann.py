@@ -0,0 +1,168 @@
+"""
+ann.py — Approximate nearest-neighbour backends for the few-shot index.
+
+Public API:
+  BACKENDS                                        name → backend class
+  ann_path(index_db_path, name)                  -> str
+  build_ann(name, rowids, vectors, **params)     -> backend
+  load_ann(index_db_path, name)                  -> backend
+  save_ann(backend, index_db_path)               -> str
+
+A backend only narrows the search: candidates(query, k, widen) returns the
+embedding_dataset rowids worth scoring, and src.util.nlp scores them exactly
+against the in-memory index. Larger widen values return more candidates;
+once a backend returns every rowid the search is exhaustive. len(backend) is
+the number of rowids it was built over.
+
+Backends are persisted next to the index database as <db stem>.<name>.npz
+(OpenText2SQL.ivf.npz) by src.pipeline.embedding.build_index(ann=...).
+
+Backends:
+  ivf   inverted file: k-means centroids over the vectors; a query scans the
+        lists of its n_probe nearest centroids.
+"""
+
+import os
+from functools import lru_cache
+
+import numpy as np
+
+BACKENDS = {}
+
+
+def _register(cls):
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+def ann_path(index_db_path, name):
+    """Path of backend `name`'s file for the index in index_db_path."""
+    return f"{os.path.splitext(index_db_path)[0]}.{name}.npz"
+
+
+def build_ann(name, rowids, vectors, **params):
+    """Build backend `name` over float32 vectors (one row per rowid)."""
+    return BACKENDS[name].build(np.asarray(rowids, dtype=np.int64), np.asarray(vectors, dtype=np.float32),
+                                **params)
+
+
+@lru_cache(maxsize=4)
+def _load_file(path, mtime_ns, size, name):
+    with np.load(path) as data:
+        return BACKENDS[name].from_arrays(dict(data))
+
+
+def load_ann(index_db_path, name):
+    """
+    Load backend `name` for the index in index_db_path.
+
+    Cached per file version (mtime/size), so a rebuilt backend is picked up on the next call.
+    """
+    path = ann_path(index_db_path, name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"No {name} index at {path}. Run src/pipeline/embedding.py with --ann {name} first."
+        )
+    stat = os.stat(path)
+    return _load_file(path, stat.st_mtime_ns, stat.st_size, name)
+
+
+def save_ann(backend, index_db_path):
+    """Write backend next to index_db_path, replacing any previous file atomically."""
+    path = ann_path(index_db_path, backend.name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **backend.to_arrays())
+    os.replace(tmp_path, path)
+    return path
+
+
+# ---------------------------------------------------------------------------
+# IVF
+# ---------------------------------------------------------------------------
+
+# Rows assigned to centroids per matrix multiply.
+_ASSIGN_CHUNK = 65536
+
+
+def _nearest(vectors, centroids):
+    """Index of the nearest centroid (L2) for every row of vectors."""
+    c_sq = np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        chunk = vectors[start:start + _ASSIGN_CHUNK]
+        out[start:start + len(chunk)] = np.argmin(c_sq[None, :] - 2.0 * (chunk @ centroids.T), axis=1)
+    return out
+
+
+def _kmeans(vectors, n_lists, iterations, sample_per_list, rng):
+    """Lloyd's k-means on a sample of at most n_lists × sample_per_list rows."""
+    n_sample = min(len(vectors), n_lists * sample_per_list)
+    sample = vectors[rng.choice(len(vectors), n_sample, replace=False)]
+    centroids = sample[rng.choice(n_sample, n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(sample, centroids)
+        counts = np.bincount(assign, minlength=n_lists)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty lists with random sample rows.
+        centroids[~filled] = sample[rng.choice(n_sample, int((~filled).sum()))]
+    return centroids
+
+
+@_register
+class IvfIndex:
+    """
+    Inverted-file index: rowids grouped by nearest k-means centroid.
+
+    Lists are stored as one rowid array sorted by list plus offsets, so a probe
+    is a slice. n_probe lists are scanned per query (times widen).
+    """
+
+    name = "ivf"
+
+    def __init__(self, centroids, offsets, rowids, n_probe):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rowids = rowids
+        self.n_probe = int(n_probe)
+        self._c_sq = np.einsum("ij,ij->i", centroids, centroids)
+
+    @classmethod
+    def build(cls, rowids, vectors, n_lists=None, n_probe=None, iterations=10, sample_per_list=64, seed=0):
+        """
+        Cluster vectors into n_lists (default √n) lists; n_probe defaults to
+        max(8, n_lists / 32) lists scanned per query.
+        """
+        if not len(rowids):
+            return cls(np.zeros((0, vectors.shape[1]), np.float32), np.zeros(1, np.int64), rowids, 1)
+        n_lists = min(len(rowids), n_lists or max(1, int(round(np.sqrt(len(rowids))))))
+        n_probe = n_probe or max(8, n_lists // 32)
+        centroids = _kmeans(vectors, n_lists, iterations, sample_per_list, np.random.default_rng(seed))
+        assign = _nearest(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))]).astype(np.int64)
+        return cls(centroids, offsets, rowids[order], min(n_probe, n_lists))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays["centroids"], arrays["offsets"], arrays["rowids"], arrays["n_probe"])
+
+    def to_arrays(self):
+        return {"centroids": self.centroids, "offsets": self.offsets, "rowids": self.rowids,
+                "n_probe": np.int64(self.n_probe)}
+
+    def __len__(self):
+        return len(self.rowids)
+
+    def candidates(self, query, k, widen=1):
+        """Rowids in the n_probe × widen lists nearest to query."""
+        n_lists = len(self.centroids)
+        n = min(n_lists, self.n_probe * widen)
+        if n >= n_lists:
+            return self.rowids
+        scores = self._c_sq - 2.0 * (self.centroids @ query)
+        lists = np.argpartition(scores, n - 1)[:n]
+        return np.concatenate([self.rowids[self.offsets[i]:self.offsets[i + 1]] for i in lists])
@@ -0,0 +1,336 @@
+"""
+backends.py — Inference backends behind src.util.llm.infer, selected per models.json entry.
+
+Public API:
+  BACKENDS                                         name → backend class
+  load_backend(entry, adapter_path=None)          -> backend
+  MODEL_POOL                                       process-wide ModelPool
+  MODEL_POOL.get(entry, adapter_path=None)        -> backend
+  MODEL_POOL.resize(max_bytes) / MODEL_POOL.clear()
+
+A models.json entry picks its backend with "backend" (default "mlx"); the
+other keys configure it. Every backend answers a batch of prompts greedily:
+  generate(prompts, max_tokens)    -> List[str]   raw completions, one per prompt
+and reports nbytes, the memory it keeps resident. infer() does the batching,
+ordering and SQL post-processing. Backends with prefix_cache = True also
+expose tokens / prefill / generate_tokens for infer(group_by=...).
+
+Backends:
+  mlx     mlx_lm.load + batch_generate on local MLX weights; the only backend
+          with LoRA adapters and KV prefix caching. Keys other than path,
+          backend, prompt_budget and tokenizer are passed to mlx_lm.load().
+  openai  an OpenAI-compatible chat completions server (llama.cpp server,
+          vLLM, ...): base_url (e.g. http://localhost:8080/v1), model (served
+          name, default: path), api_key_env, timeout (seconds), extra_body
+          (merged into every request). A batch is sent as concurrent requests.
+  replay  deterministic stand-in serving canned SQL from file (JSONL, relative
+          to ROOT_PATH): {"prompt", "sql"} lines or earlier presql.jsonl /
+          finsql.jsonl outputs. Other prompts get SELECT * FROM the first
+          table in the prompt. No model, no network: for pipeline benchmarks and CI.
+
+--token-budget counts prompt tokens with the entry's "tokenizer" (a Hugging
+Face id; default: path for mlx entries). openai and replay entries without one
+are not counted.
+"""
+
+import gc
+import json
+import os
+import re
+import sys
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKENDS = {}
+
+# Tokens per forward pass when prefilling a shared prefix.
+PREFILL_STEP = 2048
+
+# models.json entry keys read by this module or src.util.llm rather than passed to mlx_lm.load().
+_NON_LOAD_KEYS = frozenset({"path", "backend", "prompt_budget", "tokenizer"})
+
+
+def _register(cls):
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+def load_backend(entry: Dict[str, Any], adapter_path: Optional[str] = None):
+    """Construct the backend a models.json entry (a dict with at least 'path') selects."""
+    name = entry.get("backend", "mlx")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}' for {entry['path']}. Expected one of: {', '.join(BACKENDS)}.")
+    return BACKENDS[name](entry, adapter_path)
+
+
+# ---------------------------------------------------------------------------
+# MLX
+# ---------------------------------------------------------------------------
+
+def _load_model(model_name: str, adapter_path: Optional[str] = None, **load_kwargs):
+    from mlx_lm import load
+
+    print(f"Loading model: {model_name}", file=sys.stderr)
+    if adapter_path:
+        print(f"  adapter: {adapter_path}", file=sys.stderr)
+        load_kwargs["adapter_path"] = adapter_path
+    model, tokenizer = load(model_name, **load_kwargs)
+    print("Model loaded.", file=sys.stderr)
+    return model, tokenizer
+
+
+def _model_bytes(model) -> int:
+    """Bytes of a loaded model's weights (quantized weights count at their stored size)."""
+    from mlx.utils import tree_flatten
+    return sum(array.nbytes for _, array in tree_flatten(model.parameters()))
+
+
+@_register
+class MlxBackend:
+    """Local MLX weights (optionally with a LoRA adapter), run with mlx_lm.batch_generate."""
+
+    name = "mlx"
+    prefix_cache = True
+
+    def __init__(self, entry: Dict[str, Any], adapter_path: Optional[str] = None):
+        load_kwargs = {k: v for k, v in entry.items() if k not in _NON_LOAD_KEYS}
+        self.model, self.tokenizer = _load_model(entry["path"], adapter_path, **load_kwargs)
+        self.nbytes = _model_bytes(self.model)
+
+    def generate(self, prompts: List[str], max_tokens: int) -> List[str]:
+        return self.generate_tokens([self.tokens(p) for p in prompts], max_tokens)
+
+    def tokens(self, prompt: str) -> List[int]:
+        """prompt as chat-formatted token ids."""
+        return self.tokenizer.apply_chat_template(
+            [{"role": "user", "content": prompt}],
+            add_generation_prompt=True,
+            enable_thinking=False,
+        )
+
+    def generate_tokens(self, token_lists: List[List[int]], max_tokens: int, prompt_caches=None) -> List[str]:
+        """Greedy batch_generate over chat-formatted token lists (continuing prompt_caches, if given)."""
+        from mlx_lm import batch_generate
+        from mlx_lm.sample_utils import make_sampler
+
+        batch_result = batch_generate(
+            self.model, self.tokenizer, token_lists, prompt_caches=prompt_caches, verbose=False,
+            max_tokens=max_tokens, sampler=make_sampler(temp=0.0),
+        )
+        return batch_result.texts
+
+    def prefill(self, tokens: List[int]):
+        """A fresh prompt cache holding tokens, prefilled PREFILL_STEP tokens at a time."""
+        import mlx.core as mx
+        from mlx_lm.models.cache import make_prompt_cache
+
+        cache = make_prompt_cache(self.model)
+        for start in range(0, len(tokens), PREFILL_STEP):
+            self.model(mx.array(tokens[start:start + PREFILL_STEP])[None], cache=cache)
+            mx.eval([c.state for c in cache])
+        return cache
+
+    @staticmethod
+    def release() -> None:
+        """Return the buffers of evicted, now unreferenced models to the system."""
+        import mlx.core as mx
+        gc.collect()
+        mx.clear_cache()
+
+
+# ---------------------------------------------------------------------------
+# OpenAI-compatible HTTP
+# ---------------------------------------------------------------------------
+
+@_register
+class OpenAIBackend:
+    """An OpenAI-compatible /chat/completions endpoint, one concurrent request per prompt of a batch."""
+
+    name = "openai"
+    prefix_cache = False
+    nbytes = 0
+
+    def __init__(self, entry: Dict[str, Any], adapter_path: Optional[str] = None):
+        if adapter_path:
+            raise ValueError(f"LoRA adapters need the mlx backend; {entry['path']} is served over HTTP.")
+        if not entry.get("base_url"):
+            raise ValueError(f"The openai backend needs a base_url for {entry['path']} in models.json.")
+        self.url = entry["base_url"].rstrip("/") + "/chat/completions"
+        self.model = entry.get("model", entry["path"])
+        self.timeout = entry.get("timeout", 600)
+        self.extra_body = entry.get("extra_body") or {}
+        self.headers = {"Content-Type": "application/json"}
+        if entry.get("api_key_env"):
+            self.headers["Authorization"] = f"Bearer {os.environ[entry['api_key_env']]}"
+
+    def generate(self, prompts: List[str], max_tokens: int) -> List[str]:
+        with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+            return list(pool.map(lambda p: self._complete(p, max_tokens), prompts))
+
+    def _complete(self, prompt: str, max_tokens: int) -> str:
+        body = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": 0,
+            **self.extra_body,
+        }
+        request = urllib.request.Request(self.url, json.dumps(body).encode("utf-8"), self.headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                reply = json.load(response)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", errors="replace")[:500]
+            raise RuntimeError(f"{self.url} returned HTTP {e.code}: {detail}") from e
+        return reply["choices"][0]["message"].get("content") or ""
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+# (prompt key, SQL key) pairs read from each line of a replay file.
+_REPLAY_KEYS = (("prompt", "sql"), ("prompt", "presql"), ("presql_prompt", "presql"), ("finsql_prompt", "finsql"))
+
+
+def _collapse(text: str) -> str:
+    return " ".join(text.split())
+
+
+@_register
+class ReplayBackend:
+    """
+    Canned SQL per prompt (whitespace-collapsed) from a JSONL file; deterministic and model-free.
+
+    An adapter path is accepted and ignored, so fine-tuned runs can be replayed too.
+    """
+
+    name = "replay"
+    prefix_cache = False
+
+    def __init__(self, entry: Dict[str, Any], adapter_path: Optional[str] = None):
+        self.answers: Dict[str, str] = {}
+        path = entry.get("file")
+        if path:
+            path = os.path.join(os.environ.get("ROOT_PATH", ""), path)
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    rec = json.loads(line)
+                    for prompt_key, sql_key in _REPLAY_KEYS:
+                        if rec.get(prompt_key) and rec.get(sql_key) is not None:
+                            self.answers[_collapse(rec[prompt_key])] = rec[sql_key]
+        self.nbytes = sum(len(k) + len(v) for k, v in self.answers.items())
+        self.hits = self.misses = 0
+
+    def generate(self, prompts: List[str], max_tokens: int) -> List[str]:
+        return [self._answer(p) for p in prompts]
+
+    def _answer(self, prompt: str) -> str:
+        sql = self.answers.get(_collapse(prompt))
+        if sql is not None:
+            self.hits += 1
+            return sql
+        self.misses += 1
+        table = re.search(r"(\w+)\s*\(", prompt)
+        return f"SELECT * FROM {table.group(1)}" if table else "SELECT 1"
+
+
+# ---------------------------------------------------------------------------
+# Model pool
+# ---------------------------------------------------------------------------
+
+class ModelPool:
+    """
+    Loaded backends kept resident between infer() calls, so a model used by several
+    pipeline steps or sweep runs is read from disk once.
+
+    Entries are keyed by (models.json entry, adapter path) and evicted least
+    recently used first whenever their nbytes exceed max_bytes. A backend larger
+    than the whole budget is returned but not kept; max_bytes=0 disables the pool.
+    max_bytes=None resolves on first use to MODEL_POOL_GB from the environment (.env)
+    or, failing that, the device's recommended working set.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self._backends: "OrderedDict[Tuple[str, Optional[str]], Any]" = OrderedDict()
+        self._sizes: Dict[Tuple[str, Optional[str]], int] = {}  # nbytes of every backend loaded so far
+        self._lock = threading.Lock()
+
+    def get(self, entry: Dict[str, Any], adapter_path: Optional[str] = None):
+        """The backend for this entry and adapter, loading it only if it is not resident."""
+        key = (json.dumps(entry, sort_keys=True), adapter_path)
+        label = entry["path"] + (f" (adapter: {adapter_path})" if adapter_path else "")
+        with self._lock:
+            if key in self._backends:
+                self._backends.move_to_end(key)
+                print(f"Model resident: {label}", file=sys.stderr)
+                return self._backends[key]
+
+            budget = self._budget()
+            # Make room before loading when this model's size is known, so the evicted
+            # weights are released before the new ones are read.
+            if key in self._sizes:
+                self._evict(budget - self._sizes[key])
+            backend = load_backend(entry, adapter_path)
+            self._sizes[key] = backend.nbytes
+            if backend.nbytes <= budget:
+                self._evict(budget - backend.nbytes)
+                self._backends[key] = backend
+            return backend
+
+    def resize(self, max_bytes: int) -> None:
+        """Set the budget, evicting least recently used backends that no longer fit."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict(max_bytes)
+
+    def clear(self) -> None:
+        """Drop every resident backend."""
+        self.resize(0)
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(backend.nbytes for backend in self._backends.values())
+
+    def __len__(self) -> int:
+        return len(self._backends)
+
+    def _budget(self) -> int:
+        if self.max_bytes is None:
+            self.max_bytes = _default_pool_bytes()
+        return self.max_bytes
+
+    def _evict(self, max_bytes: int) -> None:
+        evicted = set()
+        while self._backends and self.resident_bytes > max_bytes:
+            (entry, adapter), backend = self._backends.popitem(last=False)
+            print(f"Evicting model: {json.loads(entry)['path']}" + (f" (adapter: {adapter})" if adapter else ""),
+                  file=sys.stderr)
+            evicted.add(type(backend))
+            del backend
+        for cls in evicted:
+            if hasattr(cls, "release"):
+                cls.release()
+
+
+def _default_pool_bytes() -> int:
+    gb = os.environ.get("MODEL_POOL_GB")
+    if gb:
+        return int(float(gb) * 2**30)
+    try:
+        import mlx.core as mx
+    except ImportError:
+        return 16 * 2**30
+    info = mx.device_info()
+    return int(info.get("max_recommended_working_set_size") or info.get("memory_size") or 16 * 2**30)
+
+
+# Process-wide pool used by infer() and infer_iter().
+MODEL_POOL = ModelPool()
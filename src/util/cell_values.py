@@ -0,0 +1,284 @@
+"""
+cell_values.py — Representative cell values of the Spider databases, profiled at ingest.
+
+ingest profiles every Spider .sqlite database once and writes one
+cell_value_catalog row per (db_id, table, column): the declared type, the
+distinct and NULL counts, and up to MAX_VALUES representative values — the most
+frequent distinct non-NULL, non-BLOB values, ties broken by value. The choice
+is deterministic and independent of physical row order, and prompt rendering
+reads the catalog instead of opening per-database files.
+
+ingest also loads every distinct text value (3 to MAX_VALUE_LENGTH characters)
+into cell_value_index, an FTS5 trigram index, with each db_id's cells in one
+contiguous rowid range (cell_value_ranges). match_values() looks up the words
+of a question within its database's range and returns the cells they name, so
+prompts can carry the relevant literals ({{matched_values}}) without scanning
+databases.
+
+Public API:
+  profile_database(db_path, max_values=MAX_VALUES)          -> List[ColumnValues]
+  text_values(db_path, max_length=MAX_VALUE_LENGTH)         -> Iterator[(table, column, value)]
+  store_text_values(conn, db_id, values)                    -> int
+  load_cell_values(db_path)                                 -> Mapping[str, Tuple[ColumnValues, ...]]
+  load_db_cell_values(db_path, db_id)                       -> Optional[Tuple[ColumnValues, ...]]
+  render_cell_values(columns, tables=None, max_samples=3)   -> str
+  match_values(db_path, db_id, question, limit=MAX_MATCHES) -> List[ValueMatch]
+  render_matched_values(matches)                            -> str
+"""
+
+import json
+import re
+import sqlite3
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+# Representative values stored per column.
+MAX_VALUES = 5
+
+# Longest text value put in cell_value_index; longer cells are prose, not literals.
+MAX_VALUE_LENGTH = 100
+
+# Matches returned per question by match_values.
+MAX_MATCHES = 10
+
+# FTS hits verified per question before ranking.
+_CANDIDATES = 500
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Question words too common to be worth a trigram lookup.
+_STOPWORDS = frozenset("""
+    about all also and any are as at average before between both but by can count did different
+    does each find for from give has have how in is it its list many more most not number of on
+    or other show than that the their them there these they this those to total was what when
+    where which who whose with
+""".split())
+
+
+@dataclass(frozen=True)
+class ColumnValues:
+    table_pos: int          # table order in sqlite_master
+    table: str
+    column_pos: int         # column order in the table (PRAGMA table_info cid)
+    column: str
+    type: str               # declared type, '' if none
+    distinct_count: int
+    null_count: int
+    values: Tuple           # most frequent first
+
+
+class ValueMatch(NamedTuple):
+    table: str
+    column: str
+    value: str
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _user_tables(conn: sqlite3.Connection) -> List[str]:
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+    )]
+
+
+def profile_database(db_path: str, max_values: int = MAX_VALUES) -> List[ColumnValues]:
+    """
+    Profile every user table of a Spider database (opened read-only).
+
+    One aggregate scan per table yields the distinct / NULL counts; one GROUP BY
+    per column picks its max_values most frequent values.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        out = []
+        for table_pos, table in enumerate(_user_tables(conn)):
+            columns = conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+            if not columns:
+                continue
+            counts = conn.execute(
+                "SELECT COUNT(*), "
+                + ", ".join(f"COUNT(DISTINCT {_quote(c[1])}), COUNT({_quote(c[1])})" for c in columns)
+                + f" FROM {_quote(table)}"
+            ).fetchone()
+            n_rows = counts[0]
+            for i, (cid, name, type_, *_) in enumerate(columns):
+                col = _quote(name)
+                values = tuple(row[0] for row in conn.execute(
+                    f"SELECT {col} FROM {_quote(table)} WHERE typeof({col}) NOT IN ('null', 'blob') "
+                    f"GROUP BY {col} ORDER BY COUNT(*) DESC, {col} LIMIT ?",
+                    (max_values,),
+                ))
+                out.append(ColumnValues(
+                    table_pos, table, cid, name, type_ or "",
+                    counts[1 + 2 * i], n_rows - counts[2 + 2 * i], values,
+                ))
+        return out
+    finally:
+        conn.close()
+
+
+def text_values(db_path: str, max_length: int = MAX_VALUE_LENGTH) -> Iterator[Tuple[str, str, str]]:
+    """Distinct (table, column, value) text cells of a Spider database, 3 to max_length characters long."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        for table in _user_tables(conn):
+            for _, name, *_ in conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall():
+                col = _quote(name)
+                for (value,) in conn.execute(
+                    f"SELECT DISTINCT {col} FROM {_quote(table)} "
+                    f"WHERE typeof({col}) = 'text' AND length({col}) BETWEEN 3 AND ?",
+                    (max_length,),
+                ):
+                    yield table, name, value
+    finally:
+        conn.close()
+
+
+def store_text_values(conn: sqlite3.Connection, db_id: str, values) -> int:
+    """
+    Replace db_id's cells in cell_value_index with values ((table, column, value) triples).
+
+    The new cells get fresh rowids after every existing one, and their range is
+    recorded in cell_value_ranges. Returns the number of cells written.
+    """
+    old = conn.execute("SELECT first_rowid, last_rowid FROM cell_value_ranges WHERE db_id = ?", (db_id,)).fetchone()
+    if old:
+        conn.execute("DELETE FROM cell_value_index WHERE rowid BETWEEN ? AND ?", old)
+        conn.execute("DELETE FROM cell_value_ranges WHERE db_id = ?", (db_id,))
+    first = conn.execute("SELECT COALESCE(MAX(rowid), 0) + 1 FROM cell_value_index").fetchone()[0]
+    cursor = conn.executemany(
+        "INSERT INTO cell_value_index (rowid, value, db_id, table_name, column_name) VALUES (?, ?, ?, ?, ?)",
+        ((first + i, value, db_id, table, column) for i, (table, column, value) in enumerate(values)),
+    )
+    count = max(cursor.rowcount, 0)
+    if count:
+        conn.execute("INSERT INTO cell_value_ranges (db_id, first_rowid, last_rowid) VALUES (?, ?, ?)",
+                     (db_id, first, first + count - 1))
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Catalog loading
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def load_cell_values(db_path: str) -> Mapping[str, Tuple[ColumnValues, ...]]:
+    """
+    Read the whole cell_value_catalog of an OpenText2SQL.db once per process.
+
+    Returns an empty mapping when the database predates the catalog, so callers
+    can fall back to sampling the Spider databases. Call
+    load_cell_values.cache_clear() after re-ingesting within the same process.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT db_id, table_pos, table_name, column_pos, column_name, type, distinct_count, null_count, "
+            "sample_values FROM cell_value_catalog ORDER BY db_id, table_pos, column_pos"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return MappingProxyType({})
+    finally:
+        conn.close()
+
+    by_db: Dict[str, list] = {}
+    for db_id, *row, sample_values in rows:
+        by_db.setdefault(db_id, []).append(ColumnValues(*row, tuple(json.loads(sample_values))))
+    return MappingProxyType({db_id: tuple(columns) for db_id, columns in by_db.items()})
+
+
+def load_db_cell_values(db_path: str, db_id: str) -> Optional[Tuple[ColumnValues, ...]]:
+    """Return the cached catalog columns of db_id, or None if the catalog has no such database."""
+    return load_cell_values(db_path).get(db_id)
+
+
+def render_cell_values(
+    columns: Tuple[ColumnValues, ...],
+    tables: Optional[Set[str]] = None,
+    max_samples: int = 3,
+) -> str:
+    """
+    Render 'table(col[v, v, v], ...)' per table, the prompts' {{cell_values}} format.
+
+    tables restricts the output to those lower-cased table names; all tables are
+    kept when none of them match.
+    """
+    by_table: Dict[str, List[str]] = {}
+    for col in columns:
+        by_table.setdefault(col.table, []).append(
+            f"{col.column}[{', '.join(str(v) for v in col.values[:max_samples])}]"
+        )
+    if tables:
+        linked = {table: cols for table, cols in by_table.items() if table.lower() in tables}
+        by_table = linked or by_table
+    return "\n".join(f"{table}(" + ", ".join(cols) + ")" for table, cols in by_table.items())
+
+
+# ---------------------------------------------------------------------------
+# Value lookup
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def _index_conn(db_path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def match_values(db_path: str, db_id: str, question: str, limit: int = MAX_MATCHES) -> List[ValueMatch]:
+    """
+    Cells of db_id whose text value the question mentions, best first.
+
+    Every non-stopword of 3+ characters is looked up in cell_value_index; hits
+    are kept when the whole value occurs in the question, or when one of the
+    value's words is a question word. Whole-value matches rank first, longer
+    values before shorter ones. Returns [] when the database has no index.
+    """
+    question_lc = question.lower()
+    words = [w for w in dict.fromkeys(_WORD_RE.findall(question_lc)) if len(w) >= 3 and w not in _STOPWORDS]
+    if not words:
+        return []
+    conn = _index_conn(db_path)
+    try:
+        span = conn.execute("SELECT first_rowid, last_rowid FROM cell_value_ranges WHERE db_id = ?",
+                            (db_id,)).fetchone()
+        if span is None:
+            return []
+        rows = conn.execute(
+            "SELECT table_name, column_name, value FROM cell_value_index "
+            "WHERE cell_value_index MATCH ? AND rowid BETWEEN ? AND ? ORDER BY rank LIMIT ?",
+            (" OR ".join(_fts_phrase(w) for w in words), *span, _CANDIDATES),
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return []
+
+    word_set = set(words)
+    scored = {}
+    for table, column, value in rows:
+        value_lc = value.lower()
+        if re.search(rf"(?<!\w){re.escape(value_lc)}(?!\w)", question_lc):
+            score = (2, len(value))
+        elif word_set.intersection(_WORD_RE.findall(value_lc)):
+            score = (1, -len(value))
+        else:
+            continue
+        scored[ValueMatch(table, column, value)] = score
+    ranked = sorted(scored, key=lambda m: (tuple(-x for x in scored[m]), m))
+    return ranked[:limit]
+
+
+def render_matched_values(matches: List[ValueMatch]) -> str:
+    """Render matches as 'table(col[v, v], ...)' per table, in the {{cell_values}} format."""
+    by_table: Dict[str, Dict[str, List[str]]] = {}
+    for m in matches:
+        by_table.setdefault(m.table, {}).setdefault(m.column, []).append(m.value)
+    return "\n".join(
+        f"{table}(" + ", ".join(f"{col}[{', '.join(values)}]" for col, values in cols.items()) + ")"
+        for table, cols in by_table.items()
+    )
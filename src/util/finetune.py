@@ -36,7 +36,7 @@ _SPLIT_MAP = {"train": "train", "dev": "valid", "test": "test"}
 def _write_split(conn: sqlite3.Connection, source: str, path: str) -> int:
     rows = conn.execute(
         "SELECT id, db_id, question, query, full_ddl, difficulty FROM gold_dataset"
-        " WHERE source = ? AND is_valid = 1",
+        " WHERE source = ? AND is_valid = 1 ORDER BY rowid",
         (source,),
     ).fetchall()
     split = _SPLIT_MAP[source]
@@ -1,32 +1,53 @@
 """
-llm.py — LLM inference utilities for MLX models.
+llm.py — LLM inference utilities: prompts, schema linking and inference over pluggable backends.
 
 Public API:
   resolve_model(key)                                                       -> str
-  infer(model, prompts, batch_size=1, max_tokens=512, adapter_path=None) -> List[str]
-  prompt_generation(config, db_path, ...)                                 -> List[Dict]
-  render_prompt(config, rec, section_visibility=None)                     -> str
-  cross_consistency(models, records, batch_size=1, max_tokens=512)       -> List[Dict]
+  infer(model, prompts, batch_size=1, max_tokens=512, adapter_path=None, group_by=None) -> List[str]
+  infer_iter(model, prompts, batch_size=1, max_tokens=512, adapter_path=None) -> Iterator[str]
+  prompt_generation(config, db_path, ..., workers=1)                      -> List[Dict]
+  iter_prompt_generation(config, db_path, ..., batch_size=PROMPT_BATCH)   -> Iterator[List[Dict]]
+  render_prompt(config, rec, section_visibility=None, db_path=None)       -> str
+  prompt_budget(models)                                                   -> PromptBudget
+  fit_prompt(config, rec, budget, section_visibility=None, db_path=None)  -> (str, Dict[str, int])
+  prompt_token_summary(token_counts, budget)                              -> str
+  prefix_groups(token_lists, group_by)                                    -> List[(indices, prefix_len)]
+  prefill_tokens_saved(groups)                                            -> int
+  cross_consistency(models, records, batch_size=1, max_tokens=512, group_by_db=False) -> List[Dict]
+  iter_cross_consistency(models, records, spill_dir, ...)                 -> Iterator[Dict]
 
 Model keys are short names defined in src/ml/models.json (e.g. "Qwen3-14B-4bit").
+Each entry's "backend" (mlx, openai or replay; see src.util.backends) runs its prompts,
+and loaded models stay in backends.MODEL_POOL (LRU under MODEL_POOL_GB) across infer() calls.
 Prompt configs are JSON dicts with sections keyed by name, each having "text" and "visible" fields.
 """
 
 import re
 import os
 import sys
+import copy
 import json
 import sqlite3
-from typing import Any, Dict, List, Optional, Union
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 
 from jinja2 import Environment, meta as jinja_meta
-from mlx_lm import load, batch_generate
-from mlx_lm.sample_utils import make_sampler
+
+from src.util.backends import MODEL_POOL
+from src.util.cell_values import load_cell_values, match_values, render_cell_values, render_matched_values
+from src.util.schema import load_schemas
 
 _MODELS_FILE = os.path.normpath(
     os.path.join(os.path.dirname(__file__), "..", "ml", "models.json")
 )
 
+# gold_dataset rows rendered per batch by iter_prompt_generation.
+PROMPT_BATCH = 256
+
+# Shared prompt prefixes shorter than this are prefilled with their prompts (see prefix_groups).
+MIN_PREFIX_TOKENS = 32
+
 
 def _resolve_model_entry(key: str) -> dict:
     """Return the full models.json entry for a key, normalised to a dict with at least 'path'."""
@@ -106,22 +127,13 @@ def post_process_sql(sql_text: str) -> str:
     return sql_text.lower()
 
 
-def _load_model(model_name: str, adapter_path: Optional[str] = None, **load_kwargs):
-    print(f"Loading model: {model_name}", file=sys.stderr)
-    if adapter_path:
-        print(f"  adapter: {adapter_path}", file=sys.stderr)
-        load_kwargs["adapter_path"] = adapter_path
-    model, tokenizer = load(model_name, **load_kwargs)
-    print("Model loaded.", file=sys.stderr)
-    return model, tokenizer
-
-
 def infer(
     model: str,
     prompts: List[str],
     batch_size: int = 1,
     max_tokens: int = 512,
     adapter_path: Optional[str] = None,
+    group_by: Optional[List[str]] = None,
 ) -> List[str]:
     """
     Run batch inference with a single model and return cleaned SQL strings.
@@ -133,22 +145,95 @@ def infer(
         batch_size:   Prompts per batch (default 1 = sequential).
         max_tokens:   Max tokens to generate per prompt.
         adapter_path: Optional explicit path to a LoRA adapter directory.
+        group_by:     Optional key per prompt (e.g. its db_id). Prompts are then run
+                      group by group. On the mlx backend, the token prefix a group's
+                      prompts share (the schema block of a prefix-first template) is
+                      prefilled once into an mlx_lm prompt cache that each prompt of
+                      the group resumes from, and the prefill tokens saved are
+                      reported on stderr. Other backends only get the grouped order
+                      (which a server's own prefix cache can use).
 
     Returns:
-        List of post-processed SQL strings, one per prompt.
+        List of post-processed SQL strings, one per prompt (in input order).
     """
-    if not model:
-        raise ValueError("A model spec is required")
+    if group_by is None:
+        return list(infer_iter(model, prompts, batch_size, max_tokens, adapter_path))
+    if len(group_by) != len(prompts):
+        raise ValueError(f"group_by has {len(group_by)} keys for {len(prompts)} prompts")
     if not prompts:
         return []
 
-    # Resolve short key, preserving any ':fine-tuned' suffix
-    raw_spec = model
-    key, _, suffix = raw_spec.partition(":")
+    backend = _backend(model, adapter_path)
+    token_lists = [backend.tokens(p) for p in prompts] if backend.prefix_cache else None
+    groups = prefix_groups(token_lists, group_by) if token_lists else [(g, 0) for g in _group_indices(group_by)]
+
+    results: List[Optional[str]] = [None] * len(prompts)
+    done = 0
+    for indices, prefix_len in groups:
+        prefix_cache = backend.prefill(token_lists[indices[0]][:prefix_len]) if prefix_len else None
+        for start in range(0, len(indices), batch_size):
+            chunk = indices[start:start + batch_size]
+            print(f"Inferring prompts {done + 1}–{done + len(chunk)}/{len(prompts)} "
+                  f"(group prefix {prefix_len} tokens)...", file=sys.stderr)
+            if token_lists is None:
+                texts = backend.generate([prompts[i] for i in chunk], max_tokens)
+            else:
+                caches = [copy.deepcopy(prefix_cache) for _ in chunk] if prefix_cache else None
+                texts = backend.generate_tokens([token_lists[i][prefix_len:] for i in chunk], max_tokens, caches)
+            for i, text in zip(chunk, texts):
+                results[i] = _clean_sql(text)
+            done += len(chunk)
+
+    if token_lists:
+        total = sum(len(tokens) for tokens in token_lists)
+        saved = prefill_tokens_saved(groups)
+        print(f"Prefix cache: {saved}/{total} prompt tokens ({saved / total:.0%}) reused across "
+              f"{len(groups)} groups.", file=sys.stderr)
+    return results
+
+
+def infer_iter(
+    model: str,
+    prompts: Iterable[str],
+    batch_size: int = 1,
+    max_tokens: int = 512,
+    adapter_path: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Streaming infer: pull prompts batch_size at a time and yield each SQL as its batch finishes.
+
+    prompts may be any iterable (e.g. a generator over iter_prompt_generation),
+    so rendering the next batch is interleaved with inference. The model is
+    loaded when the first batch arrives; nothing is loaded for no prompts.
+    Arguments are those of infer() (without group_by, which needs every prompt up front).
+    """
+    if not model:
+        raise ValueError("A model spec is required")
+    total = len(prompts) if hasattr(prompts, "__len__") else None
+    prompts = iter(prompts)
+    chunk = list(islice(prompts, batch_size))
+    if not chunk:
+        return
+
+    backend = _backend(model, adapter_path)
+
+    start = 0
+    while chunk:
+        end = start + len(chunk)
+        print(f"Inferring prompts {start + 1}–{end}{f'/{total}' if total else ''}...", file=sys.stderr)
+        for text in backend.generate(chunk, max_tokens):
+            yield _clean_sql(text)
+        start = end
+        chunk = list(islice(prompts, batch_size))
+
+
+def _backend(model: str, adapter_path: Optional[str]):
+    """Resolve a model spec (short key, preserving any ':fine-tuned' suffix) and fetch its backend."""
+    if not model:
+        raise ValueError("A model spec is required")
+    key, _, suffix = model.partition(":")
     entry = _resolve_model_entry(key)
-    resolved = entry["path"]
-    load_kwargs = {k: v for k, v in entry.items() if k != "path"}
-    resolved_spec = f"{resolved}:{suffix}" if suffix else resolved
+    resolved_spec = f"{entry['path']}:{suffix}" if suffix else entry["path"]
 
     model_name, use_adapter = parse_model_spec(resolved_spec)
 
@@ -158,34 +243,43 @@ def infer(
             "Pass adapter_path= explicitly."
         )
 
-    model, tokenizer = _load_model(model_name, adapter_path if use_adapter else None, **load_kwargs)
+    return MODEL_POOL.get({**entry, "path": model_name}, adapter_path if use_adapter else None)
 
-    results: List[str] = []
-    total = len(prompts)
 
-    for start in range(0, total, batch_size):
-        chunk = prompts[start : start + batch_size]
-        end = start + len(chunk)
-        print(f"Inferring prompts {start + 1}–{end}/{total}...", file=sys.stderr)
+def _clean_sql(text: str) -> str:
+    return post_process_sql(normalize_response(text))
 
-        formatted = [
-            tokenizer.apply_chat_template(
-                [{"role": "user", "content": p}],
-                add_generation_prompt=True,
-                enable_thinking=False,
-            )
-            for p in chunk
-        ]
 
-        batch_result = batch_generate(
-            model, tokenizer, formatted, verbose=False, max_tokens=max_tokens,
-            sampler=make_sampler(temp=0.0),
-        )
+def _group_indices(group_by: List[str]) -> List[List[int]]:
+    """Prompt indices grouped by key, groups in first-seen order."""
+    groups: Dict[str, List[int]] = {}
+    for i, key in enumerate(group_by):
+        groups.setdefault(key, []).append(i)
+    return list(groups.values())
 
-        for text in batch_result.texts:
-            results.append(post_process_sql(normalize_response(text)))
 
-    return results
+def prefix_groups(token_lists: List[List[int]], group_by: List[str]) -> List[Tuple[List[int], int]]:
+    """
+    Prompt indices grouped by key (groups in first-seen order), each with the
+    length of the token prefix all of the group's prompts share.
+
+    The prefix stops one token short of the shortest prompt, since generation
+    resumes from at least one uncached token, and is 0 for single-prompt groups
+    or prefixes shorter than MIN_PREFIX_TOKENS (not worth a separate prefill).
+    """
+    planned = []
+    for indices in _group_indices(group_by):
+        prefix_len = 0
+        if len(indices) > 1:
+            members = [token_lists[i] for i in indices]
+            prefix_len = min(len(os.path.commonprefix(members)), min(map(len, members)) - 1)
+        planned.append((indices, prefix_len if prefix_len >= MIN_PREFIX_TOKENS else 0))
+    return planned
+
+
+def prefill_tokens_saved(groups: List[Tuple[List[int], int]]) -> int:
+    """Prompt tokens not prefilled thanks to prefix_groups: each shared prefix runs once, not once per prompt."""
+    return sum(prefix_len * (len(indices) - 1) for indices, prefix_len in groups)
 
 
 # ---------------------------------------------------------------------------
@@ -212,7 +306,17 @@ def _render_json_lines(raw: str) -> str:
     return "\n".join(_parse_json_list(raw))
 
 
-def _render_cell_values(db_id: str, spider_db_dir: str, max_samples: int = 3) -> str:
+def _render_cell_values(db_id: str, db_path: str, spider_db_dir: str, max_samples: int = 3) -> str:
+    """
+    Render db_id's {{cell_values}} from the cell_value_catalog in db_path.
+
+    Databases ingested before the catalog existed fall back to sampling the first
+    rows of every table in the Spider database.
+    """
+    columns = load_cell_values(db_path).get(db_id)
+    if columns is not None:
+        return render_cell_values(columns, max_samples=max_samples)
+
     db_path = os.path.join(spider_db_dir, db_id, f"{db_id}.sqlite")
     if not os.path.exists(db_path):
         return ""
@@ -278,6 +382,48 @@ def _template_vars(template_text: str) -> set:
     return jinja_meta.find_undeclared_variables(ast)
 
 
+class _CompiledPrompt(NamedTuple):
+    template: str                   # assembled template text ('' when no section is visible)
+    needs: FrozenSet[str]           # variables the template uses
+    prefixes: Dict[str, str]        # line prefix per variable (see _get_line_prefix)
+    placeholder_vars: FrozenSet[str]  # variables of hidden sections, rendered as "None."
+    jinja: Any                      # compiled jinja2.Template
+
+
+def _config_key(config: Dict[str, Any]) -> Tuple:
+    """Hashable identity of a prompt config: the (name, text, visible) of every section, in order."""
+    return tuple((key, section.get("text"), section.get("visible", True)) for key, section in config.items())
+
+
+def _hidden_key(section_visibility: Optional[Dict[str, bool]]) -> Tuple[str, ...]:
+    """Hashable visibility mask: the sorted names of the sections switched off."""
+    return tuple(sorted(key for key, visible in (section_visibility or {}).items() if not visible))
+
+
+@lru_cache(maxsize=256)
+def _compile_prompt(config_key: Tuple, hidden: Tuple[str, ...] = ()) -> _CompiledPrompt:
+    """
+    Parse and compile a config's template once per (config, visibility mask).
+
+    Sections in `hidden` stay in the template (so preSQL and finSQL prompts keep
+    the same shape); their variables are listed in placeholder_vars.
+    """
+    effective_config = {key: {"text": text} for key, text, visible in config_key if visible}
+    placeholder_vars = set()
+    for key in hidden:
+        if key in effective_config:
+            placeholder_vars.update(_template_vars(effective_config[key].get("text") or ""))
+    template = _config_to_template(effective_config)
+    needs = _template_vars(template)
+    return _CompiledPrompt(
+        template=template,
+        needs=frozenset(needs),
+        prefixes={var: _get_line_prefix(template, var) for var in needs},
+        placeholder_vars=frozenset(placeholder_vars),
+        jinja=Environment().from_string(template),
+    )
+
+
 def prompt_generation(
     config: Dict[str, Any],
     db_path: str,
@@ -285,6 +431,9 @@ def prompt_generation(
     difficulty: Optional[Union[str, List[str]]] = None,
     limit: Optional[int] = None,
     top_k_few_shot: int = 3,
+    few_shot_search: str = "exact",
+    workers: int = 1,
+    budget: Optional["PromptBudget"] = None,
 ) -> List[Dict[str, Any]]:
     """
     Render prompts from a prompt config dict for rows in gold_dataset.
@@ -294,7 +443,11 @@ def prompt_generation(
 
     Only fetches the data each template variable actually needs:
       - question, simplified_ddl, foreign_keys — from gold_dataset
-      - cell_values  — sampled from the Spider SQLite database for that db_id
+      - cell_values  — from cell_value_catalog, once per db_id (None when no
+                       visible section uses {{cell_values}}; "" when the
+                       database has none)
+      - matched_values — cells whose text the question mentions, looked up in
+                       cell_value_index (None when unused)
       - few_shot     — retrieved via vector similarity from embedding_dataset
 
     Args:
@@ -304,11 +457,50 @@ def prompt_generation(
         difficulty:      Filter by one or more of 'easy', 'medium', 'hard', 'extra'. None = all.
         limit:           Cap the number of rows returned.
         top_k_few_shot:  Number of few-shot examples to retrieve (only when config uses {{few_shot}}).
+        few_shot_search: Few-shot index search mode: 'exact', 'quantized' or an ANN backend
+                         such as 'ivf' (see src.util.nlp.SEARCH_MODES).
+        workers:         Processes to render with. Above 1, rows are sharded by db_id across
+                         a process pool (each worker keeps its own per-database caches) and
+                         returned in the serial order, with identical records.
+        budget:          Optional PromptBudget (from prompt_budget()). Prompts over it are
+                         trimmed (see fit_prompt) and each record's prompt_tokens holds the
+                         per-model token counts; without one, prompt_tokens is None.
 
     Returns:
         List of dicts, one per row:
           { prompt, question, db_id, source, difficulty, query, simplified_ddl,
-            foreign_keys, cell_values, few_shot }
+            foreign_keys, cell_values, matched_values, few_shot, prompt_tokens }
+    """
+    return [
+        rec
+        for batch in iter_prompt_generation(
+            config, db_path, source, difficulty, limit, top_k_few_shot, few_shot_search, workers=workers,
+            budget=budget,
+        )
+        for rec in batch
+    ]
+
+
+def iter_prompt_generation(
+    config: Dict[str, Any],
+    db_path: str,
+    source: Optional[str] = None,
+    difficulty: Optional[Union[str, List[str]]] = None,
+    limit: Optional[int] = None,
+    top_k_few_shot: int = 3,
+    few_shot_search: str = "exact",
+    batch_size: int = PROMPT_BATCH,
+    workers: int = 1,
+    budget: Optional["PromptBudget"] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Streaming prompt_generation: yield the same records in lists of up to batch_size.
+
+    gold_dataset is read through one cursor and each batch's few-shot examples
+    are retrieved when the batch is rendered, so the first batch is ready after
+    batch_size rows and memory does not grow with the split. Arguments and
+    record layout are those of prompt_generation. With workers > 1, each pool
+    round fetches workers * batch_size rows and renders them sharded by db_id.
     """
     from dotenv import load_dotenv
     load_dotenv()
@@ -317,8 +509,8 @@ def prompt_generation(
         raise ValueError("ROOT_PATH not set in .env")
 
     spider_db_dir = os.path.join(root_path, "database", "spider")
-    template = _config_to_template(config)
-    needs = _template_vars(template)
+    config_key = _config_key(config)
+    compiled = _compile_prompt(config_key)
 
     # Build SQL query with optional filters
     clauses, params = [], []
@@ -332,48 +524,137 @@ def prompt_generation(
 
     where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
     limit_clause = f"LIMIT {limit}" if limit else ""
-    sql = f"SELECT id, db_id, source, difficulty, question, query, simplified_ddl, foreign_keys FROM gold_dataset {where} {limit_clause}"
+    # ORDER BY rowid keeps ingest order (and thus what LIMIT selects) when an index serves the filter.
+    sql = f"SELECT id, db_id, source, difficulty, question, query, simplified_ddl, foreign_keys FROM gold_dataset {where} ORDER BY rowid {limit_clause}"
+
+    # Prebuilt per-db_id schemas; rows whose db_id is missing from the catalog
+    # (databases ingested before it existed) fall back to parsing the JSON columns.
+    schemas = load_schemas(db_path)
+
+    # Cell values depend only on db_id: sample each database once per run.
+    cell_values: Dict[str, str] = {}
 
     conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
     try:
-        rows = conn.execute(sql, params).fetchall()
+        cursor = conn.execute(sql, params)
+        if workers <= 1:
+            while rows := cursor.fetchmany(batch_size):
+                yield _render_rows(
+                    rows, db_path, spider_db_dir, compiled, schemas, cell_values, top_k_few_shot, few_shot_search,
+                    budget,
+                )
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+        from functools import partial
+
+        render_shard = partial(
+            _render_shard, config_key=config_key, db_path=db_path, spider_db_dir=spider_db_dir,
+            top_k_few_shot=top_k_few_shot, few_shot_search=few_shot_search, budget=budget,
+        )
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while rows := cursor.fetchmany(batch_size * workers):
+                records = _render_sharded(render_shard, rows, pool)
+                for start in range(0, len(records), batch_size):
+                    yield records[start:start + batch_size]
     finally:
         conn.close()
 
-    env = Environment()
-    tmpl = env.from_string(template)
 
-    # Detect the prefix character(s) before each variable in the template (e.g. "# " or "").
-    # This lets multi-line values line up correctly regardless of template style.
-    prefixes = {var: _get_line_prefix(template, var) for var in needs}
+def _render_sharded(render_shard, rows, pool):
+    """render_shard over rows grouped by db_id in pool, with the records put back in row order."""
+    shards: Dict[str, List[int]] = {}
+    for pos, row in enumerate(rows):
+        shards.setdefault(row[1], []).append(pos)
+
+    # Largest shards first keeps the pool busy until the end.
+    db_ids = sorted(shards, key=lambda db_id: len(shards[db_id]), reverse=True)
+    rendered = pool.map(render_shard, [[rows[pos] for pos in shards[db_id]] for db_id in db_ids])
+
+    records: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+    for db_id, shard_records in zip(db_ids, rendered):
+        for pos, rec in zip(shards[db_id], shard_records):
+            records[pos] = rec
+    return records
+
+
+def _render_shard(rows, config_key, db_path, spider_db_dir, top_k_few_shot, few_shot_search, budget):
+    """Worker body: _render_rows for one db_id's rows, with this process's cached template and schemas."""
+    return _render_rows(
+        rows, db_path, spider_db_dir, _compile_prompt(config_key), load_schemas(db_path), {},
+        top_k_few_shot, few_shot_search, budget,
+    )
+
+
+def _render_rows(
+    rows, db_path, spider_db_dir, compiled, schemas, cell_values, top_k_few_shot, few_shot_search, budget=None,
+):
+    """Records for one batch of gold_dataset rows; cell_values is the run's per-db_id memo."""
+    needs, tmpl, prefixes = compiled.needs, compiled.jinja, compiled.prefixes
+
+    # Few-shot examples for every row of the batch are retrieved at once.
+    few_shots: List[List[Dict]] = [[] for _ in rows]
+    if "few_shot" in needs:
+        from src.util.nlp import get_few_shot_batch
+        few_shots = get_few_shot_batch(
+            [row[4] for row in rows],
+            [schemas.get(row[1]) or row[6] for row in rows],
+            db_path, db_path, top_k=top_k_few_shot, search=few_shot_search,
+        )
+
+    if "cell_values" in needs:
+        for db_id in dict.fromkeys(row[1] for row in rows):
+            if db_id not in cell_values:
+                cell_values[db_id] = _render_cell_values(db_id, db_path, spider_db_dir)
 
     records = []
-    for id_, db_id, src, diff, question, query, simplified_ddl_raw, foreign_keys_raw in rows:
+    for row, few_shot_examples in zip(rows, few_shots):
+        id_, db_id, src, diff, question, query, simplified_ddl_raw, foreign_keys_raw = row
         render_params: Dict[str, Any] = {}
+        schema = schemas.get(db_id)
 
         if "question" in needs:
             render_params["question"] = question
         if "simplified_ddl" in needs:
             render_params["simplified_ddl"] = _apply_prefix(
-                _render_json_lines(simplified_ddl_raw), prefixes["simplified_ddl"]
+                "\n".join(schema.simplified_ddl) if schema else _render_json_lines(simplified_ddl_raw),
+                prefixes["simplified_ddl"],
             )
         if "foreign_keys" in needs:
             render_params["foreign_keys"] = _apply_prefix(
-                _render_json_lines(foreign_keys_raw), prefixes["foreign_keys"]
+                "\n".join(schema.foreign_key_lines) if schema else _render_json_lines(foreign_keys_raw),
+                prefixes["foreign_keys"],
             )
-        cell_values_raw = _render_cell_values(db_id, spider_db_dir)
+        # None: not rendered for this config, so later renders fill it from the catalog.
+        cell_values_raw = cell_values.get(db_id)
         if "cell_values" in needs:
             render_params["cell_values"] = _apply_prefix(cell_values_raw, prefixes["cell_values"])
-        few_shot_examples: List[Dict] = []
+        matched_values_raw = None  # like cell_values: None until a config renders it
+        if "matched_values" in needs:
+            matched_values_raw = render_matched_values(match_values(db_path, db_id, question))
+            render_params["matched_values"] = _apply_prefix(matched_values_raw, prefixes["matched_values"])
         if "few_shot" in needs:
-            from src.util.nlp import get_few_shot
-            few_shot_examples = get_few_shot(question, simplified_ddl_raw, db_path, db_path, top_k=top_k_few_shot)
             render_params["few_shot"] = _apply_prefix(
                 _format_few_shot(few_shot_examples), prefixes["few_shot"]
             )
 
+        prompt_tokens = None
+        if budget is None:
+            prompt = tmpl.render(render_params)
+        else:
+            prompt, prompt_tokens = _fit_prompt(
+                compiled, render_params, budget,
+                question=question,
+                ddl_lines=list(schema.simplified_ddl) if schema else _parse_json_list(simplified_ddl_raw),
+                fk_lines=list(schema.foreign_key_lines) if schema else _parse_json_list(foreign_keys_raw),
+                key_columns=schema.primary_key_columns if schema else frozenset(),
+                cell_columns=load_cell_values(db_path).get(db_id),
+                cell_tables=None,
+                few_shot=few_shot_examples,
+            )
+
         records.append({
-            "prompt": tmpl.render(render_params),
+            "prompt": prompt,
             "question": question,
             "db_id": db_id,
             "source": src,
@@ -382,7 +663,9 @@ def prompt_generation(
             "simplified_ddl": simplified_ddl_raw,
             "foreign_keys": foreign_keys_raw,
             "cell_values": cell_values_raw,
+            "matched_values": matched_values_raw,
             "few_shot": few_shot_examples,
+            "prompt_tokens": prompt_tokens,
         })
 
     return records
@@ -392,12 +675,15 @@ def render_prompt(
     config: Dict[str, Any],
     rec: Dict[str, Any],
     section_visibility: Optional[Dict[str, bool]] = None,
+    db_path: Optional[str] = None,
 ) -> str:
     """
     Render a single prompt from a config dict using data already present in a record.
 
-    No database queries — reads simplified_ddl, foreign_keys, cell_values, few_shot,
-    and question directly from rec.
+    No per-record database scans — reads simplified_ddl, foreign_keys, cell_values,
+    matched_values, few_shot, and question directly from rec. Records without a
+    cell_values / matched_values field take them from the cell_value_catalog /
+    cell_value_index in db_path, when given.
 
     Args:
         config:             Parsed prompt config dict.
@@ -405,34 +691,26 @@ def render_prompt(
         section_visibility: Per-section visibility overrides (e.g. from schema_linking).
                             Keys match config section names; False disables that section.
                             Takes precedence over the section's own 'visible' flag.
+        db_path:            Optional path to OpenText2SQL.db (see above).
 
     Returns:
         Rendered prompt string.
     """
-    # Build effective config honoring base-config visibility (ablation settings).
-    # section_visibility (from schema linking) is handled via placeholder injection
-    # below — disabled sections stay in the template so the prompt's structural
-    # shape is preserved between preSQL and finSQL calls.
-    effective_config = {
-        key: {**section}
-        for key, section in config.items()
-        if section.get("visible", True)
-    }
-
-    # Collect template variables that belong to schema-linking-disabled sections.
-    # Those vars will receive a "None." placeholder instead of being dropped.
-    placeholder_vars: set = set()
-    if section_visibility:
-        for key, visible in section_visibility.items():
-            if not visible and key in effective_config:
-                placeholder_vars.update(_template_vars(effective_config[key].get("text", "")))
-
-    template = _config_to_template(effective_config)
-    if not template.strip():
+    # The effective template honours the base config's visibility (ablation settings).
+    # section_visibility (from schema linking) is handled via placeholder injection:
+    # disabled sections stay in the template so the prompt's structural shape is
+    # preserved between preSQL and finSQL calls, and their variables receive a
+    # "None." placeholder instead of being dropped. Parsing and compiling happen
+    # once per (config, visibility mask); see _compile_prompt.
+    compiled = _compile_prompt(_config_key(config), _hidden_key(section_visibility))
+    if not compiled.template.strip():
         return ""
+    return compiled.jinja.render(_prompt_params(compiled, rec, db_path))
 
-    needs = _template_vars(template)
-    prefixes = {var: _get_line_prefix(template, var) for var in needs}
+
+def _prompt_params(compiled: _CompiledPrompt, rec: Dict[str, Any], db_path: Optional[str]) -> Dict[str, Any]:
+    """render_prompt's template variables for rec."""
+    needs, prefixes, placeholder_vars = compiled.needs, compiled.prefixes, compiled.placeholder_vars
 
     render_params: Dict[str, Any] = {}
     if "question" in needs:
@@ -457,17 +735,241 @@ def render_prompt(
         if "cell_values" in placeholder_vars:
             render_params["cell_values"] = "None."
         else:
-            render_params["cell_values"] = _apply_prefix(
-                rec.get("cell_values") or "",
-                prefixes.get("cell_values", ""),
-            )
+            cell_values = rec.get("cell_values")
+            if cell_values is None and db_path:
+                columns = load_cell_values(db_path).get(rec.get("db_id"))
+                cell_values = render_cell_values(columns) if columns else ""
+            render_params["cell_values"] = _apply_prefix(cell_values or "", prefixes.get("cell_values", ""))
+    if "matched_values" in needs:
+        matched_values = rec.get("matched_values")
+        if matched_values is None and db_path:
+            matched_values = render_matched_values(match_values(db_path, rec.get("db_id"), rec.get("question") or ""))
+        render_params["matched_values"] = _apply_prefix(matched_values or "", prefixes.get("matched_values", ""))
     if "few_shot" in needs:
         render_params["few_shot"] = _apply_prefix(
             _format_few_shot(rec.get("few_shot") or []),
             prefixes.get("few_shot", ""),
         )
+    return render_params
+
+
+def fit_prompt(
+    config: Dict[str, Any],
+    rec: Dict[str, Any],
+    budget: "PromptBudget",
+    section_visibility: Optional[Dict[str, bool]] = None,
+    db_path: Optional[str] = None,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    render_prompt trimmed to a token budget (see _fit_prompt for the trimming order).
 
-    return Environment().from_string(template).render(render_params)
+    Returns (prompt, token counts per model path). Arguments are those of
+    render_prompt, plus the PromptBudget from prompt_budget().
+    """
+    compiled = _compile_prompt(_config_key(config), _hidden_key(section_visibility))
+    if not compiled.template.strip():
+        return "", count_prompt_tokens(budget, "")
+
+    cell_values = rec.get("cell_values")
+    columns = load_cell_values(db_path).get(rec.get("db_id")) if db_path else None
+    schema = load_schemas(db_path).get(rec.get("db_id")) if db_path else None
+    tables = {line.split("(", 1)[0].strip().lower() for line in (cell_values or "").splitlines() if line.strip()}
+    return _fit_prompt(
+        compiled, _prompt_params(compiled, rec, db_path), budget,
+        question=rec.get("question") or "",
+        ddl_lines=_parse_json_list(rec.get("simplified_ddl") or "[]"),
+        fk_lines=_parse_json_list(rec.get("foreign_keys") or "[]"),
+        key_columns=schema.primary_key_columns if schema else frozenset(),
+        cell_columns=columns if columns and cell_values != "" else None,
+        cell_tables=tables,
+        few_shot=rec.get("few_shot") or [],
+    )
+
+
+# ---------------------------------------------------------------------------
+# Token budgets
+# ---------------------------------------------------------------------------
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_FK_COLUMN_RE = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)\s*\(([^)]*)\)")
+
+
+class PromptBudget(NamedTuple):
+    models: Tuple[str, ...]             # resolved paths of the counted models (keys of the token counts)
+    tokenizers: Tuple[str, ...]         # Hugging Face id whose tokenizer measures each model's prompts
+    limits: Tuple[Optional[int], ...]   # each model's models.json prompt_budget (None: count only)
+    tokenizer_configs: Tuple[str, ...]  # each model's tokenizer_config, JSON-encoded
+
+
+def _budget_tokenizer(entry: Dict[str, Any]) -> Optional[str]:
+    """The Hugging Face id an entry's prompts are counted with: its "tokenizer", else path for mlx entries."""
+    if entry.get("tokenizer"):
+        return entry["tokenizer"]
+    return entry["path"] if entry.get("backend", "mlx") == "mlx" else None
+
+
+def prompt_budget(models: Iterable[str]) -> PromptBudget:
+    """
+    The token budget of prompts sent to every model in models (specs as for infer).
+
+    Prompts are counted with each entry's "tokenizer" (default: path, for mlx
+    entries). openai and replay entries without one are left out, as their path
+    need not name a Hugging Face checkpoint; one with a prompt_budget is an error.
+    """
+    counted = []
+    for entry in (_resolve_model_entry(m.partition(":")[0]) for m in models):
+        tokenizer = _budget_tokenizer(entry)
+        if tokenizer is None:
+            if entry.get("prompt_budget") is not None:
+                raise ValueError(
+                    f"{entry['path']} has a prompt_budget but no tokenizer to count it with. "
+                    'Add a "tokenizer" (Hugging Face id) to its models.json entry.'
+                )
+            continue
+        counted.append((entry, tokenizer))
+    return PromptBudget(
+        tuple(e["path"] for e, _ in counted),
+        tuple(tokenizer for _, tokenizer in counted),
+        tuple(e.get("prompt_budget") for e, _ in counted),
+        tuple(json.dumps(e.get("tokenizer_config") or {}, sort_keys=True) for e, _ in counted),
+    )
+
+
+@lru_cache(maxsize=None)
+def _tokenizer(tokenizer_id: str, tokenizer_config: str = "{}"):
+    """A Hugging Face tokenizer; only the tokenizer files are fetched, not the weights."""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(tokenizer_id, **json.loads(tokenizer_config))
+
+
+def count_prompt_tokens(budget: PromptBudget, prompt: str) -> Dict[str, int]:
+    """Prefill tokens per model path: the prompt collapsed to one line, in the chat template infer() applies."""
+    text = " ".join(prompt.split())
+    counts = {}
+    for path, tokenizer_id, tokenizer_config in zip(budget.models, budget.tokenizers, budget.tokenizer_configs):
+        tokenizer = _tokenizer(tokenizer_id, tokenizer_config)
+        chat = tokenizer.apply_chat_template(
+            [{"role": "user", "content": text}], tokenize=False, add_generation_prompt=True, enable_thinking=False,
+        )
+        counts[path] = len(tokenizer.encode(chat, add_special_tokens=False))
+    return counts
+
+
+def _fits(budget: PromptBudget, counts: Dict[str, int]) -> bool:
+    return all(limit is None or counts[path] <= limit for path, limit in zip(budget.models, budget.limits))
+
+
+def prompt_token_summary(token_counts: Iterable[Optional[Dict[str, int]]], budget: PromptBudget) -> str:
+    """One line on a run's prompt_tokens: mean / max of each prompt's largest count, and how many are over budget."""
+    largest, over = [], 0
+    for counts in token_counts:
+        if counts:
+            largest.append(max(counts.values()))
+            over += not _fits(budget, counts)
+    if not largest:
+        return "Prompt tokens: none counted."
+    return (f"Prompt tokens: mean {sum(largest) / len(largest):.0f}, max {max(largest)}; "
+            f"{over}/{len(largest)} over budget after trimming.")
+
+
+def _fit_prompt(compiled, params, budget, question, ddl_lines, fk_lines, key_columns, cell_columns, cell_tables,
+                few_shot):
+    """
+    Render params, trimming them until the prompt fits every model's budget.
+
+    Trims cell values first (fewer samples per column, then none; without
+    catalog columns, straight to none), then few-shot examples (least similar
+    first), then schema columns the question does not mention (see
+    _low_relevance_columns), dropping as few as fit. Record fields are not
+    changed, only params (in place) and the prompt. A prompt that still does not
+    fit is returned fully trimmed. Returns (prompt, token counts per model path).
+    """
+    prefixes, placeholder_vars = compiled.prefixes, compiled.placeholder_vars
+
+    def render():
+        prompt = compiled.jinja.render(params)
+        return prompt, count_prompt_tokens(budget, prompt)
+
+    prompt, counts = render()
+    if _fits(budget, counts):
+        return prompt, counts
+
+    steps: List[Tuple[str, str]] = []
+    if "cell_values" in params and "cell_values" not in placeholder_vars:
+        if cell_columns:
+            steps += [("cell_values", render_cell_values(cell_columns, cell_tables, max_samples=n)) for n in (2, 1)]
+        steps.append(("cell_values", ""))
+    if "few_shot" in params:
+        steps += [("few_shot", _format_few_shot(few_shot[:n])) for n in range(len(few_shot) - 1, -1, -1)]
+    for var, value in steps:
+        params[var] = _apply_prefix(value, prefixes.get(var, ""))
+        prompt, counts = render()
+        if _fits(budget, counts):
+            return prompt, counts
+
+    if "simplified_ddl" not in params or "simplified_ddl" in placeholder_vars:
+        return prompt, counts
+    droppable = _low_relevance_columns(ddl_lines, fk_lines, question, key_columns)
+
+    def drop(n):
+        params["simplified_ddl"] = _apply_prefix(
+            "\n".join(_drop_columns(ddl_lines, droppable[:n])), prefixes.get("simplified_ddl", ""),
+        )
+        return render()
+
+    # Fewest dropped columns that fit, by binary search; all of them if none do.
+    lo, hi, best = 1, len(droppable), len(droppable)
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if _fits(budget, drop(mid)[1]):
+            best, hi = mid, mid - 1
+        else:
+            lo = mid + 1
+    return drop(best) if droppable else (prompt, counts)
+
+
+def _low_relevance_columns(
+    ddl_lines: List[str], fk_lines: List[str], question: str, key_columns: FrozenSet[Tuple[str, str]] = frozenset(),
+) -> List[Tuple[int, str]]:
+    """
+    (simplified_ddl line, column) pairs a budget may drop, in drop order.
+
+    A column is droppable when none of its words occurs in the question and it
+    is not a key: its table's first column (usually the key, and the only one
+    known without the schema catalog), a primary-key column in key_columns
+    (lower-cased (table, column) pairs, see DbSchema.primary_key_columns) or a
+    foreign-key column. Later columns go first.
+    """
+    words = {w.rstrip("s") for w in _WORD_RE.findall(question.lower())}
+    key_columns = key_columns | {
+        (table.lower(), column.strip().lower()) for line in fk_lines for table, column in _FK_COLUMN_RE.findall(line)
+    }
+    droppable = []
+    for i, line in enumerate(ddl_lines):
+        table, _, rest = line.partition("(")
+        columns = [c.strip() for c in rest.rsplit(")", 1)[0].split(",")]
+        for pos, column in enumerate(columns[1:], 1):
+            if (table.strip().lower(), column.lower()) in key_columns:
+                continue
+            if any(w.rstrip("s") in words for w in _WORD_RE.findall(column.lower())):
+                continue
+            droppable.append((-pos, i, column))
+    droppable.sort(key=lambda item: item[0])
+    return [(i, column) for _, i, column in droppable]
+
+
+def _drop_columns(ddl_lines: List[str], dropped: List[Tuple[int, str]]) -> List[str]:
+    by_line: Dict[int, set] = {}
+    for i, column in dropped:
+        by_line.setdefault(i, set()).add(column)
+    out = []
+    for i, line in enumerate(ddl_lines):
+        if i in by_line:
+            table, _, rest = line.partition("(")
+            columns = [c.strip() for c in rest.rsplit(")", 1)[0].split(",")]
+            line = f"{table}({', '.join(c for c in columns if c not in by_line[i])})"
+        out.append(line)
+    return out
 
 
 # ---------------------------------------------------------------------------
@@ -499,7 +1001,7 @@ def _linked_cell_values(cell_values: str, referenced: set) -> str:
     return "\n".join(kept) if kept else cell_values  # fallback: keep all if nothing matched
 
 
-def schema_linking(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def schema_linking(records: List[Dict[str, Any]], db_path: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Prune simplified_ddl, foreign_keys and cell_values in each record to only the
     tables/columns referenced in the presql field.
@@ -507,14 +1009,20 @@ def schema_linking(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     Args:
         records: List of dicts from presql.jsonl. Each dict must contain at least:
                  presql, simplified_ddl (JSON string), foreign_keys (JSON string),
-                 cell_values (rendered text).
+                 cell_values (rendered text, or None if it was not rendered).
+        db_path: Optional path to OpenText2SQL.db. When given, records whose db_id
+                 is in the schema catalog are linked against the prebuilt schema
+                 instead of re-parsing their JSON strings, and cell_values is
+                 re-rendered for the linked tables from the cell_value_catalog.
 
     Returns:
-        List of dicts (same length and same keys as input, minus 'prompt') where
+        List of dicts (same length and same keys as input, minus 'prompt' and
+        'prompt_tokens') where
         simplified_ddl, foreign_keys and cell_values contain only the entries
         relevant to the presql output.
         simplified_ddl and foreign_keys are returned as JSON strings to preserve
-        the original format; cell_values is returned as rendered text.
+        the original format; cell_values is returned as rendered text (None
+        stays None when there is no catalog to render it from).
 
         Each record also gains a 'section_visibility' key — a dict mapping config
         section names to booleans. False means the section is empty after pruning
@@ -522,34 +1030,49 @@ def schema_linking(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
           {
             "schema":            bool,   # True unless simplified_ddl pruned to empty
             "foreign_keys":      bool,   # True unless no FKs reference the linked tables
-            "reference_values":  bool,   # True unless cell_values pruned to empty
+            "reference_values":  bool,   # True unless cell_values is (pruned to) empty
           }
     """
     from src.util.nlp import extract_referenced_tables_from_sql
 
+    schemas = load_schemas(db_path) if db_path else {}
+    cell_catalog = load_cell_values(db_path) if db_path else {}
+
     results = []
     for rec in records:
         presql = rec.get("presql") or ""
         tables, _ = extract_referenced_tables_from_sql(presql)
         referenced = {t.lower() for t in tables}
-
-        ddl_list = _parse_json_list(rec.get("simplified_ddl") or "[]")
-        fk_list  = _parse_json_list(rec.get("foreign_keys")  or "[]")
-        cell_raw = rec.get("cell_values") or ""
-
-        if referenced:
-            ddl_list = _linked_simplified_ddl(ddl_list, referenced)
-            fk_list  = _linked_foreign_keys(fk_list,  referenced)
-            cell_raw = _linked_cell_values(cell_raw,  referenced)
-
-        out = {k: v for k, v in rec.items() if k != "prompt"}
+        schema = schemas.get(rec.get("db_id"))
+        cell_raw = rec.get("cell_values")
+
+        if schema is not None:
+            ddl_list = list(schema.simplified_ddl)
+            fk_list  = list(schema.foreign_key_lines)
+            if referenced:
+                ddl_list = [schema.table_ddl[t] for t in schema.table_ddl if t in referenced] or ddl_list
+                fk_list  = [line for line, fk_tables in schema.foreign_key_tables if fk_tables <= referenced]
+        else:
+            ddl_list = _parse_json_list(rec.get("simplified_ddl") or "[]")
+            fk_list  = _parse_json_list(rec.get("foreign_keys")  or "[]")
+            if referenced:
+                ddl_list = _linked_simplified_ddl(ddl_list, referenced)
+                fk_list  = _linked_foreign_keys(fk_list,  referenced)
+
+        columns = cell_catalog.get(rec.get("db_id"))
+        if columns is not None and cell_raw != "":
+            cell_raw = render_cell_values(columns, tables=referenced)
+        elif referenced and cell_raw:
+            cell_raw = _linked_cell_values(cell_raw, referenced)
+
+        out = {k: v for k, v in rec.items() if k not in ("prompt", "prompt_tokens")}
         out["simplified_ddl"] = json.dumps(ddl_list, ensure_ascii=False)
         out["foreign_keys"]   = json.dumps(fk_list,  ensure_ascii=False)
         out["cell_values"]    = cell_raw
         out["section_visibility"] = {
             "schema":           bool(ddl_list),
             "foreign_keys":     bool(fk_list),
-            "reference_values": bool(cell_raw.strip()),
+            "reference_values": cell_raw is None or bool(cell_raw.strip()),
         }
         results.append(out)
 
@@ -609,6 +1132,7 @@ def cross_consistency(
     records: List[Dict[str, Any]],
     batch_size: int = 1,
     max_tokens: int = 512,
+    group_by_db: bool = False,
 ) -> List[Dict[str, Any]]:
     """
     Run inference with multiple models sequentially and select the SQL whose execution
@@ -626,6 +1150,8 @@ def cross_consistency(
                     'db_id' keys.
         batch_size: Prompts per inference batch passed to infer() (default 1).
         max_tokens: Max tokens to generate per prompt.
+        group_by_db: Run each model's prompts grouped by db_id, reusing the shared
+                    schema prefix's KV cache (infer()'s group_by).
 
     Returns:
         List of dicts (same length and keys as records) with added keys:
@@ -634,7 +1160,6 @@ def cross_consistency(
           consistency_score — fraction of models whose SQL produced the winning result
           models            — list of resolved model names used
     """
-    import random
     from dotenv import load_dotenv
     load_dotenv()
     root_path = os.environ.get("ROOT_PATH")
@@ -643,6 +1168,7 @@ def cross_consistency(
 
     spider_db_dir = os.path.join(root_path, "database", "spider")
     prompts = [r["prompt"] for r in records]
+    group_by = [r["db_id"] for r in records] if group_by_db else None
 
     # ── Step 1: run each model sequentially, keep all outputs in memory ───────
     # all_model_sql[model_idx][record_idx] = sql_string
@@ -652,7 +1178,9 @@ def cross_consistency(
     for model_spec in models:
         key = model_spec.partition(":")[0]
         resolved_names.append(resolve_model(key))
-        sql_list = infer(model=model_spec, prompts=prompts, batch_size=batch_size, max_tokens=max_tokens)
+        sql_list = infer(
+            model=model_spec, prompts=prompts, batch_size=batch_size, max_tokens=max_tokens, group_by=group_by,
+        )
         all_model_sql.append(sql_list)
 
     # ── Step 2: reorganize by record ─────────────────────────────────────────
@@ -663,38 +1191,111 @@ def cross_consistency(
     ]
 
     # ── Step 3: semantic majority vote per record (skipped for single model) ──
-    single_model = len(models) == 1
-    results = []
-    for rec, candidates in zip(records, candidates_per_record):
-        out = dict(rec)
-        out["all_sql"] = candidates
-        out["models"] = resolved_names
-
-        if single_model:
-            out["sql"] = candidates[0]
-            out["consistency_score"] = None
-        else:
-            db_id = rec.get("db_id") or ""
-            db_path = os.path.join(spider_db_dir, db_id, f"{db_id}.sqlite")
-
-            exec_results = [_execute_sql(sql, db_path) for sql in candidates]
-
-            groups: List[List[int]] = []
-            for i, res in enumerate(exec_results):
-                placed = False
-                for group in groups:
-                    if _results_equal(res, exec_results[group[0]]):
-                        group.append(i)
-                        placed = True
-                        break
-                if not placed:
-                    groups.append([i])
-
-            max_size = max(len(g) for g in groups)
-            winner_group = random.choice([g for g in groups if len(g) == max_size])
-            out["sql"] = candidates[winner_group[0]]
-            out["consistency_score"] = max_size / len(candidates)
+    return [
+        _consistency_record(rec, candidates, resolved_names, spider_db_dir)
+        for rec, candidates in zip(records, candidates_per_record)
+    ]
 
-        results.append(out)
 
-    return results
+def iter_cross_consistency(
+    models: List[str],
+    records: Iterable[Dict[str, Any]],
+    spill_dir: str,
+    batch_size: int = 1,
+    max_tokens: int = 512,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming cross_consistency for record streams that should not be held in memory.
+
+    The first model runs while records stream in: each record is appended to
+    spill_dir/records.jsonl as the model pulls its prompt. Every model's SQL
+    goes to spill_dir/candidates_<i>.jsonl, and the other models read their
+    prompts back from the spill file. Once all models have run, the records are
+    yielded in input order with the keys cross_consistency adds, by reading the
+    spill files in lockstep. Only one inference batch is in memory at a time.
+
+    Args:
+        models:     Model specs, as for cross_consistency.
+        records:    Iterable of record dicts with 'prompt' and 'db_id' (consumed once).
+        spill_dir:  Directory for the spill files (created if missing; left in place).
+        batch_size: Prompts per inference batch passed to infer_iter() (default 1).
+        max_tokens: Max tokens to generate per prompt.
+    """
+    from contextlib import ExitStack
+    from dotenv import load_dotenv
+    load_dotenv()
+    root_path = os.environ.get("ROOT_PATH")
+    if not root_path:
+        raise ValueError("ROOT_PATH not set in .env")
+
+    spider_db_dir = os.path.join(root_path, "database", "spider")
+    os.makedirs(spill_dir, exist_ok=True)
+    records_path = os.path.join(spill_dir, "records.jsonl")
+    candidate_paths = [os.path.join(spill_dir, f"candidates_{i}.jsonl") for i in range(len(models))]
+    resolved_names = [resolve_model(m.partition(":")[0]) for m in models]
+
+    def spill(f):
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            yield rec["prompt"]
+
+    def spilled_prompts():
+        with open(records_path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)["prompt"]
+
+    # ── Step 1: each model in turn; the first one also spills the records ─────
+    for i, (model_spec, candidate_path) in enumerate(zip(models, candidate_paths)):
+        with ExitStack() as stack:
+            out = stack.enter_context(open(candidate_path, "w", encoding="utf-8"))
+            if i == 0:
+                prompts = spill(stack.enter_context(open(records_path, "w", encoding="utf-8")))
+            else:
+                prompts = spilled_prompts()
+            for sql in infer_iter(model_spec, prompts, batch_size=batch_size, max_tokens=max_tokens):
+                out.write(json.dumps(sql, ensure_ascii=False) + "\n")
+
+    # ── Step 2: vote record by record ─────────────────────────────────────────
+    with ExitStack() as stack:
+        f_records = stack.enter_context(open(records_path, encoding="utf-8"))
+        f_candidates = [stack.enter_context(open(path, encoding="utf-8")) for path in candidate_paths]
+        for line, *candidate_lines in zip(f_records, *f_candidates):
+            candidates = [json.loads(c) for c in candidate_lines]
+            yield _consistency_record(json.loads(line), candidates, resolved_names, spider_db_dir)
+
+
+def _consistency_record(rec, candidates, resolved_names, spider_db_dir):
+    """rec plus sql / all_sql / consistency_score / models for one record's candidate SQLs."""
+    out = dict(rec)
+    out["all_sql"] = candidates
+    out["models"] = resolved_names
+
+    if len(candidates) == 1:
+        out["sql"] = candidates[0]
+        out["consistency_score"] = None
+    else:
+        db_id = rec.get("db_id") or ""
+        out["sql"], out["consistency_score"] = _vote(candidates, os.path.join(spider_db_dir, db_id, f"{db_id}.sqlite"))
+    return out
+
+
+def _vote(candidates: List[str], db_path: str) -> Tuple[str, float]:
+    """(winning SQL, share of candidates in its group) by semantic majority; ties are broken randomly."""
+    import random
+
+    exec_results = [_execute_sql(sql, db_path) for sql in candidates]
+
+    groups: List[List[int]] = []
+    for i, res in enumerate(exec_results):
+        placed = False
+        for group in groups:
+            if _results_equal(res, exec_results[group[0]]):
+                group.append(i)
+                placed = True
+                break
+        if not placed:
+            groups.append([i])
+
+    max_size = max(len(g) for g in groups)
+    winner_group = random.choice([g for g in groups if len(g) == max_size])
+    return candidates[winner_group[0]], max_size / len(candidates)
@@ -3,39 +3,105 @@ nlp.py — NLP, few-shot retrieval, and schema refinement utilities.
 
 Public API:
   get_question_skeleton(question, schema)                               -> str
-  get_few_shot(question, schema, index_db_path, gold_db_path, top_k=3) -> list
+  skeleton_key(question, schema, model_id)                              -> str
+  get_few_shot(question, schema, index_db_path, gold_db_path, top_k=3,
+               exclude_db_id=None, difficulty=None, search="exact")     -> list
+  get_few_shot_batch(questions, schemas, index_db_path, gold_db_path, top_k=3,
+                     exclude_db_ids=None, difficulty=None, search="exact") -> list[list]
   extract_referenced_tables_from_sql(sql)                              -> (set, error)
+
+Skeletonization caches the lemmatizer, the lemma of every token seen and the
+domain-token set of every schema. Retrieval looks question vectors up in
+question_skeletons (precomputed for dev/test rows by src.pipeline.embedding)
+by skeleton_key and only runs NLP for questions it does not find there.
+
+Few-shot search can skip examples from one db_id and keep only some difficulty
+levels. Both are vec0 metadata columns, so the filters run inside the KNN query
+and top_k stays exact however selective they are.
+
+search selects how the index is searched (SEARCH_MODES):
+  exact      brute-force KNN over the float vectors (vec0 MATCH / matrix multiply)
+  quantized  KNN over embedding_quantized (int8 or binary), exact rerank of a
+             few candidates
+  ivf, ...   an src.util.ann backend narrows the candidates, which are scored
+             exactly against the in-memory index
+Distances are exact in every mode; only the approximate modes may miss neighbours.
+
+When build_index has written a current shared export (src.util.shared_index),
+the in-memory searches map it instead of reading the index into each process,
+take question vectors and gold pairs from it, and load spaCy only for
+questions it does not cover.
 """
 
+import hashlib
+import os
 import re
 import sys
 import json
 import sqlite3
 import subprocess
-from typing import Optional, Set, Tuple
+from functools import lru_cache
+from typing import NamedTuple, Optional, Set, Tuple
 
+import numpy as np
 import spacy
 import sqlite_vec
 from nltk.stem import WordNetLemmatizer
 from nltk.tokenize import word_tokenize
 
+from src.util.ann import BACKENDS as ANN_BACKENDS, ann_path, load_ann
+from src.util.schema import DbSchema, domain_tokens as schema_domain_tokens
+from src.util.shared_index import SharedIndex, load_shared_index, shared_index_path
+
 # NLTK data is expected to already be present (downloaded by src/pipeline/embedding.py).
 
 _nlp = None
 _TABLE = "embedding_dataset"
 
+_SPACY_MODEL = "en_core_web_md"
+# Trained components of the en_core_web_* pipelines; none of them affects Doc.vector.
+_NON_VECTOR_PIPES = ("tok2vec", "tagger", "morphologizer", "parser", "senter",
+                     "attribute_ruler", "lemmatizer", "ner")
+
+_SKELETON_TABLE = "question_skeletons"
+# Single-row table recording the model id and vector dimension of question_skeletons.
+_SKELETON_MODEL_TABLE = "question_skeletons_model"
+
+# Optional quantized copy of embedding_dataset (database/embedding_quantized.sql)
+# and the single-row table holding the centre and scale it was quantized with.
+_QUANT_TABLE = "embedding_quantized"
+_QUANT_META_TABLE = "embedding_quantization"
+# Quantization kind → (vec0 column type for a dimension, SQL wrapper of a query blob).
+QUANTIZATIONS = {
+    "int8": (lambda dim: f"int8[{dim}]", "vec_int8(?)"),
+    "binary": (lambda dim: f"bit[{-(-dim // 8) * 8}]", "vec_bit(?)"),
+}
+# Quantized candidates fetched per requested example before the exact rerank.
+RERANK_FACTOR = 10
+
+SEARCH_MODES = ("exact", "quantized", *ANN_BACKENDS)
+
+# Bump whenever get_question_skeleton's output changes, so the embedding index
+# re-embeds every row on its next build.
+SKELETON_VERSION = 1
+
 
 def _get_nlp():
+    """
+    spaCy en_core_web_md with only its tokenizer and static vectors.
+
+    Retrieval only reads Doc.vector — the mean of each token's static vector — so
+    the trained components are never loaded; skeleton vectors are identical to
+    those of the full pipeline.
+    """
     global _nlp
     if _nlp is None:
-        spacy.prefer_gpu()
-        name = "en_core_web_md"
         try:
-            _nlp = spacy.load(name)
+            _nlp = spacy.load(_SPACY_MODEL, exclude=_NON_VECTOR_PIPES)
         except OSError:
-            print(f"Downloading {name}...")
-            subprocess.check_call([sys.executable, "-m", "spacy", "download", name])
-            _nlp = spacy.load(name)
+            print(f"Downloading {_SPACY_MODEL}...")
+            subprocess.check_call([sys.executable, "-m", "spacy", "download", _SPACY_MODEL])
+            _nlp = spacy.load(_SPACY_MODEL, exclude=_NON_VECTOR_PIPES)
     return _nlp
 
 
@@ -50,26 +116,85 @@ def _open_vec_conn(path, read_only=False):
     return conn
 
 
+def _vector_model_id(nlp):
+    """Identify the model whose vectors are stored (name, version and vectors table)."""
+    meta = nlp.meta
+    return f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}:{nlp.vocab.vectors.name}"
+
+
+def _embed(nlp, texts, batch_size=256, n_process=1):
+    """Yield a float32 vector per text, running only spaCy's tokenizer and vector lookup."""
+    for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=nlp.pipe_names):
+        yield doc.vector.astype('float32')
+
+
+def _quantize(vectors, kind, center, scale):
+    """
+    Quantize float32 rows for embedding_quantized.
+
+    Rows are centred first (L2 distance is translation invariant). int8 scales
+    them into [-127, 127]; binary keeps one sign bit per dimension, packed and
+    zero-padded to whole bytes, and is searched by Hamming distance.
+    """
+    centred = np.atleast_2d(vectors) - center
+    if kind == "int8":
+        return np.clip(np.rint(centred * scale), -127, 127).astype(np.int8)
+    return np.packbits(centred > 0, axis=1)
+
+
 # ---------------------------------------------------------------------------
 # Skeleton computation
 # ---------------------------------------------------------------------------
 
-def get_question_skeleton(question, schema):
-    """Replace domain-specific tokens (table/column names, numbers, literals) with <mask>."""
-    lemmatizer = WordNetLemmatizer()
+@lru_cache(maxsize=None)
+def _get_lemmatizer():
+    return WordNetLemmatizer()
 
+
+@lru_cache(maxsize=1 << 16)
+def _lemmatize(token):
+    return _get_lemmatizer().lemmatize(token)
+
+
+@lru_cache(maxsize=1024)
+def _json_domain_tokens(simplified_ddl_json):
+    """Domain tokens of a simplified_ddl JSON string; None if it does not parse."""
     try:
-        schema_data = json.loads(schema)
+        return schema_domain_tokens(json.loads(simplified_ddl_json))
     except (json.JSONDecodeError, TypeError):
-        return question
+        return None
+
+
+def _simplified_ddl_json(schema):
+    return schema.simplified_ddl_json if isinstance(schema, DbSchema) else schema
+
 
-    domain_tokens = set()
-    for table_info in schema_data:
-        table_name = table_info.split('(')[0].strip()
-        domain_tokens.add(table_name.lower())
-        columns_part = table_info.split('(')[1].split(')')[0]
-        for col in columns_part.split(','):
-            domain_tokens.add(col.strip().split()[0].lower())
+def skeleton_key(question, schema, model_id):
+    """
+    Content hash of everything a question's skeleton and vector derive from.
+
+    Used as embedding_dataset.content_hash and to look up question_skeletons.
+    """
+    key = json.dumps([question, _simplified_ddl_json(schema), SKELETON_VERSION, model_id])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def get_question_skeleton(question, schema):
+    """
+    Replace domain-specific tokens (table/column names, numbers, literals) with <mask>.
+
+    schema is either a DbSchema from the catalog (its domain tokens are cached on
+    the instance) or a simplified_ddl JSON string (domain tokens cached per string).
+    """
+    if isinstance(schema, DbSchema):
+        domain_tokens = schema.domain_tokens
+    else:
+        try:
+            domain_tokens = _json_domain_tokens(schema)
+        except TypeError:  # unhashable
+            domain_tokens = None
+        if domain_tokens is None:
+            return question
 
     quoted_strings = []
     quote_pattern = r"'([^']*)'|\"([^\"]*)\""
@@ -88,7 +213,7 @@ def get_question_skeleton(question, schema):
         elif token.isdigit() or token.replace('.', '').replace(',', '').isdigit():
             skeleton_tokens.append('<mask>')
         else:
-            lemmatized = lemmatizer.lemmatize(token)
+            lemmatized = _lemmatize(token)
             if lemmatized in domain_tokens or token in domain_tokens:
                 skeleton_tokens.append('<mask>')
             else:
@@ -101,21 +226,180 @@ def get_question_skeleton(question, schema):
 # Retrieval
 # ---------------------------------------------------------------------------
 
-def get_few_shot(question, schema, index_db_path, gold_db_path, top_k=3):
+def _stored_model(conn):
+    """(model_id, dim) recorded in question_skeletons_model, or None for an index built without it."""
+    try:
+        return conn.execute(f"SELECT model_id, dim FROM {_SKELETON_MODEL_TABLE}").fetchone()
+    except sqlite3.OperationalError:
+        return None
+
+
+def _stored_vectors(conn, keys):
+    """{content_hash: float32 vector} for the keys found in question_skeletons."""
+    try:
+        return {
+            key: np.frombuffer(vector, dtype=np.float32)
+            for key, vector in conn.execute(
+                f"SELECT content_hash, vector FROM {_SKELETON_TABLE} "
+                "WHERE content_hash IN (SELECT value FROM json_each(?))",
+                (json.dumps(sorted(set(keys))),),
+            )
+        }
+    except sqlite3.OperationalError:  # index built before question_skeletons existed
+        return {}
+
+
+def _question_vectors(questions, schemas, index_db_path, shared=None):
+    """
+    float32 query vectors, one row per question.
+
+    Vectors precomputed in question_skeletons (or in the shared export) are
+    reused; only the remaining questions are skeletonized and embedded. The
+    model id and dimension are read from the index too, so spaCy is loaded
+    only if some questions are missing (or the index predates
+    question_skeletons_model).
+    """
+    nlp = None
+    if shared is not None:
+        model_id, dim = shared.model_id, shared.vectors.shape[1]
+        keys = [skeleton_key(q, s, model_id) for q, s in zip(questions, schemas)]
+        known = shared.question_vectors(keys)
+    else:
+        conn = sqlite3.connect(f"file:{index_db_path}?mode=ro", uri=True)
+        try:
+            stored = _stored_model(conn)
+            if stored is None:
+                nlp = _get_nlp()
+                stored = _vector_model_id(nlp), nlp.vocab.vectors_length
+            model_id, dim = stored
+            keys = [skeleton_key(q, s, model_id) for q, s in zip(questions, schemas)]
+            known = _stored_vectors(conn, keys)
+        finally:
+            conn.close()
+
+    vectors = np.zeros((len(questions), dim), dtype=np.float32)
+    missing = [i for i, key in enumerate(keys) if key not in known]
+    if missing:
+        nlp = nlp or _get_nlp()
+        computed = _embed(nlp, [get_question_skeleton(questions[i], schemas[i]) for i in missing])
+        for i, vector in zip(missing, computed):
+            vectors[i] = vector
+    for i, key in enumerate(keys):
+        if key in known:
+            vectors[i] = known[key]
+    return vectors
+
+
+def _difficulties(difficulty):
+    """Normalize a difficulty filter (None, one level or an iterable of levels) to a tuple or None."""
+    if difficulty is None:
+        return None
+    if isinstance(difficulty, str):
+        return (difficulty,)
+    return tuple(difficulty)
+
+
+def _filter_sql(exclude_db_id, difficulties):
+    """SQL appended to a vec0 KNN WHERE clause for the metadata filters, and its parameters."""
+    filters, params = "", []
+    if exclude_db_id is not None:
+        filters += " AND db_id != ?"
+        params.append(exclude_db_id)
+    if difficulties is not None:
+        filters += f" AND difficulty IN ({','.join('?' * len(difficulties))})"
+        params.extend(difficulties)
+    return filters, params
+
+
+def _exact_hits(conn, query, top_k, filters, params):
+    """(rowid, id, source, distance) of the exact top_k over the float index."""
+    # sqlite-vec breaks distance ties by storage position, so widen the search
+    # until every row tied with the k-th hit has been seen, then order by rowid.
+    limit = top_k
+    while True:
+        hits = conn.execute(
+            f"SELECT rowid, id, source, distance FROM {_TABLE} "
+            f"WHERE vector MATCH ? AND k = ?{filters} ORDER BY distance",
+            (query.tobytes(), limit, *params),
+        ).fetchall()
+        if len(hits) < limit or hits[-1][3] > hits[top_k - 1][3]:
+            break
+        limit *= 2
+    return sorted(hits, key=lambda hit: (hit[3], hit[0]))[:top_k]
+
+
+def _quantized_hits(conn, query, top_k, filters, params, rerank_factor=RERANK_FACTOR):
+    """
+    (rowid, id, source, distance) of an approximate top_k: a KNN over
+    embedding_quantized fetches top_k × rerank_factor candidates, which are
+    reranked by exact L2 distance on their float vectors.
+    """
+    kind, scale, center = conn.execute(f"SELECT kind, scale, center FROM {_QUANT_META_TABLE}").fetchone()
+    quantized = _quantize(query, kind, np.frombuffer(center, dtype=np.float32), scale)[0]
+    candidates = [rowid for rowid, in conn.execute(
+        f"SELECT rowid FROM {_QUANT_TABLE} "
+        f"WHERE vector MATCH {QUANTIZATIONS[kind][1]} AND k = ?{filters} ORDER BY distance",
+        (quantized.tobytes(), top_k * rerank_factor, *params),
+    )]
+    hits = conn.execute(
+        f"SELECT rowid, id, source, vec_distance_l2(vector, ?) FROM {_TABLE} "
+        "WHERE rowid IN (SELECT value FROM json_each(?))",
+        (query.tobytes(), json.dumps(candidates)),
+    ).fetchall()
+    return sorted(hits, key=lambda hit: (hit[3], hit[0]))[:top_k]
+
+
+def _check_search(search):
+    if search not in SEARCH_MODES:
+        raise ValueError(f"Unknown few-shot search {search!r}; expected one of {', '.join(SEARCH_MODES)}.")
+
+
+def get_few_shot(question, schema, index_db_path, gold_db_path, top_k=3,
+                 exclude_db_id=None, difficulty=None, search="exact"):
     """
     Return the top_k most similar training examples as a list of dicts:
       [{"question": str, "sql": str, "distance": float}, ...]
-    """
-    nlp = _get_nlp()
-    skeleton = get_question_skeleton(question, schema)
-    query_vector = nlp(skeleton).vector.astype('float32').tobytes()
 
+    exclude_db_id skips examples from that database; difficulty (one level or
+    a list of levels) keeps only examples at those levels. Both filters are
+    applied inside the vec0 KNN query. Examples at equal distance are ordered
+    by index rowid.
+
+    search="quantized" searches embedding_quantized (see build_index's
+    quantize) and reranks RERANK_FACTOR × top_k candidates with the float
+    vectors. An ANN backend name (see build_index's ann) scores only that
+    backend's candidates, against the in-memory (or shared, memory-mapped) index.
+    A backend file built over a different number of rows than the index is
+    stale: a warning is printed and the search is exact instead.
+    """
+    _check_search(search)
+    difficulties = _difficulties(difficulty)
+    if top_k <= 0 or difficulties == ():
+        return []
+    query = _question_vectors([question], [schema], index_db_path, _shared_index(index_db_path, gold_db_path))[0]
+
+    if search in ANN_BACKENDS:
+        index = _index(index_db_path, gold_db_path)
+        backend = _ann(index_db_path, search, index.rowids)
+        if backend is not None:
+            found = _ann_top_k(
+                backend, query, top_k, index.rowids, index.db_ids, index.vectors,
+                _masked_norms(index, difficulties), _code(index.db_id_names, exclude_db_id),
+            )
+            examples = _examples(index, [pos for pos, _ in found], gold_db_path)
+            return [
+                {"question": examples[pos][0], "sql": examples[pos][1], "distance": distance}
+                for pos, distance in found
+                if pos in examples
+            ]
+
+    filters, params = _filter_sql(exclude_db_id, difficulties)
     conn = _open_vec_conn(index_db_path, read_only=True)
     try:
-        hits = conn.execute(
-            f"SELECT id, source, distance FROM {_TABLE} WHERE vector MATCH ? ORDER BY distance LIMIT ?",
-            (query_vector, top_k),
-        ).fetchall()
+        if search == "quantized":
+            hits = _quantized_hits(conn, query, top_k, filters, params)
+        else:
+            hits = _exact_hits(conn, query, top_k, filters, params)
     finally:
         conn.close()
 
@@ -125,7 +409,7 @@ def get_few_shot(question, schema, index_db_path, gold_db_path, top_k=3):
     gold_conn = sqlite3.connect(f"file:{gold_db_path}?mode=ro", uri=True)
     try:
         results = []
-        for id_, source, distance in hits:
+        for _, id_, source, distance in hits:
             row = gold_conn.execute(
                 "SELECT question, query FROM gold_dataset WHERE id=? AND source=?",
                 (id_, source),
@@ -137,6 +421,282 @@ def get_few_shot(question, schema, index_db_path, gold_db_path, top_k=3):
         gold_conn.close()
 
 
+# Query vectors scored against the index per matrix multiply in get_few_shot_batch.
+_QUERY_CHUNK = 1024
+
+
+class _Index(NamedTuple):
+    """embedding_dataset as arrays, in rowid order, for the matrix and ANN searches."""
+    rowids: np.ndarray
+    vectors: np.ndarray
+    sq_norms: np.ndarray
+    db_ids: np.ndarray          # int32 codes into db_id_names
+    db_id_names: tuple
+    difficulties: np.ndarray    # int32 codes into difficulty_names
+    difficulty_names: tuple
+    keys: Optional[list]        # (id, source) per row, for the gold_dataset lookup
+    shared: Optional[SharedIndex]  # the memory-mapped export the arrays come from, if any
+
+
+def _codes(values):
+    names, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+    return codes.astype(np.int32), tuple(str(name) for name in names)
+
+
+def _code(names, value):
+    """Code of value in names: None for no value, -1 if absent (matches no row)."""
+    if value is None:
+        return None
+    return names.index(value) if value in names else -1
+
+
+@lru_cache(maxsize=4)
+def _load_index_matrix(index_db_path, mtime_ns, size):
+    """
+    Read the whole embedding index into memory as an _Index.
+
+    Cached per file version (mtime/size), so a rebuilt index is picked up on the next call.
+    """
+    conn = _open_vec_conn(index_db_path, read_only=True)
+    try:
+        rows = conn.execute(
+            f"SELECT rowid, id, source, db_id, difficulty, vector FROM {_TABLE} ORDER BY rowid"
+        ).fetchall()
+    finally:
+        conn.close()
+    if rows:
+        vectors = np.stack([np.frombuffer(r[5], dtype=np.float32) for r in rows])
+    else:
+        vectors = np.zeros((0, 0), dtype=np.float32)
+    return _Index(
+        np.array([r[0] for r in rows], dtype=np.int64),
+        vectors,
+        np.einsum("ij,ij->i", vectors, vectors),
+        *_codes([r[3] for r in rows]),
+        *_codes([r[4] for r in rows]),
+        [(r[1], r[2]) for r in rows],
+        None,
+    )
+
+
+@lru_cache(maxsize=None)
+def _warn_stale(path):
+    print(f"⚠️  Shared index {path} is older than its databases; reading them instead. "
+          "Re-run src/pipeline/embedding.py to refresh it.")
+
+
+def _shared_index(index_db_path, gold_db_path):
+    """The memory-mapped export of the index, if there is one and it is up to date."""
+    path = shared_index_path(index_db_path)
+    shared = load_shared_index(path)
+    if shared is None:
+        return None
+    if not shared.is_fresh(index_db_path, gold_db_path):
+        _warn_stale(path)
+        return None
+    return shared
+
+
+def _index(index_db_path, gold_db_path):
+    """
+    The index as arrays: mapped from the shared export when it is current,
+    otherwise read from index_db_path (and cached per process).
+    """
+    shared = _shared_index(index_db_path, gold_db_path)
+    if shared is not None:
+        return _Index(shared.rowids, shared.vectors, shared.sq_norms, shared.db_ids, shared.db_id_names,
+                      shared.difficulties, shared.difficulty_names, None, shared)
+    stat = os.stat(index_db_path)
+    return _load_index_matrix(index_db_path, stat.st_mtime_ns, stat.st_size)
+
+
+def _examples(index, positions, gold_db_path):
+    """{row position: (question, sql)} for the given positions of index."""
+    positions = set(positions)
+    if index.shared is not None:
+        # Rows missing from gold_dataset are exported as an empty pair: skip them, like the lookup below.
+        pairs = {pos: index.shared.example(pos) for pos in positions}
+        return {pos: pair for pos, pair in pairs.items() if pair != ("", "")}
+
+    wanted = sorted({index.keys[pos] for pos in positions})
+    gold_conn = sqlite3.connect(f"file:{gold_db_path}?mode=ro", uri=True)
+    try:
+        gold = {
+            (id_, source): (question, query)
+            for id_, source, question, query in gold_conn.execute(
+                "SELECT g.id, g.source, g.question, g.query "
+                "FROM json_each(?) AS k JOIN gold_dataset g "
+                "ON g.id = json_extract(k.value, '$[0]') AND g.source = json_extract(k.value, '$[1]')",
+                (json.dumps(wanted),),
+            )
+        }
+    finally:
+        gold_conn.close()
+    return {pos: gold[index.keys[pos]] for pos in positions if index.keys[pos] in gold}
+
+
+@lru_cache(maxsize=None)
+def _distance_conn():
+    """In-memory connection used only to call sqlite-vec's scalar distance function."""
+    return _open_vec_conn(":memory:")
+
+
+def _top_k(query, scores, rowids, vectors, top_k):
+    """
+    Exact top_k (row position, L2 distance) for one query, ties broken by rowid.
+
+    scores are ||x||² - 2·q·x from the matrix multiply, +inf for filtered-out
+    rows. Everything within float error of the k-th best score is re-scored with
+    sqlite-vec's own L2 function, so distances and their order match a vec0
+    MATCH query bit for bit.
+    """
+    top_k = min(top_k, int(np.isfinite(scores).sum()))
+    if top_k == 0:
+        return []
+    kth = np.partition(scores, top_k - 1)[top_k - 1]
+    tolerance = 1e-4 * max(1.0, abs(float(kth)) + float(query @ query))
+    candidates = np.flatnonzero(scores <= kth + tolerance)
+    conn = _distance_conn()
+    query_bytes = query.tobytes()
+    scored = sorted(
+        (
+            conn.execute("SELECT vec_distance_l2(?, ?)", (vectors[pos].tobytes(), query_bytes)).fetchone()[0],
+            int(rowids[pos]),
+            int(pos),
+        )
+        for pos in candidates
+    )
+    return [(pos, distance) for distance, _, pos in scored[:top_k]]
+
+
+def _masked_norms(index, difficulties):
+    """index.sq_norms with +inf for rows whose difficulty is not in difficulties (None = keep all)."""
+    if difficulties is None:
+        return index.sq_norms
+    wanted = [_code(index.difficulty_names, level) for level in difficulties]
+    return np.where(np.isin(index.difficulties, wanted), index.sq_norms, np.inf).astype(np.float32)
+
+
+@lru_cache(maxsize=None)
+def _warn_stale_ann(path, n_backend, n_index):
+    print(f"⚠️  {path} covers {n_backend} rows but the index has {n_index}; searching exactly instead. "
+          "Re-run src/pipeline/embedding.py with --ann to rebuild it.")
+
+
+def _ann(index_db_path, name, rowids):
+    """
+    ANN backend `name` for the index, or None (with a warning) if it was built
+    over a different number of rows than the index now has.
+    """
+    backend = load_ann(index_db_path, name)
+    if len(backend) != len(rowids):
+        _warn_stale_ann(ann_path(index_db_path, name), len(backend), len(rowids))
+        return None
+    return backend
+
+
+def _ann_top_k(backend, query, top_k, rowids, db_ids, vectors, sq_norms, exclude_code=None):
+    """
+    _top_k over the rows an ANN backend proposes, as (row position, distance).
+
+    db_ids are int32 codes; rows coded exclude_code are skipped. The backend
+    is asked to widen its search until the candidates that pass the filters
+    cover top_k, or it has proposed every row it indexes.
+    """
+    if not len(rowids):
+        return []
+    widen = 1
+    while True:
+        candidates = backend.candidates(query, top_k, widen)
+        # Rowids the backend knows but the index no longer has are dropped.
+        positions = np.clip(np.searchsorted(rowids, candidates), 0, len(rowids) - 1)
+        positions = positions[rowids[positions] == candidates]
+        subset = vectors[positions]
+        scores = sq_norms[positions] - 2.0 * (subset @ query)
+        if exclude_code is not None:
+            scores[db_ids[positions] == exclude_code] = np.inf
+        if np.isfinite(scores).sum() >= top_k or len(candidates) >= len(backend):
+            break
+        widen *= 2
+    return [
+        (int(positions[pos]), distance)
+        for pos, distance in _top_k(query, scores, rowids[positions], subset, top_k)
+    ]
+
+
+def get_few_shot_batch(questions, schemas, index_db_path, gold_db_path, top_k=3,
+                       exclude_db_ids=None, difficulty=None, search="exact"):
+    """
+    Batch form of get_few_shot: one result list per question, in input order.
+
+    schemas[i] is the schema for questions[i] (DbSchema or simplified_ddl JSON)
+    and exclude_db_ids[i], if given, the db_id whose examples it skips.
+    difficulty applies to every question. Filtered-out rows score +inf.
+    Query vectors come from question_skeletons or one nlp.pipe pass. They are
+    scored against an in-memory copy of the index with one matrix multiply per
+    _QUERY_CHUNK questions, and the gold question/SQL pairs of every hit are
+    fetched in a single query. When the shared export is current, the index,
+    the question vectors and the pairs are all read from its memory maps.
+
+    With an approximate search mode, each question is searched on its own
+    (quantized: vec0 KNN + rerank; ANN backend: its candidates only, or an
+    exact search if the backend is stale).
+    """
+    _check_search(search)
+    if not questions:
+        return []
+    index = _index(index_db_path, gold_db_path)
+    if not len(index.rowids) or top_k <= 0:
+        return [[] for _ in questions]
+    top_k = min(top_k, len(index.rowids))
+
+    wanted_difficulties = _difficulties(difficulty)
+    if wanted_difficulties == ():
+        return [[] for _ in questions]
+    rowids, vectors, sq_norms = index.rowids, index.vectors, _masked_norms(index, wanted_difficulties)
+    excluded = exclude_db_ids if exclude_db_ids is not None else [None] * len(questions)
+
+    queries = _question_vectors(questions, schemas, index_db_path, index.shared)
+
+    hits = []
+    backend = _ann(index_db_path, search, rowids) if search in ANN_BACKENDS else None
+    if backend is not None:
+        hits = [
+            _ann_top_k(backend, q, top_k, rowids, index.db_ids, vectors, sq_norms,
+                       _code(index.db_id_names, db_id))
+            for q, db_id in zip(queries, excluded)
+        ]
+    elif search == "quantized":
+        conn = _open_vec_conn(index_db_path, read_only=True)
+        try:
+            for q, db_id in zip(queries, excluded):
+                found = _quantized_hits(conn, q, top_k, *_filter_sql(db_id, wanted_difficulties))
+                hits.append([(int(np.searchsorted(rowids, hit[0])), hit[3]) for hit in found])
+        finally:
+            conn.close()
+    else:
+        by_db_id = {}
+        for start in range(0, len(queries), _QUERY_CHUNK):
+            chunk = queries[start:start + _QUERY_CHUNK]
+            scores = sq_norms[None, :] - 2.0 * (chunk @ vectors.T)
+            for row, db_id in zip(scores, excluded[start:start + _QUERY_CHUNK]):
+                if db_id is not None:
+                    if db_id not in by_db_id:
+                        by_db_id[db_id] = np.flatnonzero(index.db_ids == _code(index.db_id_names, db_id))
+                    row[by_db_id[db_id]] = np.inf
+            hits.extend(_top_k(q, row, rowids, vectors, top_k) for q, row in zip(chunk, scores))
+
+    examples = _examples(index, [pos for query_hits in hits for pos, _ in query_hits], gold_db_path)
+    return [
+        [
+            {"question": examples[pos][0], "sql": examples[pos][1], "distance": distance}
+            for pos, distance in query_hits
+            if pos in examples
+        ]
+        for query_hits in hits
+    ]
+
+
 # ---------------------------------------------------------------------------
 # Schema refinement
 # ---------------------------------------------------------------------------
@@ -0,0 +1,230 @@
+"""
+schema.py — Immutable, cached view of the normalized schema catalog.
+
+ingest writes every Spider db_id's tables, columns and foreign keys into
+schema_tables, schema_columns and schema_foreign_keys. load_schema() reads the
+catalog once per process and hands out frozen DbSchema objects whose rendered
+forms (simplified DDL, full DDL, FK lines, skeleton domain tokens) are built on
+first use, so per-record code paths no longer re-parse JSON strings.
+
+Public API:
+  load_schema(db_path, db_id)   -> Optional[DbSchema]
+  load_schemas(db_path)         -> Mapping[str, DbSchema]
+  domain_tokens(ddl_entries)    -> frozenset
+  DbSchema.from_spider(...)     -> DbSchema   (from tables.json-style lists)
+"""
+
+import json
+import sqlite3
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Table:
+    idx: int
+    name: str
+    display_name: str
+
+
+@dataclass(frozen=True)
+class Column:
+    idx: int
+    table_idx: int          # -1 for Spider's '*' pseudo-column
+    name: str
+    display_name: str
+    type: str
+    is_primary_key: bool
+
+
+@dataclass(frozen=True)
+class ForeignKey:
+    column_idx: int
+    ref_column_idx: int
+
+
+@dataclass(frozen=True)
+class DbSchema:
+    db_id: str
+    tables: Tuple[Table, ...]
+    columns: Tuple[Column, ...]
+    foreign_keys: Tuple[ForeignKey, ...]
+
+    @classmethod
+    def from_spider(
+        cls,
+        db_id: str,
+        table_names: list,
+        column_names: list,
+        column_types: list,
+        foreign_keys: list,
+        primary_keys: Iterable = (),
+        table_display_names: Optional[list] = None,
+        column_display_names: Optional[list] = None,
+    ) -> "DbSchema":
+        """Build a schema from the parsed *_original lists of a Spider tables.json entry."""
+        pk_set = set()
+        for pk in primary_keys:
+            pk_set.update(pk if isinstance(pk, list) else [pk])
+        table_display_names = table_display_names or table_names
+        column_display_names = column_display_names or column_names
+        return cls(
+            db_id=db_id,
+            tables=tuple(
+                Table(idx, name, table_display_names[idx])
+                for idx, name in enumerate(table_names)
+            ),
+            columns=tuple(
+                Column(idx, table_idx, name, column_display_names[idx][1], column_types[idx], idx in pk_set)
+                for idx, (table_idx, name) in enumerate(column_names)
+            ),
+            foreign_keys=tuple(ForeignKey(i, j) for i, j in foreign_keys),
+        )
+
+    # -- rendered forms (computed once per instance) -------------------------
+
+    @cached_property
+    def _columns_by_table(self) -> Dict[str, list]:
+        table_columns = {t.name: [] for t in self.tables}
+        for col in self.columns:
+            if col.table_idx >= 0:
+                table_columns[self.tables[col.table_idx].name].append(col)
+        return table_columns
+
+    @cached_property
+    def simplified_ddl(self) -> Tuple[str, ...]:
+        """'table(col, col, ...)' per table — the gold_dataset.simplified_ddl entries."""
+        return tuple(
+            f"{table}({', '.join(col.name for col in cols)})"
+            for table, cols in self._columns_by_table.items()
+        )
+
+    @cached_property
+    def simplified_ddl_json(self) -> str:
+        """simplified_ddl encoded exactly as stored in gold_dataset.simplified_ddl."""
+        return json.dumps(list(self.simplified_ddl))
+
+    @cached_property
+    def full_ddl(self) -> Tuple[str, ...]:
+        """'CREATE TABLE table(col type, ...);' per table — the gold_dataset.full_ddl entries."""
+        return tuple(
+            f"CREATE TABLE {table}({', '.join(f'{col.name} {col.type}' for col in cols)});"
+            for table, cols in self._columns_by_table.items()
+        )
+
+    @cached_property
+    def foreign_key_lines(self) -> Tuple[str, ...]:
+        """'src(col) REFERENCES tgt(col)' per foreign key — the gold_dataset.foreign_keys entries."""
+        return tuple(line for line, _ in self.foreign_key_tables)
+
+    @cached_property
+    def foreign_key_tables(self) -> Tuple[Tuple[str, FrozenSet[str]], ...]:
+        """(FK line, lower-cased names of the two tables it joins) per foreign key."""
+        out = []
+        for fk in self.foreign_keys:
+            src, tgt = self.columns[fk.column_idx], self.columns[fk.ref_column_idx]
+            src_table, tgt_table = self.tables[src.table_idx].name, self.tables[tgt.table_idx].name
+            out.append((
+                f"{src_table}({src.name}) REFERENCES {tgt_table}({tgt.name})",
+                frozenset((src_table.lower(), tgt_table.lower())),
+            ))
+        return tuple(out)
+
+    @cached_property
+    def primary_key_columns(self) -> FrozenSet[Tuple[str, str]]:
+        """(table, column) of every primary-key column, lower-cased; composite keys contribute each part."""
+        return frozenset(
+            (self.tables[col.table_idx].name.lower(), col.name.lower())
+            for col in self.columns
+            if col.is_primary_key and col.table_idx >= 0
+        )
+
+    @cached_property
+    def table_ddl(self) -> Mapping[str, str]:
+        """Lower-cased table name → its simplified_ddl entry."""
+        return MappingProxyType({
+            entry.split("(", 1)[0].strip().lower(): entry for entry in self.simplified_ddl
+        })
+
+    @cached_property
+    def domain_tokens(self) -> FrozenSet[str]:
+        """Table / column tokens masked by question skeletonization."""
+        return domain_tokens(self.simplified_ddl)
+
+    def spider_entry(self) -> dict:
+        """The tables.json-shaped dict expected by spider.evaluation helpers."""
+        return {
+            "db_id": self.db_id,
+            "table_names_original": [t.name for t in self.tables],
+            "table_names": [t.display_name for t in self.tables],
+            "column_names_original": [[c.table_idx, c.name] for c in self.columns],
+            "column_names": [[c.table_idx, c.display_name] for c in self.columns],
+            "column_types": [c.type for c in self.columns],
+            "primary_keys": [c.idx for c in self.columns if c.is_primary_key],
+            "foreign_keys": [[fk.column_idx, fk.ref_column_idx] for fk in self.foreign_keys],
+        }
+
+
+def domain_tokens(ddl_entries: Iterable[str]) -> FrozenSet[str]:
+    """Lower-cased table names and first word of each column from 'table(col, ...)' entries."""
+    tokens = set()
+    for table_info in ddl_entries:
+        table_name = table_info.split('(')[0].strip()
+        tokens.add(table_name.lower())
+        columns_part = table_info.split('(')[1].split(')')[0]
+        for col in columns_part.split(','):
+            tokens.add(col.strip().split()[0].lower())
+    return frozenset(tokens)
+
+
+# ---------------------------------------------------------------------------
+# Catalog loading
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def load_schemas(db_path: str) -> Mapping[str, DbSchema]:
+    """
+    Read the whole schema catalog of an OpenText2SQL.db once per process.
+
+    Returns an empty mapping when the database predates the catalog tables, so
+    callers can fall back to the JSON columns. Call load_schemas.cache_clear()
+    after re-ingesting within the same process.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        tables = conn.execute(
+            "SELECT db_id, table_idx, name, display_name FROM schema_tables ORDER BY db_id, table_idx"
+        ).fetchall()
+        columns = conn.execute(
+            "SELECT db_id, column_idx, table_idx, name, display_name, type, is_primary_key "
+            "FROM schema_columns ORDER BY db_id, column_idx"
+        ).fetchall()
+        fks = conn.execute(
+            "SELECT db_id, column_idx, ref_column_idx FROM schema_foreign_keys ORDER BY db_id, fk_idx"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return MappingProxyType({})
+    finally:
+        conn.close()
+
+    parts: Dict[str, Tuple[list, list, list]] = {}
+    for db_id, *row in tables:
+        parts.setdefault(db_id, ([], [], []))[0].append(Table(*row))
+    for db_id, idx, table_idx, name, display_name, type_, is_pk in columns:
+        parts.setdefault(db_id, ([], [], []))[1].append(
+            Column(idx, table_idx, name, display_name, type_, bool(is_pk))
+        )
+    for db_id, *row in fks:
+        parts.setdefault(db_id, ([], [], []))[2].append(ForeignKey(*row))
+
+    return MappingProxyType({
+        db_id: DbSchema(db_id, tuple(t), tuple(c), tuple(f))
+        for db_id, (t, c, f) in parts.items()
+    })
+
+
+def load_schema(db_path: str, db_id: str) -> Optional[DbSchema]:
+    """Return the cached DbSchema for db_id, or None if the catalog has no such database."""
+    return load_schemas(db_path).get(db_id)
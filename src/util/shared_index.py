@@ -0,0 +1,132 @@
+"""
+shared_index.py — Memory-mapped export of the few-shot index for worker processes.
+
+Public API:
+  shared_index_path(index_db_path)                          -> str
+  db_stamp(path)                                            -> [mtime_ns, size]
+  save_shared_index(path, arrays, meta)                     -> str
+  load_shared_index(path)                                   -> SharedIndex
+
+The export is a directory of .npy files next to the index database
+(OpenText2SQL.shared/), written by src.pipeline.embedding.build_index:
+  rowids, vectors, sq_norms        embedding_dataset, in rowid order
+  db_ids, difficulties             int32 codes into meta's *_names lists
+  example_offsets, examples.bin    gold question and SQL of every row (UTF-8;
+                                   empty for rows missing from gold_dataset)
+  skeleton_keys, skeleton_vectors  question_skeletons, sorted by content hash
+  meta.json                        model_id, name lists and the [mtime_ns, size]
+                                   stamps of the databases it was exported from
+
+Every array is opened with np.load(mmap_mode="r"), so loading only maps the
+files: any number of processes share one copy in the page cache and nothing
+is read until it is touched. src.util.nlp uses the export whenever its stamps
+still match the databases.
+"""
+
+import json
+import os
+import shutil
+from functools import lru_cache
+
+import numpy as np
+
+# Bump when the file layout changes; older exports are then ignored.
+FORMAT_VERSION = 1
+
+_ARRAYS = ("rowids", "vectors", "sq_norms", "db_ids", "difficulties", "example_offsets",
+           "skeleton_keys", "skeleton_vectors")
+
+
+def shared_index_path(index_db_path):
+    """Directory of the shared export for the index in index_db_path."""
+    return f"{os.path.splitext(index_db_path)[0]}.shared"
+
+
+def db_stamp(path):
+    """[mtime_ns, size] of a database file, as recorded in meta.json."""
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def save_shared_index(path, arrays, meta):
+    """
+    Write arrays (every name in _ARRAYS plus "examples", a bytes blob) and meta to path.
+
+    The new export is written beside the old one and swapped in with renames;
+    processes that still map the old files keep reading them.
+    """
+    tmp_path, old_path = f"{path}.tmp", f"{path}.old"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name in _ARRAYS:
+        np.save(os.path.join(tmp_path, f"{name}.npy"), arrays[name])
+    with open(os.path.join(tmp_path, "examples.bin"), "wb") as f:
+        f.write(arrays["examples"])
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({**meta, "version": FORMAT_VERSION}, f, ensure_ascii=False)
+
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return path
+
+
+class SharedIndex:
+    """Read-only, memory-mapped view of one export."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        size = os.path.getsize(os.path.join(path, "examples.bin"))
+        self._examples = (np.memmap(os.path.join(path, "examples.bin"), dtype=np.uint8, mode="r")
+                          if size else np.zeros(0, dtype=np.uint8))
+        self.model_id = self.meta["model_id"]
+        self.db_id_names = tuple(self.meta["db_id_names"])
+        self.difficulty_names = tuple(self.meta["difficulty_names"])
+
+    def is_fresh(self, index_db_path, gold_db_path):
+        """True if both databases are unchanged since the export."""
+        return (self.meta.get("version") == FORMAT_VERSION
+                and self.meta["index"] == db_stamp(index_db_path)
+                and self.meta["gold"] == db_stamp(gold_db_path))
+
+    def example(self, pos):
+        """(question, sql) of the row at position pos; ("", "") if it has no gold row."""
+        start, mid, end = self.example_offsets[2 * pos:2 * pos + 3]
+        return (bytes(self._examples[start:mid]).decode("utf-8"),
+                bytes(self._examples[mid:end]).decode("utf-8"))
+
+    def question_vectors(self, keys):
+        """{content_hash: float32 vector} for the keys found in the export."""
+        if not len(self.skeleton_keys) or not keys:
+            return {}
+        wanted = np.array(keys, dtype=self.skeleton_keys.dtype)
+        positions = np.clip(np.searchsorted(self.skeleton_keys, wanted), 0, len(self.skeleton_keys) - 1)
+        return {
+            key: self.skeleton_vectors[pos]
+            for key, pos, hit in zip(keys, positions, self.skeleton_keys[positions] == wanted)
+            if hit
+        }
+
+
+@lru_cache(maxsize=4)
+def _load(path, mtime_ns):
+    return SharedIndex(path)
+
+
+def load_shared_index(path):
+    """
+    Map the export in path, or return None if there is none.
+
+    Cached per export version (meta.json mtime), so a re-export is picked up on the next call.
+    """
+    meta_path = os.path.join(path, "meta.json")
+    try:
+        mtime_ns = os.stat(meta_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _load(path, mtime_ns)
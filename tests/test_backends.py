@@ -0,0 +1,118 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from src.util.backends import MODEL_POOL, load_backend
+from src.util.llm import infer
+
+
+@pytest.fixture(autouse=True)
+def _empty_pool():
+    yield
+    MODEL_POOL.clear()
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+def _jsonl(path, lines):
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    return str(path)
+
+
+class TestReplayBackend:
+    def test_prompt_sql_lines_match_collapsed_whitespace(self, tmp_path):
+        file = _jsonl(tmp_path / "canned.jsonl", [
+            {"prompt": "How many\n singers?", "sql": "SELECT count(*) FROM singer"},
+        ])
+        backend = load_backend({"path": "replay", "backend": "replay", "file": file})
+        assert backend.generate(["How many singers?"], 64) == ["SELECT count(*) FROM singer"]
+
+    def test_replays_pipeline_outputs(self, tmp_path):
+        file = _jsonl(tmp_path / "finsql.jsonl", [
+            {"presql_prompt": "pre", "presql": "SELECT 1", "finsql_prompt": "fin", "finsql": "SELECT 2"},
+        ])
+        backend = load_backend({"path": "replay", "backend": "replay", "file": file})
+        assert backend.generate(["pre", "fin"], 64) == ["SELECT 1", "SELECT 2"]
+
+    def test_file_relative_to_root_path(self, tmp_path, monkeypatch):
+        _jsonl(tmp_path / "canned.jsonl", [{"prompt": "q", "sql": "SELECT 3"}])
+        monkeypatch.setenv("ROOT_PATH", str(tmp_path))
+        assert load_backend({"path": "replay", "backend": "replay", "file": "canned.jsonl"}).generate(["q"], 64) == [
+            "SELECT 3"
+        ]
+
+    def test_unknown_prompts_query_the_first_table(self):
+        backend = load_backend({"path": "replay", "backend": "replay"})
+        assert backend.generate(["### Schema:\n# singer(singer_id, name)\n### Question: Who?", "Hi"], 64) == [
+            "SELECT * FROM singer", "SELECT 1",
+        ]
+        assert (backend.hits, backend.misses) == (0, 2)
+
+    def test_infer_through_models_json(self):
+        assert infer("replay", ["# singer(singer_id, name)"], batch_size=2) == ["select * from singer"]
+
+
+# ---------------------------------------------------------------------------
+# OpenAI-compatible HTTP
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def server():
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            requests.append((self.path, self.headers.get("Authorization"), body))
+            prompt = body["messages"][0]["content"]
+            status, reply = (400, {"error": "bad prompt"}) if prompt == "fail" else (
+                200, {"choices": [{"message": {"content": f"```sql\nSELECT '{prompt}'\n```"}}]}
+            )
+            data = json.dumps(reply).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/v1", requests
+    httpd.shutdown()
+
+
+class TestOpenAIBackend:
+    def test_batch_in_order(self, server, monkeypatch):
+        base_url, requests = server
+        monkeypatch.setenv("TEST_API_KEY", "secret")
+        backend = load_backend({
+            "path": "org/model", "backend": "openai", "base_url": base_url, "model": "served",
+            "api_key_env": "TEST_API_KEY", "extra_body": {"chat_template_kwargs": {"enable_thinking": False}},
+        })
+        assert backend.generate(["a", "b", "c"], 32) == [f"```sql\nSELECT '{p}'\n```" for p in "abc"]
+        path, auth, body = requests[0]
+        assert (path, auth) == ("/v1/chat/completions", "Bearer secret")
+        assert body["model"] == "served" and body["max_tokens"] == 32 and body["temperature"] == 0
+        assert body["chat_template_kwargs"] == {"enable_thinking": False}
+
+    def test_http_errors_are_raised(self, server):
+        backend = load_backend({"path": "org/model", "backend": "openai", "base_url": server[0]})
+        with pytest.raises(RuntimeError, match="HTTP 400"):
+            backend.generate(["fail"], 32)
+
+    def test_adapters_are_rejected(self, server):
+        with pytest.raises(ValueError, match="mlx backend"):
+            load_backend({"path": "org/model", "backend": "openai", "base_url": server[0]}, "adapters/x")
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown backend 'onnx'"):
+        load_backend({"path": "org/model", "backend": "onnx"})
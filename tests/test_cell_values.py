@@ -0,0 +1,145 @@
+import json
+import sqlite3
+from pathlib import Path
+
+from src.util.cell_values import (
+    ColumnValues, ValueMatch, load_cell_values, match_values, profile_database, render_cell_values,
+    render_matched_values, store_text_values, text_values,
+)
+
+SQL_FILE = Path(__file__).resolve().parent.parent / "database" / "OpenText2SQL.sql"
+
+
+def _spider_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE department (department_id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT);
+        CREATE TABLE employee (employee_id INTEGER, name TEXT, department_id INTEGER, photo BLOB);
+    """)
+    conn.executemany("INSERT INTO department (name) VALUES (?)", [("Sales",), ("IT",), ("HR",)])
+    conn.executemany(
+        "INSERT INTO employee VALUES (?, ?, ?, ?)",
+        [(1, "Zoe", 3, b"\x00"), (2, "Ann", 1, b"\x01"), (3, "Bob", 1, None),
+         (4, "Ann", None, None), (5, "Cy", 2, None)],
+    )
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+# ---------------------------------------------------------------------------
+# Profiling
+# ---------------------------------------------------------------------------
+
+class TestProfileDatabase:
+    def test_skips_internal_tables(self, tmp_path):
+        columns = profile_database(_spider_db(tmp_path / "company.sqlite"))
+        assert {c.table for c in columns} == {"department", "employee"}
+
+    def test_stats(self, tmp_path):
+        columns = {(c.table, c.column): c for c in profile_database(_spider_db(tmp_path / "company.sqlite"))}
+        dept_id = columns[("employee", "department_id")]
+        assert (dept_id.type, dept_id.distinct_count, dept_id.null_count) == ("INTEGER", 3, 1)
+        assert columns[("employee", "photo")].null_count == 3
+
+    def test_most_frequent_values_first_ties_by_value(self, tmp_path):
+        columns = {(c.table, c.column): c for c in profile_database(_spider_db(tmp_path / "company.sqlite"), 3)}
+        assert columns[("employee", "name")].values == ("Ann", "Bob", "Cy")
+        assert columns[("employee", "department_id")].values == (1, 2, 3)
+
+    def test_blobs_are_not_sampled(self, tmp_path):
+        columns = {(c.table, c.column): c for c in profile_database(_spider_db(tmp_path / "company.sqlite"))}
+        assert columns[("employee", "photo")].values == ()
+
+
+# ---------------------------------------------------------------------------
+# Rendering and catalog loading
+# ---------------------------------------------------------------------------
+
+COLUMNS = (
+    ColumnValues(0, "department", 0, "department_id", "INTEGER", 3, 0, (1, 2, 3, 4)),
+    ColumnValues(0, "department", 1, "name", "TEXT", 3, 0, ("HR", "IT")),
+    ColumnValues(1, "employee", 0, "employee_id", "INTEGER", 5, 0, ()),
+)
+
+
+class TestRenderCellValues:
+    def test_format(self):
+        assert render_cell_values(COLUMNS) == (
+            "department(department_id[1, 2, 3], name[HR, IT])\nemployee(employee_id[])"
+        )
+
+    def test_linked_tables(self):
+        assert render_cell_values(COLUMNS, tables={"employee"}) == "employee(employee_id[])"
+
+    def test_unmatched_tables_keep_all(self):
+        assert render_cell_values(COLUMNS, tables={"other"}) == render_cell_values(COLUMNS)
+
+
+class TestLoadCellValues:
+    def test_reads_catalog(self, tmp_path):
+        path = str(tmp_path / "catalog.db")
+        conn = sqlite3.connect(path)
+        conn.executescript(SQL_FILE.read_text())
+        conn.executemany(
+            "INSERT INTO cell_value_catalog VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [("company", c.table_pos, c.table, c.column_pos, c.column, c.type, c.distinct_count, c.null_count,
+              json.dumps(list(c.values))) for c in COLUMNS],
+        )
+        conn.commit()
+        conn.close()
+
+        assert load_cell_values(path)["company"] == COLUMNS
+
+    def test_missing_catalog_is_empty(self, tmp_path):
+        path = str(tmp_path / "empty.db")
+        sqlite3.connect(path).close()
+        assert dict(load_cell_values(path)) == {}
+
+
+# ---------------------------------------------------------------------------
+# Value index
+# ---------------------------------------------------------------------------
+
+def _value_index(tmp_path):
+    path = str(tmp_path / "values.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(SQL_FILE.read_text())
+    store_text_values(conn, "company", text_values(_spider_db(tmp_path / "company.sqlite")))
+    store_text_values(conn, "other", [("city", "name", "Zoe Town")])
+    conn.commit()
+    conn.close()
+    return path
+
+
+class TestValueIndex:
+    def test_text_values_are_distinct_text_cells(self, tmp_path):
+        values = set(text_values(_spider_db(tmp_path / "company.sqlite")))
+        assert ("employee", "name", "Ann") in values
+        assert ("department", "name", "IT") not in values  # shorter than a trigram
+        assert all(isinstance(v, str) for _, _, v in values)
+
+    def test_whole_value_matches(self, tmp_path):
+        matches = match_values(_value_index(tmp_path), "company", "Which department does Zoe work in?")
+        assert matches == [ValueMatch("employee", "name", "Zoe")]
+
+    def test_lookup_is_confined_to_db_id(self, tmp_path):
+        path = _value_index(tmp_path)
+        assert match_values(path, "other", "Who lives in Zoe Town?") == [ValueMatch("city", "name", "Zoe Town")]
+        assert match_values(path, "missing", "Who is Zoe?") == []
+
+    def test_stopwords_only(self, tmp_path):
+        assert match_values(_value_index(tmp_path), "company", "What are they?") == []
+
+    def test_restore_replaces_cells(self, tmp_path):
+        path = _value_index(tmp_path)
+        conn = sqlite3.connect(path)
+        store_text_values(conn, "company", [("employee", "name", "Yve")])
+        conn.commit()
+        conn.close()
+        assert match_values(path, "company", "Is Zoe or Yve older?") == [ValueMatch("employee", "name", "Yve")]
+
+    def test_render(self):
+        matches = [ValueMatch("city", "name", "Paris"), ValueMatch("city", "name", "Rome"),
+                   ValueMatch("person", "home", "Paris")]
+        assert render_matched_values(matches) == "city(name[Paris, Rome])\nperson(home[Paris])"
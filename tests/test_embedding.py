@@ -111,7 +111,7 @@ class TestGetFewShot:
 # embedding_dataset schema (requires embedding DB)
 # ---------------------------------------------------------------------------
 
-EXPECTED_COLUMNS = {"vector", "id", "db_id", "source", "question", "skeleton_question"}
+EXPECTED_COLUMNS = {"vector", "id", "db_id", "source", "difficulty", "question", "skeleton_question", "content_hash"}
 
 
 def _open(path):
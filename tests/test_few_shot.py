@@ -0,0 +1,229 @@
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+from src.util import nlp
+from src.util.ann import build_ann, load_ann, save_ann
+from src.util.nlp import (
+    _ann_top_k, _index, _open_vec_conn, _question_vectors, get_few_shot, get_few_shot_batch, skeleton_key,
+)
+
+# ---------------------------------------------------------------------------
+# Fixture index: hand-written vectors, so no spaCy model is needed
+# ---------------------------------------------------------------------------
+
+SQL_DIR = os.path.join(os.path.dirname(__file__), "..", "database")
+DIM = 8
+MODEL_ID = "en_test-1.0:vectors"
+SCHEMA = json.dumps(["singer(singer_id, name, country)"])
+DB_IDS = ("concert_singer", "pets_1", "world_1")
+DIFFICULTIES = ("easy", "medium", "hard")
+N_TRAIN = 60
+QUESTIONS = [f"dev question {i}" for i in range(12)]
+
+
+def _build_index(path, seed=0):
+    """embedding_dataset, gold_dataset and question_skeletons in one database, like OpenText2SQL.db."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(N_TRAIN, DIM)).astype(np.float32)
+    vectors[N_TRAIN // 2:N_TRAIN // 2 + 4] = vectors[0]  # exact ties, broken by rowid
+    query_vectors = rng.normal(size=(len(QUESTIONS), DIM)).astype(np.float32)
+    query_vectors[0] = vectors[0]  # its top hits are the tied rows
+
+    with open(os.path.join(SQL_DIR, "embedding.sql"), encoding="utf-8") as f:
+        embedding_sql = f.read().replace("float[300]", f"float[{DIM}]")
+    with open(os.path.join(SQL_DIR, "question_skeletons.sql"), encoding="utf-8") as f:
+        skeletons_sql = f.read()
+    conn = _open_vec_conn(str(path))
+    conn.executescript(embedding_sql + skeletons_sql)
+    conn.execute("CREATE TABLE gold_dataset (id INTEGER, source TEXT, question TEXT, query TEXT)")
+    for i, vector in enumerate(vectors):
+        db_id, difficulty = DB_IDS[i % 3], DIFFICULTIES[i // 3 % 3]
+        conn.execute(
+            "INSERT INTO embedding_dataset (rowid, vector, db_id, source, difficulty, id, question) "
+            "VALUES (?, ?, ?, 'train', ?, ?, ?)",
+            (i + 1, vector.tobytes(), db_id, difficulty, i, f"train question {i}"),
+        )
+        conn.execute("INSERT INTO gold_dataset VALUES (?, 'train', ?, ?)", (i, f"train question {i}", f"SELECT {i}"))
+    for i, (question, vector) in enumerate(zip(QUESTIONS, query_vectors)):
+        conn.execute(
+            "INSERT INTO question_skeletons (id, source, content_hash, skeleton, vector) VALUES (?, 'dev', ?, '', ?)",
+            (i, skeleton_key(question, SCHEMA, MODEL_ID), vector.tobytes()),
+        )
+    conn.execute("INSERT INTO question_skeletons_model (model_id, dim) VALUES (?, ?)", (MODEL_ID, DIM))
+    conn.commit()
+    conn.close()
+    return query_vectors
+
+
+@pytest.fixture
+def no_spacy(monkeypatch):
+    def fail():
+        raise AssertionError("spaCy was loaded")
+
+    monkeypatch.setattr(nlp, "_get_nlp", fail)
+
+
+@pytest.fixture
+def index_db(tmp_path):
+    path = tmp_path / "OpenText2SQL.db"
+    return str(path), _build_index(path)
+
+
+# ---------------------------------------------------------------------------
+# Question vectors
+# ---------------------------------------------------------------------------
+
+class TestQuestionVectors:
+    def test_stored_vectors_need_no_spacy(self, index_db, no_spacy):
+        path, query_vectors = index_db
+        assert np.array_equal(_question_vectors(QUESTIONS, [SCHEMA] * len(QUESTIONS), path), query_vectors)
+
+    def test_index_without_model_row_loads_spacy(self, index_db, no_spacy):
+        path, _ = index_db
+        conn = sqlite3.connect(path)
+        conn.execute("DROP TABLE question_skeletons_model")
+        conn.commit()
+        conn.close()
+        with pytest.raises(AssertionError, match="spaCy was loaded"):
+            _question_vectors(QUESTIONS, [SCHEMA] * len(QUESTIONS), path)
+
+
+# ---------------------------------------------------------------------------
+# Batched in-memory search vs per-query vec0 KNN
+# ---------------------------------------------------------------------------
+
+FILTERS = [
+    {},
+    {"difficulty": "hard"},
+    {"difficulty": ["easy", "medium"]},
+    {"exclude_db_ids": [DB_IDS[i % 3] for i in range(len(QUESTIONS))]},
+    {"exclude_db_ids": [DB_IDS[i % 3] for i in range(len(QUESTIONS))], "difficulty": "medium"},
+]
+
+
+def _per_query(path, top_k=5, exclude_db_ids=None, **kwargs):
+    excluded = exclude_db_ids or [None] * len(QUESTIONS)
+    return [
+        get_few_shot(question, SCHEMA, path, path, top_k=top_k, exclude_db_id=db_id, **kwargs)
+        for question, db_id in zip(QUESTIONS, excluded)
+    ]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_batch_matches_per_query_knn(index_db, no_spacy, filters):
+    path, _ = index_db
+    batch = get_few_shot_batch(QUESTIONS, [SCHEMA] * len(QUESTIONS), path, path, top_k=5, **filters)
+    assert batch == _per_query(path, **filters)
+
+
+def test_ties_are_ordered_by_rowid(index_db, no_spacy):
+    path, _ = index_db
+    batch = get_few_shot_batch(QUESTIONS[:1], [SCHEMA], path, path, top_k=3)
+    assert [example["sql"] for example in batch[0]] == ["SELECT 0", "SELECT 30", "SELECT 31"]
+    assert batch == _per_query(path, top_k=3)[:1]
+
+
+# ---------------------------------------------------------------------------
+# Quantized search with exact rerank
+# ---------------------------------------------------------------------------
+
+def _quantize_index(path, kind):
+    from src.pipeline.embedding import _build_quantized
+
+    conn = _open_vec_conn(path)
+    _build_quantized(conn, kind)
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_int8_rerank_matches_exact(index_db, no_spacy, filters):
+    path, _ = index_db
+    _quantize_index(path, "int8")
+    schemas = [SCHEMA] * len(QUESTIONS)
+    exact = get_few_shot_batch(QUESTIONS, schemas, path, path, top_k=3, **filters)
+    assert get_few_shot_batch(QUESTIONS, schemas, path, path, top_k=3, search="quantized", **filters) == exact
+    assert _per_query(path, top_k=3, search="quantized", **filters) == exact
+
+
+def test_binary_rerank_returns_exact_distances(index_db, no_spacy):
+    path, _ = index_db
+    _quantize_index(path, "binary")
+    everything = get_few_shot_batch(QUESTIONS, [SCHEMA] * len(QUESTIONS), path, path, top_k=N_TRAIN)
+    for examples, all_examples in zip(_per_query(path, top_k=3, search="quantized"), everything):
+        exact = {example["sql"]: example["distance"] for example in all_examples}
+        distances = [example["distance"] for example in examples]
+        assert len(examples) == 3 and distances == sorted(distances)
+        assert all(example["distance"] == exact[example["sql"]] for example in examples)
+
+
+# ---------------------------------------------------------------------------
+# Shared memory-mapped export vs SQLite
+# ---------------------------------------------------------------------------
+
+def _export(path):
+    from src.pipeline.embedding import _export_shared
+
+    conn = _open_vec_conn(path)
+    _export_shared(conn, path, path, MODEL_ID)
+    conn.close()
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_shared_export_matches_sqlite(index_db, no_spacy, filters):
+    path, _ = index_db
+    schemas = [SCHEMA] * len(QUESTIONS)
+    from_sqlite = get_few_shot_batch(QUESTIONS, schemas, path, path, top_k=5, **filters)
+    _export(path)
+    assert _index(path, path).shared is not None
+    assert get_few_shot_batch(QUESTIONS, schemas, path, path, top_k=5, **filters) == from_sqlite
+
+
+def test_rows_missing_from_gold_are_skipped_on_both_paths(index_db, no_spacy):
+    path, _ = index_db
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM gold_dataset WHERE id = 30")
+    conn.commit()
+    conn.close()
+    from_sqlite = get_few_shot_batch(QUESTIONS[:1], [SCHEMA], path, path, top_k=3)
+    assert [example["sql"] for example in from_sqlite[0]] == ["SELECT 0", "SELECT 31"]
+    _export(path)
+    assert get_few_shot_batch(QUESTIONS[:1], [SCHEMA], path, path, top_k=3) == from_sqlite
+
+
+# ---------------------------------------------------------------------------
+# ANN backends
+# ---------------------------------------------------------------------------
+
+def _save_ivf(path, n_rows):
+    """An IVF backend over the first n_rows of the fixture index, saved where load_ann finds it."""
+    conn = _open_vec_conn(path, read_only=True)
+    rows = conn.execute("SELECT rowid, vector FROM embedding_dataset ORDER BY rowid LIMIT ?", (n_rows,)).fetchall()
+    conn.close()
+    vectors = np.stack([np.frombuffer(vector, dtype=np.float32) for _, vector in rows])
+    return save_ann(build_ann("ivf", [rowid for rowid, _ in rows], vectors, n_lists=8, n_probe=1), path)
+
+
+class TestStaleAnn:
+    def test_widening_stops_at_the_backend_rows(self, index_db):
+        path, query_vectors = index_db
+        _save_ivf(path, N_TRAIN // 2)
+        index = _index(path, path)
+        backend = load_ann(path, "ivf")
+        # Every row the stale backend knows is excluded, so no candidate ever passes the filter.
+        excluded = np.where(index.rowids <= N_TRAIN // 2, 0, 1).astype(np.int32)
+        assert _ann_top_k(backend, query_vectors[0], 3, index.rowids, excluded, index.vectors,
+                          index.sq_norms, exclude_code=0) == []
+
+    def test_stale_backend_falls_back_to_exact(self, index_db, no_spacy, capsys):
+        path, _ = index_db
+        _save_ivf(path, N_TRAIN // 2)
+        schemas = [SCHEMA] * len(QUESTIONS)
+        kwargs = dict(top_k=3, exclude_db_ids=["concert_singer"] * len(QUESTIONS), difficulty="hard")
+        assert (get_few_shot_batch(QUESTIONS, schemas, path, path, search="ivf", **kwargs)
+                == get_few_shot_batch(QUESTIONS, schemas, path, path, **kwargs))
+        assert "searching exactly instead" in capsys.readouterr().out
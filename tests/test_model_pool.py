@@ -0,0 +1,77 @@
+import pytest
+
+from src.util import backends
+from src.util.backends import ModelPool
+
+SIZES = {"small": 10, "medium": 20, "large": 50}
+
+
+class _Backend:
+    def __init__(self, entry, adapter_path):
+        self.nbytes = SIZES[entry["path"]]
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+
+    def load(entry, adapter_path=None):
+        calls.append((entry["path"], adapter_path))
+        return _Backend(entry, adapter_path)
+
+    monkeypatch.setattr(backends, "load_backend", load)
+    return calls
+
+
+def _get(pool, path, adapter_path=None, **keys):
+    return pool.get({"path": path, **keys}, adapter_path)
+
+
+class TestModelPool:
+    def test_resident_model_is_not_reloaded(self, loads):
+        pool = ModelPool(max_bytes=40)
+        first = _get(pool, "small")
+        assert _get(pool, "small") is first
+        assert len(loads) == 1
+
+    def test_key_includes_adapter_and_entry(self, loads):
+        pool = ModelPool(max_bytes=40)
+        _get(pool, "small")
+        _get(pool, "small", "adapters/x")
+        _get(pool, "small", tokenizer_config={"trust_remote_code": True})
+        _get(pool, "small", tokenizer_config={"trust_remote_code": True})
+        assert len(loads) == 3 and len(pool) == 3
+
+    def test_least_recently_used_is_evicted(self, loads):
+        pool = ModelPool(max_bytes=35)
+        _get(pool, "small")
+        _get(pool, "medium")
+        _get(pool, "small")      # medium is now least recently used
+        _get(pool, "small", "adapters/x")
+        assert pool.resident_bytes == 20 and len(pool) == 2
+        _get(pool, "small")
+        _get(pool, "medium")
+        assert [path for path, _ in loads] == ["small", "medium", "small", "medium"]
+
+    def test_model_over_budget_is_not_kept(self, loads):
+        pool = ModelPool(max_bytes=40)
+        _get(pool, "small")
+        _get(pool, "large")
+        _get(pool, "large")
+        assert len(loads) == 3 and len(pool) == 0
+
+    def test_resize_and_disable(self, loads):
+        pool = ModelPool(max_bytes=40)
+        _get(pool, "small")
+        _get(pool, "medium")
+        pool.resize(25)
+        assert pool.resident_bytes == 20
+        pool.resize(0)
+        _get(pool, "small")
+        assert len(pool) == 0 and len(loads) == 3
+
+    def test_budget_from_environment(self, loads, monkeypatch):
+        monkeypatch.setenv("MODEL_POOL_GB", "0.5")
+        pool = ModelPool()
+        _get(pool, "small")
+        assert pool.max_bytes == 2**29 and len(pool) == 1
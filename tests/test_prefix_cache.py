@@ -0,0 +1,51 @@
+import pytest
+
+from src.util import llm
+from src.util.llm import MIN_PREFIX_TOKENS, infer, prefill_tokens_saved, prefix_groups
+
+SCHEMA = list(range(100, 100 + MIN_PREFIX_TOKENS))
+
+
+# ---------------------------------------------------------------------------
+# Grouping
+# ---------------------------------------------------------------------------
+
+class TestPrefixGroups:
+    def test_groups_in_first_seen_order(self):
+        tokens = [SCHEMA + [1], [7] * 40, SCHEMA + [2, 3], [7] * 40 + [9]]
+        assert prefix_groups(tokens, ["a", "b", "a", "b"]) == [([0, 2], len(SCHEMA)), ([1, 3], 39)]
+
+    def test_prefix_leaves_one_token_to_generate_from(self):
+        assert prefix_groups([SCHEMA + [1], SCHEMA + [1]], ["a", "a"]) == [([0, 1], len(SCHEMA))]
+
+    def test_short_prefixes_and_single_prompts_are_not_cached(self):
+        tokens = [SCHEMA[:-2] + [1], SCHEMA[:-2] + [2], SCHEMA + [3]]
+        assert prefix_groups(tokens, ["a", "a", "b"]) == [([0, 1], 0), ([2], 0)]
+
+    def test_tokens_saved(self):
+        assert prefill_tokens_saved([([0, 2, 5], 40), ([1], 0), ([3, 4], 50)]) == 130
+
+
+# ---------------------------------------------------------------------------
+# Grouped inference
+# ---------------------------------------------------------------------------
+
+class _Backend:
+    prefix_cache = True
+
+    def tokens(self, prompt):
+        return [int(t) for t in prompt.split()]
+
+    def prefill(self, tokens):
+        return list(tokens)
+
+    def generate_tokens(self, suffixes, max_tokens, caches=None):
+        # "SQL" = the full prompt, rebuilt from the cached prefix and the suffix.
+        caches = caches or [[]] * len(suffixes)
+        return [" ".join(map(str, cache + suffix)) for cache, suffix in zip(caches, suffixes)]
+
+
+def test_grouped_infer_resumes_from_prefix_in_input_order(monkeypatch):
+    monkeypatch.setattr(llm, "_backend", lambda model, adapter_path: _Backend())
+    prompts = [" ".join(map(str, SCHEMA + [q])) for q in (1, 2, 3)] + ["5 6", "7 8"]
+    assert infer("model", prompts, batch_size=2, group_by=["a", "a", "a", "b", "c"]) == prompts
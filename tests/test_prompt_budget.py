@@ -0,0 +1,147 @@
+import json
+
+import pytest
+
+from src.util import llm
+from src.util.llm import (
+    PromptBudget, _drop_columns, _low_relevance_columns, fit_prompt, prompt_budget, render_prompt,
+)
+from src.util.schema import DbSchema
+
+DDL = ["city(city_id, name, country, population)", "person(person_id, first_name, city_id, age)"]
+FKS = ["person(city_id) REFERENCES city(city_id)"]
+
+CONFIG = {
+    "schema": {"visible": True, "text": "### Schema:\n# {{simplified_ddl}}"},
+    "reference_values": {"visible": True, "text": "### Sample values:\n# {{cell_values}}"},
+    "few_shot": {"visible": True, "text": "### Similar examples:\n{{few_shot}}"},
+    "question": {"visible": True, "text": "### Question: {{question}}\nSELECT"},
+}
+
+REC = {
+    "question": "Which city has the largest population?",
+    "db_id": "world",
+    "simplified_ddl": json.dumps(DDL),
+    "foreign_keys": json.dumps(FKS),
+    "cell_values": "city(name[Paris, Rome, Oslo], country[France, Italy, Norway])",
+    "matched_values": "",
+    "few_shot": [
+        {"question": "How many cities are there?", "sql": "SELECT count(*) FROM city"},
+        {"question": "List all people.", "sql": "SELECT * FROM person"},
+    ],
+}
+
+
+class _WhitespaceTokenizer:
+    def apply_chat_template(self, messages, tokenize, add_generation_prompt, enable_thinking):
+        return messages[0]["content"]
+
+    def encode(self, text, add_special_tokens):
+        return text.split()
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    monkeypatch.setattr(llm, "_tokenizer", lambda path, tokenizer_config="{}": _WhitespaceTokenizer())
+    return lambda limit: PromptBudget(("model",), ("model",), (limit,), ("{}",))
+
+
+def _words(text):
+    return len(text.split())
+
+
+# ---------------------------------------------------------------------------
+# Column relevance
+# ---------------------------------------------------------------------------
+
+class TestLowRelevanceColumns:
+    def test_keeps_first_fk_and_mentioned_columns(self):
+        dropped = _low_relevance_columns(DDL, FKS, REC["question"])
+        assert set(dropped) == {(0, "name"), (0, "country"), (1, "first_name"), (1, "age")}
+
+    def test_keeps_primary_key_columns(self):
+        # A composite key whose second part is neither first nor a foreign key.
+        ddl = ["visit(person_id, visit_date, note)"]
+        question = "Show every note."
+        assert _low_relevance_columns(ddl, [], question) == [(0, "visit_date")]
+        assert _low_relevance_columns(ddl, [], question, frozenset({("visit", "visit_date")})) == []
+
+    def test_later_columns_first(self):
+        assert _low_relevance_columns(DDL, FKS, REC["question"])[:2] == [(1, "age"), (0, "country")]
+
+    def test_drop_columns(self):
+        assert _drop_columns(DDL, [(1, "age"), (0, "country")]) == [
+            "city(city_id, name, population)", "person(person_id, first_name, city_id)",
+        ]
+
+
+# ---------------------------------------------------------------------------
+# Trimming
+# ---------------------------------------------------------------------------
+
+class TestFitPrompt:
+    def test_within_budget_is_unchanged(self, budget):
+        prompt, counts = fit_prompt(CONFIG, REC, budget(1000))
+        assert prompt == render_prompt(CONFIG, REC)
+        assert counts == {"model": _words(prompt)}
+
+    def test_no_limit_only_counts(self, budget):
+        prompt, counts = fit_prompt(CONFIG, REC, budget(None))
+        assert prompt == render_prompt(CONFIG, REC) and counts == {"model": _words(prompt)}
+
+    def test_cell_values_go_first(self, budget):
+        full = _words(render_prompt(CONFIG, REC))
+        prompt, counts = fit_prompt(CONFIG, REC, budget(full - 1))
+        assert "Paris" not in prompt and "SELECT count(*) FROM city" in prompt
+        assert counts["model"] <= full - 1
+
+    def test_then_few_shot_least_similar_first(self, budget):
+        without_cells = _words(render_prompt(CONFIG, {**REC, "cell_values": ""}))
+        prompt, _ = fit_prompt(CONFIG, REC, budget(without_cells - 1))
+        assert "SELECT count(*) FROM city" in prompt and "SELECT * FROM person" not in prompt
+
+    def test_then_low_relevance_columns(self, budget):
+        bare = {**REC, "cell_values": "", "few_shot": []}
+        prompt, counts = fit_prompt(CONFIG, REC, budget(_words(render_prompt(CONFIG, bare)) - 1))
+        assert "population" in prompt and "age" not in prompt and "country" in prompt
+
+    def test_primary_keys_from_the_catalog_are_kept(self, budget, monkeypatch):
+        schema = DbSchema.from_spider(
+            "world", ["city", "person"],
+            [[-1, "*"], [0, "city_id"], [0, "name"], [0, "country"], [0, "population"],
+             [1, "person_id"], [1, "first_name"], [1, "city_id"], [1, "age"]],
+            ["text"] + ["number", "text", "text", "number", "number", "text", "number", "number"],
+            [[7, 1]], primary_keys=[1, [5, 8]],
+        )
+        monkeypatch.setattr(llm, "load_schemas", lambda db_path: {"world": schema})
+        monkeypatch.setattr(llm, "load_cell_values", lambda db_path: {})
+        prompt, _ = fit_prompt(CONFIG, REC, budget(1), db_path="OpenText2SQL.db")
+        assert "city(city_id, population)" in prompt and "person(person_id, city_id, age)" in prompt
+
+    def test_over_budget_is_fully_trimmed(self, budget):
+        prompt, counts = fit_prompt(CONFIG, REC, budget(1))
+        assert "city(city_id, population)" in prompt and "person(person_id, city_id)" in prompt
+        assert counts["model"] > 1
+
+
+# ---------------------------------------------------------------------------
+# Budgets from models.json
+# ---------------------------------------------------------------------------
+
+class TestPromptBudget:
+    def test_replay_entry_is_not_counted(self):
+        budget = prompt_budget(["replay"])
+        assert budget.models == ()
+        assert fit_prompt(CONFIG, REC, budget) == (render_prompt(CONFIG, REC), {})
+
+    def test_explicit_tokenizer(self, monkeypatch):
+        entries = {"served": {"path": "Qwen3-8B", "backend": "openai", "tokenizer": "Qwen/Qwen3-8B"}}
+        monkeypatch.setattr(llm, "_resolve_model_entry", lambda key: entries.get(key, {"path": key}))
+        budget = prompt_budget(["served", "org/model:fine-tuned"])
+        assert budget.models == ("Qwen3-8B", "org/model") and budget.tokenizers == ("Qwen/Qwen3-8B", "org/model")
+
+    def test_budget_without_tokenizer_is_rejected(self, monkeypatch):
+        entry = {"path": "Qwen3-8B", "backend": "openai", "prompt_budget": 4096}
+        monkeypatch.setattr(llm, "_resolve_model_entry", lambda key: entry)
+        with pytest.raises(ValueError, match="no tokenizer"):
+            prompt_budget(["served"])
@@ -0,0 +1,161 @@
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from src.util import llm
+from src.util.cell_values import store_text_values
+from src.util.llm import iter_prompt_generation, prompt_generation, render_prompt, schema_linking
+
+SQL_FILE = Path(__file__).resolve().parent.parent / "database" / "OpenText2SQL.sql"
+
+DDL = {
+    "world": ["city(city_id, name, country)", "person(person_id, name, city_id)"],
+    "company": ["department(department_id, name)", "employee(employee_id, name, department_id)"],
+}
+FKS = {
+    "world": ["person(city_id) REFERENCES city(city_id)"],
+    "company": ["employee(department_id) REFERENCES department(department_id)"],
+}
+# (table_pos, table, column_pos, column, sample values); company has no catalog rows.
+CATALOG = [
+    (0, "city", 0, "city_id", [1, 2, 3]),
+    (0, "city", 1, "name", ["Paris", "Rome", "Oslo"]),
+    (1, "person", 0, "person_id", [1, 2]),
+    (1, "person", 1, "name", ["Ann", "Bob"]),
+]
+
+SCHEMA_ONLY = {
+    "schema": {"visible": True, "text": "### Schema:\n# {{simplified_ddl}}"},
+    "question": {"visible": True, "text": "### Question: {{question}}\nSELECT"},
+}
+WITH_VALUES = {
+    "schema": SCHEMA_ONLY["schema"],
+    "reference_values": {"visible": True, "text": "### Sample values:\n# {{cell_values}}"},
+    "question": SCHEMA_ONLY["question"],
+}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """An OpenText2SQL.db with a few dev questions on two databases and world's cell catalog."""
+    monkeypatch.setenv("ROOT_PATH", str(tmp_path))
+    path = str(tmp_path / "OpenText2SQL.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(SQL_FILE.read_text())
+    conn.executemany(
+        "INSERT INTO gold_dataset (id, db_id, source, question, query, simplified_ddl, foreign_keys, difficulty) "
+        "VALUES (?, ?, 'dev', ?, ?, ?, ?, 'easy')",
+        [
+            (i, db_id, f"Question {i} about {db_id} in Paris?", "SELECT 1", json.dumps(DDL[db_id]), json.dumps(FKS[db_id]))
+            for i, db_id in enumerate(["world", "company", "world", "company", "company", "world"])
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO cell_value_catalog VALUES ('world', ?, ?, ?, ?, 'TEXT', 3, 0, ?)",
+        [(tp, table, cp, column, json.dumps(values)) for tp, table, cp, column, values in CATALOG],
+    )
+    store_text_values(conn, "world", [("city", "name", "Paris"), ("city", "name", "Rome")])
+    conn.commit()
+    conn.close()
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Values a config did not render
+# ---------------------------------------------------------------------------
+
+class TestUnrenderedValues:
+    def test_none_unless_rendered(self, db):
+        records = prompt_generation(SCHEMA_ONLY, db, source="dev")
+        assert [rec["cell_values"] for rec in records] == [None] * 6
+        rendered = prompt_generation(WITH_VALUES, db, source="dev")
+        assert rendered[0]["cell_values"] == (
+            "city(city_id[1, 2, 3], name[Paris, Rome, Oslo])\nperson(person_id[1, 2], name[Ann, Bob])"
+        )
+        assert rendered[1]["cell_values"] == ""  # computed: company has no catalog rows
+
+    def test_later_render_reads_the_catalog(self, db):
+        rec = prompt_generation(SCHEMA_ONLY, db, source="dev")[0]
+        expected = prompt_generation(WITH_VALUES, db, source="dev")[0]["prompt"]
+        assert "Paris" in expected and render_prompt(WITH_VALUES, rec, db_path=db) == expected
+
+    def test_schema_linking_renders_linked_tables(self, db):
+        rec = prompt_generation(SCHEMA_ONLY, db, source="dev")[0]
+        linked = schema_linking([{**rec, "presql": "SELECT name FROM city"}], db_path=db)[0]
+        assert linked["cell_values"] == "city(city_id[1, 2, 3], name[Paris, Rome, Oslo])"
+        assert linked["section_visibility"]["reference_values"] is True
+
+    def test_matched_values_are_looked_up_later(self, db):
+        rec = prompt_generation(SCHEMA_ONLY, db, source="dev")[0]
+        assert rec["matched_values"] is None
+        config = {**SCHEMA_ONLY, "matched_values": {"visible": True, "text": "### Values: {{matched_values}}"}}
+        prompt = render_prompt(config, {**rec, "question": "Who lives in Paris?"}, db_path=db)
+        assert "### Values: city(name[Paris])" in prompt
+
+
+# ---------------------------------------------------------------------------
+# Compiled template cache
+# ---------------------------------------------------------------------------
+
+ABLATED = {
+    "task": {"visible": False, "text": "### Ablated task."},
+    "schema": SCHEMA_ONLY["schema"],
+    "foreign_keys": {"visible": True, "text": "### Foreign keys:\n# {{foreign_keys}}"},
+    "reference_values": WITH_VALUES["reference_values"],
+    "question": SCHEMA_ONLY["question"],
+}
+REC = {
+    "question": "Who lives in Paris?",
+    "simplified_ddl": json.dumps(DDL["world"]),
+    "foreign_keys": json.dumps(FKS["world"]),
+    "cell_values": "city(name[Paris, Rome])\nperson(name[Ann])",
+}
+MASKS = [None, {"reference_values": False, "foreign_keys": False}, {"schema": False}, None]
+
+
+class TestCompiledTemplates:
+    def test_rendered_prompt(self):
+        # The text the per-call template assembly produced before compiled templates were cached.
+        assert render_prompt(ABLATED, REC) == (
+            "### Schema:\n# city(city_id, name, country)\n# person(person_id, name, city_id)\n"
+            "### Foreign keys:\n# person(city_id) REFERENCES city(city_id)\n"
+            "### Sample values:\n# city(name[Paris, Rome])\n# person(name[Ann])\n"
+            "### Question: Who lives in Paris?\nSELECT"
+        )
+        assert render_prompt(ABLATED, REC, MASKS[1]) == (
+            "### Schema:\n# city(city_id, name, country)\n# person(person_id, name, city_id)\n"
+            "### Foreign keys:\n# None.\n### Sample values:\n# None.\n"
+            "### Question: Who lives in Paris?\nSELECT"
+        )
+
+    def test_cached_masks_match_a_fresh_compile(self):
+        cached = [render_prompt(ABLATED, REC, mask) for mask in MASKS]
+        fresh = []
+        for mask in MASKS:
+            llm._compile_prompt.cache_clear()
+            fresh.append(render_prompt(ABLATED, REC, mask))
+        assert cached == fresh and cached[0] == cached[3] and len(set(cached)) == 3
+
+    def test_edited_config_is_recompiled(self):
+        config = {**ABLATED, "question": {"visible": True, "text": "Q: {{question}}"}}
+        assert render_prompt(ABLATED, REC).endswith("### Question: Who lives in Paris?\nSELECT")
+        assert render_prompt(config, REC).endswith("Q: Who lives in Paris?")
+
+    def test_generated_prompts_match_render_prompt(self, db):
+        for rec in prompt_generation(WITH_VALUES, db, source="dev"):
+            assert rec["prompt"] == render_prompt(WITH_VALUES, rec, db_path=db)
+
+
+# ---------------------------------------------------------------------------
+# Process-pool rendering
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("batch_size", [2, 100])
+def test_workers_render_the_serial_records(db, batch_size):
+    config = {**WITH_VALUES, "matched_values": {"visible": True, "text": "### Values: {{matched_values}}"}}
+    serial = list(iter_prompt_generation(config, db, source="dev", batch_size=batch_size))
+    pooled = list(iter_prompt_generation(config, db, source="dev", batch_size=batch_size, workers=2))
+    assert pooled == serial and sum(map(len, serial)) == 6
+    assert serial[0][0]["matched_values"] == "city(name[Paris])"
@@ -0,0 +1,99 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+from src.util.schema import DbSchema, domain_tokens, load_schemas
+
+# ---------------------------------------------------------------------------
+# Shared test schema (tables.json *_original format)
+# ---------------------------------------------------------------------------
+
+SPIDER_ENTRY = {
+    "db_id": "company",
+    "table_names_original": ["department", "employee"],
+    "table_names": ["department", "employee"],
+    "column_names_original": [
+        [-1, "*"],
+        [0, "department_id"], [0, "name"],
+        [1, "employee_id"], [1, "name"], [1, "department_id"],
+    ],
+    "column_names": [
+        [-1, "*"],
+        [0, "department id"], [0, "name"],
+        [1, "employee id"], [1, "name"], [1, "department id"],
+    ],
+    "column_types": ["text", "number", "text", "number", "text", "number"],
+    "primary_keys": [1, 3],
+    "foreign_keys": [[5, 1]],
+}
+
+SQL_FILE = Path(__file__).resolve().parent.parent / "database" / "OpenText2SQL.sql"
+
+
+def _schema():
+    e = SPIDER_ENTRY
+    return DbSchema.from_spider(
+        e["db_id"], e["table_names_original"], e["column_names_original"], e["column_types"],
+        e["foreign_keys"], e["primary_keys"], e["table_names"], e["column_names"],
+    )
+
+
+# ---------------------------------------------------------------------------
+# DbSchema rendering
+# ---------------------------------------------------------------------------
+
+class TestDbSchema:
+    def test_simplified_ddl(self):
+        assert _schema().simplified_ddl == (
+            "department(department_id, name)",
+            "employee(employee_id, name, department_id)",
+        )
+
+    def test_full_ddl(self):
+        assert _schema().full_ddl[0] == "CREATE TABLE department(department_id number, name text);"
+
+    def test_foreign_keys(self):
+        schema = _schema()
+        assert schema.foreign_key_lines == ("employee(department_id) REFERENCES department(department_id)",)
+        assert schema.foreign_key_tables[0][1] == {"employee", "department"}
+
+    def test_domain_tokens_match_ddl_parsing(self):
+        schema = _schema()
+        assert schema.domain_tokens == domain_tokens(schema.simplified_ddl)
+        assert {"department", "employee", "department_id", "name"} <= schema.domain_tokens
+
+    def test_spider_entry_round_trip(self):
+        assert _schema().spider_entry() == SPIDER_ENTRY
+
+    def test_is_immutable(self):
+        with pytest.raises(AttributeError):
+            _schema().db_id = "other"
+
+
+# ---------------------------------------------------------------------------
+# Catalog loading
+# ---------------------------------------------------------------------------
+
+class TestLoadSchemas:
+    def test_reads_catalog(self, tmp_path):
+        path = str(tmp_path / "catalog.db")
+        schema = _schema()
+        conn = sqlite3.connect(path)
+        conn.executescript(SQL_FILE.read_text())
+        conn.executemany("INSERT INTO schema_tables VALUES (?, ?, ?, ?)",
+                         [(schema.db_id, t.idx, t.name, t.display_name) for t in schema.tables])
+        conn.executemany("INSERT INTO schema_columns VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         [(schema.db_id, c.idx, c.table_idx, c.name, c.display_name, c.type, c.is_primary_key)
+                          for c in schema.columns])
+        conn.executemany("INSERT INTO schema_foreign_keys VALUES (?, ?, ?, ?)",
+                         [(schema.db_id, i, fk.column_idx, fk.ref_column_idx)
+                          for i, fk in enumerate(schema.foreign_keys)])
+        conn.commit()
+        conn.close()
+
+        assert load_schemas(path)["company"] == schema
+
+    def test_missing_catalog_is_empty(self, tmp_path):
+        path = str(tmp_path / "empty.db")
+        sqlite3.connect(path).close()
+        assert dict(load_schemas(path)) == {}